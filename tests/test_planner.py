@@ -0,0 +1,68 @@
+import random
+import unittest
+
+import timetable
+from timetable.decoder.decoder_gatt import parse_content
+
+
+# Return the contents of a generated GATT feed of which every node has symmetric and overlapping transfers to other nodes
+def generate_transfer_feed(seed):
+  rnd = random.Random(seed)
+  lines = ['feed_id = "test"', '', '[agencies]', 'test = {name = "Test"}', '', '[modalities]', 'rail = {name = "Trein", priority = 1}', '', '[nodes]']
+  lines.extend(f'n{i} = {{name = "Station {i}", change_time = "00:0{rnd.randint(0, 5)}"}}' for i in range(40))
+
+  # Generate the routes and their trips
+  trips = []
+  for r in range(12):
+    lines.extend(['', f'[routes.r{r}]', 'agency = "test"', 'modality = "rail"', f'name = "Route {r}"', '', f'[routes.r{r}.stops]'])
+    nodes = rnd.sample(range(40), rnd.randint(3, 10))
+    minutes = 0
+    for i, node in enumerate(nodes):
+      times = []
+      if i > 0:
+        minutes += rnd.randint(2, 15)
+        times.append(f'a = "{minutes // 60:02d}:{minutes % 60:02d}"')
+      if i < len(nodes) - 1:
+        minutes += rnd.randint(0, 2)
+        times.append(f'd = "{minutes // 60:02d}:{minutes % 60:02d}"')
+      lines.append(f'{i:02d} = {{node = "n{node}", {", ".join(times)}}}')
+    trips.extend(f'r{r}_{t} = {{route = "r{r}", time = "{(minutes := rnd.randrange(23 * 60)) // 60:02d}:{minutes % 60:02d}"}}' for t in range(20))
+  lines.extend(['', '[trips]', *trips])
+
+  # Generate the transfers
+  lines.extend(['', '[transfers]'])
+  for t in range(25):
+    begin, end = rnd.sample(range(40), 2)
+    lines.append(f't{t} = {{begin = "n{begin}", end = "n{end}", duration = "00:{rnd.randint(1, 20):02d}", symmetric = {"true" if rnd.random() < 0.5 else "false"}}}')
+  return '\n'.join(lines) + '\n'
+
+
+# Return the legs of journeys as tuples of their type, nodes and times in seconds
+def get_journey_legs(journeys):
+  return [[(type(leg).__name__, leg.from_node.id, leg.to_node.id, leg.departure_time.seconds, leg.arrival_time.seconds) for leg in journey.legs] for journey in journeys]
+
+
+# Class that tests the planner on generated feeds with transfers
+class TransferPlannerTest(unittest.TestCase):
+  # Test that the object and compiled engines return the same journeys, of which no leg departs before the previous leg arrives and no transfers are chained
+  def test_engines_return_same_journeys(self):
+    for seed in range(12):
+      feed = timetable.GATTFeedDecoder().decode_data(parse_content(generate_transfer_feed(seed)))
+      objects = timetable.RaptorAlgorithm(feed, engine = 'objects')
+      compiled = timetable.RaptorAlgorithm(feed, engine = 'compiled')
+      nodes = sorted(feed.get_nodes())
+      rnd = random.Random(seed)
+      for i in range(100):
+        departure_node, arrival_node = rnd.sample(nodes, 2)
+        departure_time = timetable.Time(rnd.randrange(5 * 3600, 22 * 3600))
+        with self.subTest(seed = seed, departure_node = departure_node.id, arrival_node = arrival_node.id, departure_time = departure_time.seconds):
+          journeys = compiled.query_depart_after(departure_node, arrival_node, departure_time)
+          self.assertEqual(get_journey_legs(objects.query_depart_after(departure_node, arrival_node, departure_time)), get_journey_legs(journeys))
+          for legs in get_journey_legs(journeys):
+            for leg, next_leg in zip(legs, legs[1:]):
+              self.assertLessEqual(leg[4], next_leg[3])
+              self.assertFalse(leg[0] == next_leg[0] == 'JourneyTransferLeg')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,4 +1,5 @@
-from .decoder import FeedDecoder, FeedDecoderError, GATTFeedDecoder
-from .model import Feed, Agency, Node, NodeType, Transfer, Modality, ModalityType, Route, Trip, StopList, Stop, Time
-from .planner import RaptorAlgorithm, Journey, JourneyTripLeg, JourneyTransferLeg
+from .decoder import FeedDecoder, FeedDecoderError, GATTFeedDecoder, SnapshotFeedDecoder, write_snapshot
+from .model import Feed, Agency, DepartureBoard, Node, NodeType, Transfer, Modality, ModalityType, Route, SearchIndex, Trip, TripView, TripTable, StopList, StopListView, TripStopList, Stop, Time, Duration, References, JSON_MODES
+from .planner import RaptorAlgorithm, McRaptorAlgorithm, CompiledFeed, RaptorWorkspace, Journey, JourneyTripLeg, JourneyTransferLeg, plan_many, QueryCache
+from .manager import FeedManager, FeedState
 from .query import query
@@ -0,0 +1,113 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+
+from .benchmark import benchmark_decode, toml
+from .decoder import GATTFeedDecoder, write_snapshot
+from .decoder.decoder_gatt import is_feed_pattern
+from .model import Time
+from .planner.batch import plan_many, write_csv, write_jsonl
+
+
+# Plan a batch of journeys between pairs of nodes and write the rows as they are planned
+def plan_batch(args):
+  # Decode the feed
+  feed = GATTFeedDecoder().decode(args.feed)
+
+  # Read the pairs of nodes from a CSV file with from_node and to_node columns, or use all pairs of different nodes
+  if args.pairs is not None:
+    with open(args.pairs, newline = '') as file:
+      od_pairs = [(row['from_node'], row['to_node']) for row in csv.DictReader(file)]
+  else:
+    od_pairs = [(from_node, to_node) for from_node, to_node in itertools.product(feed.get_nodes(), repeat = 2) if from_node != to_node]
+
+  # Plan the journeys and write the rows
+  rows = plan_many(feed, od_pairs, [Time.fromstring(time) for time in args.time], workers = args.workers, max_rounds = args.max_rounds)
+  output = open(args.output, 'w', newline = '') if args.output is not None else sys.stdout
+  try:
+    if args.format == 'csv':
+      write_csv(rows, output)
+    else:
+      write_jsonl(rows, output)
+  finally:
+    if output is not sys.stdout:
+      output.close()
+
+
+# Compile a feed to a snapshot that loads without parsing the feed
+def compile_feed(args):
+  output = args.output
+  if output is None:
+    # Get the default snapshot file, which is next to the feed file or the feed directory
+    if is_feed_pattern(args.feed):
+      args.parser.error('the snapshot file must be specified with -o/--output if the feed is a glob pattern')
+    elif os.path.isdir(args.feed):
+      output = os.path.normpath(args.feed) + '.ttbin'
+    else:
+      output = os.path.splitext(args.feed)[0] + '.ttbin'
+  write_snapshot(GATTFeedDecoder().decode(args.feed), output, args.feed)
+
+
+# Benchmark decoding generated feeds and print the results, which are compared to the baseline if requested
+def bench_decode(args):
+  if args.baseline and toml is None:
+    args.parser.error('the baseline requires the toml package')
+
+  print(f"{'trips':>8}  {'size':>12}  {'seconds':>8}" + (f"  {'baseline':>8}  {'speedup':>7}" if args.baseline else ''))
+  for row in benchmark_decode(args.trips or [1000, 10000, 100000], args.repeat, baseline = args.baseline):
+    baseline = f"  {row['baseline_seconds']:>8.3f}  {row['baseline_seconds'] / row['seconds']:>6.2f}x" if args.baseline else ''
+    print(f"{row['trips']:>8}  {row['size']:>12}  {row['seconds']:>8.3f}{baseline}", flush = True)
+
+
+# Decode a feed and print a report of the memory used by its objects
+def memory_report(args):
+  report = GATTFeedDecoder().decode(args.feed).memory_report()
+  print(f"{'type':<24}  {'count':>10}  {'bytes':>12}")
+  for name, row in report.items():
+    print(f"{name:<24}  {row['count']:>10}  {row['bytes']:>12}")
+  print(f"{'total':<24}  {sum(row['count'] for row in report.values()):>10}  {sum(row['bytes'] for row in report.values()):>12}")
+
+
+# Parse the command line arguments and execute the command
+def main(argv = None):
+  parser = argparse.ArgumentParser(prog = 'python -m timetable')
+  subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+  # Add the compile command
+  compile_parser = subparsers.add_parser('compile', help = 'compile a feed to a binary snapshot')
+  compile_parser.add_argument('feed', help = 'the GATT feed file, or a directory or glob pattern of GATT feed files')
+  compile_parser.add_argument('-o', '--output', help = 'the snapshot file, defaults to the feed file or directory with the extension .ttbin, required for a glob pattern')
+  compile_parser.set_defaults(function = compile_feed, parser = compile_parser)
+
+  # Add the plan-batch command
+  plan_batch_parser = subparsers.add_parser('plan-batch', help = 'plan the fastest journeys between many pairs of nodes')
+  plan_batch_parser.add_argument('feed', help = 'the GATT feed file, or a directory or glob pattern of GATT feed files')
+  plan_batch_parser.add_argument('--pairs', help = 'a CSV file with from_node and to_node columns, defaults to all pairs of nodes')
+  plan_batch_parser.add_argument('--time', action = 'append', required = True, help = 'a departure time in the format HH:MM, which can be repeated')
+  plan_batch_parser.add_argument('--workers', type = int, help = 'the number of worker processes, or 0 to plan in this process, defaults to the number of processors')
+  plan_batch_parser.add_argument('--max-rounds', type = int, help = 'the maximum number of trips of a journey')
+  plan_batch_parser.add_argument('--format', choices = ('csv', 'jsonl'), default = 'csv', help = 'the output format, defaults to csv')
+  plan_batch_parser.add_argument('--output', help = 'the output file, defaults to standard output')
+  plan_batch_parser.set_defaults(function = plan_batch)
+
+  # Add the bench-decode command
+  bench_decode_parser = subparsers.add_parser('bench-decode', help = 'benchmark decoding generated feeds')
+  bench_decode_parser.add_argument('--trips', type = int, action = 'append', help = 'the number of trips of a generated feed, which can be repeated, defaults to 1000, 10000 and 100000')
+  bench_decode_parser.add_argument('--repeat', type = int, default = 3, help = 'the number of times every feed is decoded, defaults to 3')
+  bench_decode_parser.add_argument('--baseline', action = 'store_true', help = 'also decode the feeds with the toml package and the garbage collector enabled, like before the decoder used tomllib, which requires the toml package')
+  bench_decode_parser.set_defaults(function = bench_decode, parser = bench_decode_parser)
+
+  # Add the memory-report command
+  memory_report_parser = subparsers.add_parser('memory-report', help = 'report the memory used by the objects of a feed')
+  memory_report_parser.add_argument('feed', help = 'the GATT feed file, or a directory or glob pattern of GATT feed files')
+  memory_report_parser.set_defaults(function = memory_report)
+
+  # Execute the command
+  args = parser.parse_args(argv)
+  args.function(args)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,89 @@
+import collections
+import os
+import random
+import tempfile
+import time
+
+from .decoder import GATTFeedDecoder
+
+try:
+  import toml
+except ImportError:
+  toml = None
+
+
+# Write a generated GATT feed with the specified number of trips to a file
+# Every route has 100 trips over 12 stops, and a tenth of the trips begin or end at another stop than their route
+def generate_feed(file, trip_count, seed = 0):
+  rnd = random.Random(seed)
+  route_count = max(trip_count // 100, 1)
+  node_count = max(route_count, 50)
+
+  lines = ['feed_id = "bench"', 'feed_name = "Benchmark"', '', '[agencies]', 'bench = {name = "Benchmark"}', '', '[modalities]', 'rail = {name = "Trein", priority = 1}', '', '[nodes]']
+  lines.extend(f'n{i} = {{name = "Station {i}", node = {"true" if i % 5 == 0 else "false"}}}' for i in range(node_count))
+  lines.append('')
+
+  # Generate the routes
+  route_nodes = []
+  for r in range(route_count):
+    nodes = rnd.sample(range(node_count), 12)
+    route_nodes.append(nodes)
+    lines.extend([f'[routes.r{r}]', 'agency = "bench"', 'modality = "rail"', f'name = "Route {r}"', '', f'[routes.r{r}.stops]'])
+    minutes = 0
+    for i, node in enumerate(nodes):
+      times = []
+      if i > 0:
+        minutes += rnd.randint(2, 10)
+        times.append(f'a = "{minutes // 60:02d}:{minutes % 60:02d}"')
+      if i < len(nodes) - 1:
+        minutes += rnd.randint(0, 2)
+        times.append(f'd = "{minutes // 60:02d}:{minutes % 60:02d}"')
+      lines.append(f'{i:02d} = {{node = "n{node}", {", ".join(times)}}}')
+    lines.append('')
+
+  # Generate the trips
+  lines.append('[trips]')
+  for t in range(trip_count):
+    r = t % route_count
+    minutes = rnd.randrange(5 * 60, 23 * 60)
+    extra = ''
+    if rnd.random() < 0.1:
+      extra = f', begin_at = "n{route_nodes[r][rnd.randrange(1, 6)]}"' if rnd.random() < 0.5 else f', end_at = "n{route_nodes[r][rnd.randrange(6, 11)]}"'
+    lines.append(f't{t} = {{route = "r{r}", time = "{minutes // 60:02d}:{minutes % 60:02d}"{extra}}}')
+
+  with open(file, 'w') as f:
+    f.write('\n'.join(lines) + '\n')
+
+
+# Decode a feed from a file like the decoder did before it used tomllib, which is parsing with the toml package with the garbage collector enabled
+def decode_baseline(decoder, file):
+  if toml is None:
+    raise ValueError("The baseline requires the toml package")
+  with open(file, encoding = 'utf-8') as f:
+    return decoder.decode_data(toml.load(f))
+
+
+# Return the best time in seconds of calling a function the specified number of times
+def measure(function, repeat):
+  times = []
+  for i in range(repeat):
+    start = time.perf_counter()
+    function()
+    times.append(time.perf_counter() - start)
+  return min(times)
+
+
+# Return the rows of a benchmark of decoding generated feeds with the specified numbers of trips, where the best time of the repeats is reported
+# If baseline is true, then the rows also contain the best time of decoding the feeds with the baseline, which allows to compare both decoders
+def benchmark_decode(trip_counts, repeat = 3, decoder = None, baseline = False):
+  decoder = decoder or GATTFeedDecoder()
+  with tempfile.TemporaryDirectory() as directory:
+    for trip_count in trip_counts:
+      file = os.path.join(directory, f"bench_{trip_count}.toml")
+      generate_feed(file, trip_count)
+
+      # Decode the feed and measure the best time
+      row = collections.OrderedDict(trips = trip_count, size = os.path.getsize(file), seconds = measure(lambda: decoder.decode(file), repeat))
+      if baseline:
+        row['baseline_seconds'] = measure(lambda: decode_baseline(decoder, file), repeat)
+      yield row
@@ -1,2 +1,3 @@
 from .decoder import FeedDecoder, FeedDecoderError
 from .decoder_gatt import GATTFeedDecoder
+from .decoder_snapshot import SnapshotFeedDecoder, write_snapshot
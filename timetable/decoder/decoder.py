@@ -1,3 +1,12 @@
+import contextlib
+import gc
+import sys
+
+
+# Properties of the model objects with strings that are interned when a feed is decoded
+INTERNED_PROPERTIES = ('name', 'short_name', 'abbr', 'color_text', 'color_bg')
+
+
 # Class that defines a feed decoder
 class FeedDecoder:
   # Decode a feed from a file
@@ -10,3 +19,29 @@ class FeedDecoderError(Exception):
   # Constructor
   def __init__(self, message):
     super().__init__(message)
+
+
+# Pause the garbage collector while a feed is decoded, since decoding creates many objects that are all kept alive
+@contextlib.contextmanager
+def pause_gc():
+  enabled = gc.isenabled()
+  gc.disable()
+  try:
+    yield
+  finally:
+    if enabled:
+      gc.enable()
+
+
+# Return an interned string, so equal strings in a feed share one object and compare by identity, or the value itself if it is not a string
+def intern_string(value):
+  return sys.intern(value) if isinstance(value, str) else value
+
+
+# Return a copy of the data of a model object updated with the keyword arguments, where the strings of the interned properties are interned
+def intern_data(data, **kwargs):
+  data = dict(data, **kwargs)
+  for property in INTERNED_PROPERTIES:
+    if property in data:
+      data[property] = intern_string(data[property])
+  return data
@@ -1,61 +1,151 @@
-import toml
+import concurrent.futures
+import glob
+import hashlib
+import os
 
-from .decoder import FeedDecoder, FeedDecoderError
-from ..model import Feed, Agency, Node, NodeType, Modality, ModalityType, Route, Trip, Transfer, StopList, Stop, Time
+from .decoder import FeedDecoder, FeedDecoderError, pause_gc, intern_data, intern_string
+from ..model import Feed, Agency, Node, NodeType, Modality, ModalityType, Route, Trip, Transfer, StopList, TripStopList, Stop, Time, Duration
+
+# Use the standard library TOML parser, or its backport before Python 3.11
+try:
+  import tomllib
+except ImportError:
+  import tomli as tomllib
+
+
+# Tables of a GATT file with objects that are merged by id when a feed is decoded from multiple files
+TABLES = ('agencies', 'nodes', 'modalities', 'routes', 'trips', 'transfers')
 
 
 # Class that defines a feed decoder for GATT feeds
+# A feed is decoded from a file, or from the TOML files in a directory or matching a glob pattern, which are parsed concurrently and merged into one feed
+# The parsed data of the files is cached by the digest of their contents, so files that did not change are not parsed again by the same decoder
 class GATTFeedDecoder(FeedDecoder):
-  # Decode a feed from a file
+  # Constructor
+  def __init__(self, **kwargs):
+    # Add optional properties
+    self.workers = kwargs.get('workers')  # Defaults to None, the number of processors, otherwise the number of processes that parse files concurrently
+
+    # parse_cache[digest] denotes the parsed data of a file with the digest of its contents
+    self.parse_cache = {}
+
+  # Decode a feed from a file, a directory or a glob pattern
   def decode(self, file):
-    # Parse the TOML file
-    try:
-      data = toml.load(file)
-    except toml.TomlDecodeError as err:
-      raise FeedDecoderError(err)
+    with pause_gc():
+      return self.decode_data(self.parse(file))
 
+  # Decode a feed from the parsed data of a TOML file
+  # If build_indexes is false, then the indexes are not built, so the caller can build them with trip tables that are built beforehand
+  def decode_data(self, data, build_indexes = True):
     # Create a new feed
     feed = Feed(id = data.get('feed_id'), name = data.get('feed_name'), author = data.get('feed_author'))
 
     # Load the agencies
     for id, agency_data in data.get('agencies', {}).items():
-      agency = self.load_agency(feed, id, agency_data)
+      agency = self.load_agency(feed, intern_string(id), agency_data)
       feed.agencies[agency.id] = agency
 
     # Load the nodes
     for id, node_data in data.get('nodes', {}).items():
-      node = self.load_node(feed, id, node_data)
+      node = self.load_node(feed, intern_string(id), node_data)
       feed.nodes[node.id] = node
 
     # Load the modalities
     for id, modality_data in data.get('modalities', {}).items():
-      modality = self.load_modality(feed, id, modality_data)
+      modality = self.load_modality(feed, intern_string(id), modality_data)
       feed.modalities[modality.id] = modality
 
     # Load the routes
     for id, route_data in data.get('routes', {}).items():
-      route = self.load_route(feed, id, route_data)
+      route = self.load_route(feed, intern_string(id), route_data)
       feed.routes[route.id] = route
 
     # Load the trips
     for id, trip_data in data.get('trips', {}).items():
-      trip = self.load_trip(feed, id, trip_data)
+      trip = self.load_trip(feed, intern_string(id), trip_data)
       feed.trips[trip.id] = trip
 
     # Load the transfers
     for id, transfer_data in data.get('transfers', {}).items():
-      transfer = self.load_transfer(feed, id, transfer_data)
+      transfer = self.load_transfer(feed, intern_string(id), transfer_data)
       feed.transfers[transfer.id] = transfer
 
+    # Build the indexes of the feed
+    if build_indexes:
+      feed.build_indexes()
+
     # Return the feed
     return feed
 
+  # Parse a TOML file, which is a path or a file object, or the TOML files in a directory or matching a glob pattern, which are merged
+  def parse(self, file):
+    if isinstance(file, (str, os.PathLike)) and (files := get_feed_files(file)) != [os.fspath(file)]:
+      return self.parse_files(files)
+    if isinstance(file, (str, bytes, os.PathLike)):
+      with open(file, 'rb') as f:
+        return parse_content(f.read(), file)
+    return parse_content(file.read(), getattr(file, 'name', None))
+
+  # Parse multiple TOML files and return their merged data
+  # Files that are not in the parse cache are parsed concurrently in a process pool, and the cache is replaced by the parsed data of the files
+  def parse_files(self, files):
+    if not files:
+      raise FeedDecoderError("No feed files found")
+
+    # Read the files and get the digests of their contents
+    contents = {}
+    digests = {}
+    for file in files:
+      with open(file, 'rb') as f:
+        contents[file] = f.read()
+      digests[file] = hashlib.blake2b(contents[file], digest_size = 16).digest()
+
+    # Parse the files with contents that are not cached, where files with equal contents are parsed once
+    missing = list({digests[file]: file for file in reversed(files) if digests[file] not in self.parse_cache}.values())
+    workers = min(self.workers or os.cpu_count() or 1, len(missing))
+    if workers > 1:
+      with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        results = list(executor.map(parse_content, [contents[file] for file in missing], missing))
+    else:
+      results = [parse_content(contents[file], file) for file in missing]
+
+    # Replace the cache by the parsed data of the files
+    parse_cache = {digests[file]: data for file, data in zip(missing, results)}
+    parse_cache.update((digests[file], self.parse_cache[digests[file]]) for file in files if digests[file] in self.parse_cache)
+    self.parse_cache = parse_cache
+
+    # Return the merged data of the files
+    return self.merge_data([(file, parse_cache[digests[file]]) for file in files])
+
+  # Merge the parsed data of multiple files, which is a list of tuples of the file and its data, into the data of one feed
+  # Objects with the same id in multiple files must have equal data, and the feed information is taken from the first file that defines it
+  # References between objects are not resolved, so objects can reference objects in other files when the merged data is decoded
+  @staticmethod
+  def merge_data(files):
+    data = {}
+    object_files = {}
+    for file, file_data in files:
+      for key, value in file_data.items():
+        if key not in TABLES:
+          data.setdefault(key, value)
+          continue
+
+        # Merge the objects of the table
+        table = data.setdefault(key, {})
+        for id, object_data in value.items():
+          if id not in table:
+            table[id] = object_data
+            object_files[key, id] = file
+          elif table[id] != object_data:
+            raise FeedDecoderError(f"Conflicting definitions of {key} id {id!r} in files {object_files[key, id]!r} and {file!r}")
+    return data
+
   # Load an agency
   @classmethod
   def load_agency(cls, feed, id, data):
     try:
       # Return a new agency based on the data
-      return Agency(feed, id, **data)
+      return Agency(feed, id, **intern_data(data))
     except KeyError as err:
       raise FeedDecoderError(f"Missing keyword argument {err} in agency {id!r}")
     except ValueError as err:
@@ -66,11 +156,14 @@ class GATTFeedDecoder(FeedDecoder):
   def load_node(cls, feed, id, data):
     try:
       # Parse optional properties
+      kwargs = intern_data(data)
       if 'type' in data:
-        data['type'] = NodeType[data['type']]
+        kwargs['type'] = NodeType[data['type']]
+      if 'change_time' in data:
+        kwargs['change_time'] = Duration.fromstring(data['change_time'])
 
       # Return a new node based on the data
-      return Node(feed, id, **data)
+      return Node(feed, id, **kwargs)
     except KeyError as err:
       raise FeedDecoderError(f"Missing keyword argument {err} in node {id!r}")
     except ValueError as err:
@@ -81,11 +174,12 @@ class GATTFeedDecoder(FeedDecoder):
   def load_modality(cls, feed, id, data):
     try:
       # Parse optional properties
+      kwargs = intern_data(data)
       if 'type' in data:
-        data['type'] = ModalityType[data['type']]
+        kwargs['type'] = ModalityType[data['type']]
 
       # Return a new modality based on the data
-      return Modality(feed, id, **data)
+      return Modality(feed, id, **kwargs)
     except KeyError as err:
       raise FeedDecoderError(f"Missing keyword argument {err} in modality {id!r}")
     except ValueError as err:
@@ -95,15 +189,11 @@ class GATTFeedDecoder(FeedDecoder):
   @classmethod
   def load_route(cls, feed, id, data):
     try:
-      # Parse required properties
-      data['agency'] = feed.get_agency(data['agency'])
-      data['modality'] = feed.get_modality(data['modality'])
-
-      # Parse the stops
-      data['stops'] = cls.load_route_stops(feed, id, data['stops'])
+      # Parse required properties and the stops
+      kwargs = intern_data(data, agency = feed.get_agency(data['agency']), modality = feed.get_modality(data['modality']), stops = cls.load_route_stops(feed, id, data['stops']))
 
       # Return a new route based on the data
-      return Route(feed, id, **data)
+      return Route(feed, id, **kwargs)
     except KeyError as err:
       raise FeedDecoderError(f"Missing keyword argument {err} in route {id!r}")
     except ValueError as err:
@@ -114,24 +204,23 @@ class GATTFeedDecoder(FeedDecoder):
   def load_trip(cls, feed, id, data):
     try:
       # Parse required properties
-      data['route'] = feed.get_route(data['route'])
-      data['time'] = Time.fromstring(data['time'])
+      kwargs = intern_data(data, route = feed.get_route(data['route']), time = Time.fromstring(data['time']))
 
       # Parse optional properties
       if 'begin_at' in data:
-        data['begin_at'] = feed.get_node(data['begin_at'])
+        kwargs['begin_at'] = feed.get_node(data['begin_at'])
       if 'end_at' in data:
-        data['end_at'] = feed.get_node(data['end_at'])
+        kwargs['end_at'] = feed.get_node(data['end_at'])
       if 'agency' in data:
-        data['agency'] = feed.get_agency(data['agency'])
+        kwargs['agency'] = feed.get_agency(data['agency'])
       if 'modality' in data:
-        data['modality'] = feed.get_modality(data['modality'])
+        kwargs['modality'] = feed.get_modality(data['modality'])
 
       # Parse the stops
-      data['stops'] = cls.load_trip_stops(feed, data['route'], data['time'], data.get('begin_at'), data.get('end_at'))
+      kwargs['stops'] = cls.load_trip_stops(feed, kwargs['route'], kwargs['time'], kwargs.get('begin_at'), kwargs.get('end_at'))
 
       # Return a new trip based on the data
-      return Trip(feed, id, **data)
+      return Trip(feed, id, **kwargs)
     except KeyError as err:
       raise FeedDecoderError(f"Missing keyword argument {err} in trip {id!r}")
     except ValueError as err:
@@ -142,12 +231,14 @@ class GATTFeedDecoder(FeedDecoder):
   def load_transfer(cls, feed, id, data):
     try:
       # Parse required properties
-      data['begin'] = feed.get_node(data['begin'])
-      data['end'] = feed.get_node(data['end'])
-      data['duration'] = Time.fromstring(data['duration'])
+      kwargs = dict(data, begin = feed.get_node(data['begin']), end = feed.get_node(data['end']))
+
+      # Parse optional properties
+      if 'duration' in data:
+        kwargs['duration'] = Duration.fromstring(data['duration'])
 
       # Return a new transfer based on the data
-      return Transfer(feed, id, **data)
+      return Transfer(feed, id, **kwargs)
     except KeyError as err:
       raise FeedDecoderError(f"Missing keyword argument {err} in transfer {id!r}")
     except ValueError as err:
@@ -162,20 +253,13 @@ class GATTFeedDecoder(FeedDecoder):
     # Iterate over the data
     for stop_sequence, stop_data in data.items():
       try:
-        # Parse required properties
-        stop_data['node'] = feed.get_node(stop_data['node'])
-
-        # Parse optional properties
-        if 'a' in stop_data:
-          stop_data['a'] = Time.fromstring(stop_data['a'])
-        if 'd' in stop_data:
-          stop_data['d'] = Time.fromstring(stop_data['d'])
-
-        # Create a new stop
-        stop = Stop(feed, stops, stop_sequence, **stop_data)
+        # Create a new stop with the parsed properties
+        a = Time.fromstring(stop_data['a']) if 'a' in stop_data else None
+        d = Time.fromstring(stop_data['d']) if 'd' in stop_data else None
+        stop = Stop(feed, stops, stop_sequence, node = feed.get_node(stop_data['node']), platform = intern_string(stop_data.get('platform')), a = a, d = d, skip = stop_data.get('skip', False))
 
         # Add the stop to the list
-        stops.stops.append(stop)
+        stops.append(stop)
       except KeyError as err:
         raise FeedDecoderError(f"Missing keyword argument {err} in route {route_id!r}, stop with sequence {stop_sequence!r}")
       except ValueError as err:
@@ -184,35 +268,57 @@ class GATTFeedDecoder(FeedDecoder):
     # Return the stop list
     return stops
 
-  # Load a stop list for a trip
+  # Load a stop list for a trip, which is a view of the stops of the route from begin_at up to end_at with the departure time of the trip added
   @classmethod
   def load_trip_stops(cls, feed, route, time, begin_at, end_at):
-    # Create a new stop list
-    stops = StopList(feed)
-
-    # Iterate over the stops in the route
-    for stop in route.stops:
-      # Create new arrival and departure times
-      a = stop.arrival + time if stop.arrival else None
-      d = stop.departure + time if stop.departure else None
-
-      # Create a new trip stop
-      trip_stop = Stop(feed, stops, stop.sequence, node = stop.node, platform = stop.platform, a = a, d = d, skip = stop.skip)
+    route_stops = route.stops.stops
 
-      # Add the stop to the list
-      stops.stops.append(trip_stop)
+    # Get the index of the first stop and the index after the last stop, where the last stop is the first stop at end_at from the first stop
+    begin = route.stops.get_stop_index_at_node(begin_at) if begin_at is not None else 0
+    end = len(route_stops)
+    if end_at is not None:
+      end = next((index + 1 for index in range(begin, end) if route_stops[index].node == end_at), None)
+      if end is None:
+        raise ValueError(f"No stops found with node {end_at!r}")
 
-    # Apply the begin and end stops
-    if begin_at is not None or end_at is not None:
-      if begin_at is not None:
-        stops = stops.beginning_at_node(begin_at)
-      if end_at is not None:
-        stops = stops.ending_at_node(end_at)
-
-      if len(stops) > 1:
-        stops.stops[0].arrival = None
-      if len(stops) > 0:
-        stops.stops[-1].departure = None
+    # Remove the arrival at the first stop and the departure at the last stop if the trip begins or ends at another stop than the route
+    no_arrival = begin if (begin_at is not None or end_at is not None) and end - begin > 1 else -1
+    no_departure = end - 1 if (begin_at is not None or end_at is not None) and end - begin > 0 else -1
 
     # Return the stop list
-    return stops
+    return TripStopList(feed, route.stops, time, begin, end, no_arrival, no_departure)
+
+
+# Parse the contents of a TOML file, which is a function at module level so it can be called in a process pool
+def parse_content(content, file = None):
+  content = content if isinstance(content, str) else content.decode()
+  try:
+    return tomllib.loads(content)
+  except tomllib.TOMLDecodeError as err:
+    raise FeedDecoderError(f"{err} in file {file!r}" if file is not None else str(err))
+
+
+# Return the TOML files of a path, which is a file, a directory that contains the files in any of its subdirectories or a glob pattern, sorted by path
+def get_feed_files(path):
+  path = os.fspath(path)
+  if os.path.isdir(path):
+    return sorted(glob.glob(os.path.join(glob.escape(path), '**', '*.toml'), recursive = True))
+  if is_feed_pattern(path):
+    return sorted(file for file in glob.glob(path, recursive = True) if os.path.isfile(file))
+  return [path]
+
+
+# Return if a path is a glob pattern of TOML files, which is a path that does not exist and contains glob characters
+def is_feed_pattern(path):
+  path = os.fspath(path)
+  return not os.path.exists(path) and any(char in path for char in '*?[')
+
+
+# Return the stamp of the TOML files of a path, which is the latest modification time and the total size of the files, and of the directory if the path is one
+def get_feed_stamp(path):
+  stats = [os.stat(file) for file in get_feed_files(path)]
+  if os.path.isdir(path):
+    stats.append(os.stat(path))
+  if not stats:
+    raise FileNotFoundError(f"No feed files found at {path!r}")
+  return (max(stat.st_mtime_ns for stat in stats), sum(stat.st_size for stat in stats))
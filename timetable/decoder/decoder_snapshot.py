@@ -0,0 +1,357 @@
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from .decoder import FeedDecoder, FeedDecoderError, pause_gc, intern_data, intern_string
+from .decoder_gatt import GATTFeedDecoder, get_feed_stamp
+from ..model import Feed, Agency, Node, NodeType, Modality, ModalityType, Route, Trip, TripTable, Transfer, StopList, TripStopList, Stop, Time, Duration
+
+
+# Magic bytes and format version of a snapshot file, where the version is incremented when the layout of the file changes
+SNAPSHOT_MAGIC = b'TTSNAP\r\n'
+SNAPSHOT_VERSION = 2
+
+# Layout of the header of a snapshot file, which is followed by the section table and the payload
+# The header contains the magic bytes, the format version, the number of sections, the modification time in nanoseconds and size of the source
+# file or -1 if there is none, the length of the payload and the CRC-32 checksum of the payload
+SNAPSHOT_HEADER = struct.Struct('<8sIIqqQI4x')
+
+# Layout of an entry in the section table, which contains the name, offset in the payload and length of a section
+SNAPSHOT_SECTION = struct.Struct('<32sQQ')
+
+# Value that denotes a missing time in the time arrays of a snapshot
+NO_TIME = -1
+
+# Properties of a trip that default to the properties of its route and are only stored if they differ
+TRIP_ROUTE_PROPERTIES = ('name', 'abbr', 'number', 'priority', 'remarks', 'services', 'color_text', 'color_bg')
+
+# Properties of the nodes and routes that are removed if they are empty dicts, so the objects share the default dict of the model
+EMPTY_PROPERTIES = ('remarks', 'services')
+
+
+# Class that defines a feed decoder for binary snapshots of a decoded feed, which are written by write_snapshot
+# A snapshot contains a JSON section with the properties of the objects in the feed and little-endian 64-bit integer arrays with the stops, times and trip tables
+# If a source file is specified, then the snapshot is rebuilt from the source when it is missing, invalid or written from another version of the source
+class SnapshotFeedDecoder(FeedDecoder):
+  # Constructor
+  def __init__(self, **kwargs):
+    # Add optional properties
+    self.source = kwargs.get('source')  # Defaults to None
+    self.source_decoder = kwargs.get('source_decoder', GATTFeedDecoder())  # Defaults to a GATT feed decoder
+
+  # Decode a feed from a file
+  def decode(self, file):
+    # Read the snapshot if there is no source to rebuild it from
+    if self.source is None:
+      return self.read(file)
+
+    # Read the snapshot if it is written from the current version of the source
+    try:
+      return self.read(file, get_feed_stamp(self.source))
+    except (OSError, FeedDecoderError):
+      pass
+
+    # Rebuild the snapshot from the source
+    feed = self.source_decoder.decode(self.source)
+    write_snapshot(feed, file, self.source)
+    return feed
+
+  # Read a feed from a snapshot file, which must be written from the source with the specified stamp if one is specified
+  def read(self, file, source_stamp = None):
+    with open(file, 'rb') as f:
+      # Validate the size of the file before mapping it, since an empty file cannot be mapped
+      if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+        raise FeedDecoderError(f"Snapshot {file!r} is truncated")
+      with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        # Parse and validate the header
+        magic, version, section_count, source_mtime, source_size, payload_length, checksum = SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC:
+          raise FeedDecoderError(f"File {file!r} is not a snapshot")
+        if version != SNAPSHOT_VERSION:
+          raise FeedDecoderError(f"Snapshot {file!r} has version {version}, expected version {SNAPSHOT_VERSION}")
+        if source_stamp is not None and source_stamp != (source_mtime, source_size):
+          raise FeedDecoderError(f"Snapshot {file!r} is older than its source")
+
+        # Validate the payload
+        payload_offset = SNAPSHOT_HEADER.size + section_count * SNAPSHOT_SECTION.size
+        if len(view) != payload_offset + payload_length:
+          raise FeedDecoderError(f"Snapshot {file!r} is truncated")
+        with view[payload_offset:] as payload:
+          if zlib.crc32(payload) != checksum:
+            raise FeedDecoderError(f"Snapshot {file!r} has an invalid checksum")
+
+        # Read the sections
+        sections = {}
+        for i in range(section_count):
+          name, offset, length = SNAPSHOT_SECTION.unpack_from(view, SNAPSHOT_HEADER.size + i * SNAPSHOT_SECTION.size)
+          name = name.rstrip(b'\0').decode()
+          with view[payload_offset + offset:payload_offset + offset + length] as section:
+            sections[name] = self.read_section(name, section)
+
+    # Return the feed
+    try:
+      with pause_gc():
+        return self.load_feed(sections)
+    except (KeyError, IndexError) as err:
+      raise FeedDecoderError(f"Snapshot {file!r} is missing {err}")
+
+  # Return the contents of a section, which is a JSON object for the meta section and a list of integers for the other sections
+  @classmethod
+  def read_section(cls, name, section):
+    if name == 'meta':
+      return json.loads(section.tobytes())
+    if sys.byteorder == 'little':
+      with section.cast('q') as integers:
+        return integers.tolist()
+    integers = array.array('q', section.tobytes())
+    integers.byteswap()
+    return integers.tolist()
+
+  # Load a feed from the sections of a snapshot
+  @classmethod
+  def load_feed(cls, sections):
+    meta = sections['meta']
+
+    # Create a new feed
+    feed = Feed(id = meta['feed']['id'], name = meta['feed']['name'], author = meta['feed']['author'])
+
+    # Load the agencies
+    for id, data in meta['agencies']:
+      id = intern_string(id)
+      feed.agencies[id] = Agency(feed, id, **intern_data(data))
+
+    # Load the nodes
+    nodes = []
+    for id, data in meta['nodes']:
+      id = intern_string(id)
+      data = intern_data(data, type = NodeType[data['type']], change_time = Duration(data['change_time']))
+      cls.remove_empty_properties(data)
+      node = feed.nodes[id] = Node(feed, id, **data)
+      nodes.append(node)
+
+    # Load the modalities
+    for id, data in meta['modalities']:
+      id = intern_string(id)
+      feed.modalities[id] = Modality(feed, id, **intern_data(data, type = ModalityType[data['type']]))
+
+    # Load the routes
+    route_stops_offset = sections['route_stops_offset']
+    route_stop_nodes = sections['route_stop_nodes']
+    route_stop_arrivals = sections['route_stop_arrivals']
+    route_stop_departures = sections['route_stop_departures']
+    route_stop_skips = sections['route_stop_skips']
+    routes = []
+    for r, (id, data) in enumerate(meta['routes']):
+      id = intern_string(id)
+      data = intern_data(data, agency = feed.agencies[data['agency']], modality = feed.modalities[data['modality']])
+      cls.remove_empty_properties(data)
+
+      # Load the stops of the route
+      stops = data['stops'] = StopList(feed)
+      for i, sequence, platform in zip(range(route_stops_offset[r], route_stops_offset[r + 1]), data.pop('sequences'), map(intern_string, data.pop('platforms'))):
+        stops.append(Stop(feed, stops, sequence, node = nodes[route_stop_nodes[i]], platform = platform, a = cls.get_time(route_stop_arrivals[i]), d = cls.get_time(route_stop_departures[i]), skip = bool(route_stop_skips[i])))
+
+      route = feed.routes[id] = Route(feed, id, **data)
+      routes.append(route)
+
+    # Load the trips
+    trip_stops_offset = sections['trip_stops_offset']
+    trip_stop_indexes = sections['trip_stop_indexes']
+    trip_stop_arrivals = sections['trip_stop_arrivals']
+    trip_stop_departures = sections['trip_stop_departures']
+    trip_views = sections['trip_views']
+    trips = []
+    for t, (id, route_index, data) in enumerate(meta['trips']):
+      id = intern_string(id)
+      data = intern_data(data)
+      route = data['route'] = routes[route_index]
+      if 'agency' in data:
+        data['agency'] = feed.agencies[data['agency']]
+      if 'modality' in data:
+        data['modality'] = feed.modalities[data['modality']]
+
+      # Load the stops of the trip, which are a view of the stops of the route or copy the stops of the route at the stored indexes
+      if trip_views[t * 5] != NO_TIME:
+        data['stops'] = TripStopList(feed, route.stops, Time(trip_views[t * 5]), *trip_views[t * 5 + 1:t * 5 + 5])
+      else:
+        route_stops = route.stops.stops
+        stops = data['stops'] = StopList(feed)
+        for i in range(trip_stops_offset[t], trip_stops_offset[t + 1]):
+          route_stop = route_stops[trip_stop_indexes[i]]
+          stops.append(Stop(feed, stops, route_stop.sequence, node = route_stop.node, platform = route_stop.platform, a = cls.get_time(trip_stop_arrivals[i]), d = cls.get_time(trip_stop_departures[i]), skip = route_stop.skip))
+
+      trip = feed.trips[id] = Trip(feed, id, **data)
+      trips.append(trip)
+
+    # Load the transfers
+    for id, data in meta['transfers']:
+      id = intern_string(id)
+      data['begin'] = feed.nodes[data['begin']]
+      data['end'] = feed.nodes[data['end']]
+      data['duration'] = Duration(data['duration'])
+      feed.transfers[id] = Transfer(feed, id, **data)
+
+    # Load the trip tables of the routes
+    table_trips_offset = sections['table_trips_offset']
+    table_trips = sections['table_trips']
+    table_fifo = sections['table_fifo']
+    table_columns_offset = sections['table_columns_offset']
+    table_columns = sections['table_columns']
+    table_arrival_columns = sections['table_arrival_columns']
+    table_column_trips_offset = sections['table_column_trips_offset']
+    table_column_trips = sections['table_column_trips']
+    table_arrival_column_trips = sections['table_arrival_column_trips']
+    trip_tables = {}
+    for r, route in enumerate(routes):
+      route_trips = [trips[t] for t in table_trips[table_trips_offset[r]:table_trips_offset[r + 1]]]
+      trip_count = len(route_trips)
+      column_offsets = [table_columns_offset[r] + index * trip_count for index in range(len(route.stops) + 1)]
+      columns = [table_columns[begin:end] for begin, end in zip(column_offsets, column_offsets[1:])]
+      arrival_columns = [table_arrival_columns[begin:end] for begin, end in zip(column_offsets, column_offsets[1:])]
+      if table_fifo[r]:
+        column_trips = arrival_column_trips = [None] * len(route.stops)
+      else:
+        column_offsets = [table_column_trips_offset[r] + index * trip_count for index in range(len(route.stops) + 1)]
+        column_trips = [[trips[t] for t in table_column_trips[begin:end]] for begin, end in zip(column_offsets, column_offsets[1:])]
+        arrival_column_trips = [[trips[t] for t in table_arrival_column_trips[begin:end]] for begin, end in zip(column_offsets, column_offsets[1:])]
+      trip_tables[route] = TripTable.from_columns(route, route_trips, bool(table_fifo[r]), columns, column_trips, arrival_columns, arrival_column_trips)
+
+    # Build the indexes of the feed with the loaded trip tables
+    feed.build_indexes(trip_tables)
+
+    # Return the feed
+    return feed
+
+  # Remove the properties of the data of a node or route that are empty dicts
+  @staticmethod
+  def remove_empty_properties(data):
+    for property in EMPTY_PROPERTIES:
+      if property in data and not data[property]:
+        del data[property]
+
+  # Return the time for the seconds in a time array, or None if there is no time
+  @staticmethod
+  def get_time(seconds):
+    return Time(seconds) if seconds != NO_TIME else None
+
+
+# Write a snapshot of a feed to a file, which is replaced atomically
+# If a source file is specified, then its stamp is stored so the snapshot can be rebuilt when the source changes
+def write_snapshot(feed, file, source = None):
+  nodes = list(feed.get_nodes())
+  node_indexes = {node: i for i, node in enumerate(nodes)}
+  routes = feed.get_routes()
+  route_indexes = {route: i for i, route in enumerate(routes)}
+
+  # Create the meta section with the properties of the objects in the feed
+  meta = {
+    'feed': {'id': feed.id, 'name': feed.name, 'author': feed.author},
+    'agencies': [(agency.id, {'name': agency.name, 'abbr': agency.abbr}) for agency in feed.get_agencies()],
+    'nodes': [(node.id, {'name': node.name, 'short_name': node.short_name, 'abbr': node.abbr, 'type': node.type.name, 'x': node.x, 'y': node.y, 'node': node.node, 'change_time': node.change_time.seconds, 'modalities': node.modalities, 'remarks': node.remarks, 'services': node.services}) for node in nodes],
+    'modalities': [(modality.id, {'name': modality.name, 'abbr': modality.abbr, 'type': modality.type.name, 'priority': modality.priority, 'color_text': modality.color_text, 'color_bg': modality.color_bg}) for modality in feed.get_modalities()],
+    'routes': [],
+    'trips': [],
+    'transfers': [(transfer.id, {'begin': transfer.begin.id, 'end': transfer.end.id, 'duration': transfer.duration.seconds, 'symmetric': transfer.symmetric}) for transfer in feed.get_transfers()],
+  }
+
+  # Create the arrays of the stops and times of the routes
+  arrays = {name: array.array('q') for name in ('route_stops_offset', 'route_stop_nodes', 'route_stop_arrivals', 'route_stop_departures', 'route_stop_skips', 'trip_views', 'trip_stops_offset', 'trip_stop_indexes', 'trip_stop_arrivals', 'trip_stop_departures', 'table_trips_offset', 'table_trips', 'table_fifo', 'table_columns_offset', 'table_columns', 'table_arrival_columns', 'table_column_trips_offset', 'table_column_trips', 'table_arrival_column_trips')}
+  arrays['route_stops_offset'].append(0)
+  for route in routes:
+    meta['routes'].append((route.id, {'agency': route.agency.id, 'modality': route.modality.id, 'name': route.name, 'abbr': route.abbr, 'number': route.number, 'remarks': route.remarks, 'services': route.services, 'priority': route.priority, 'color_text': route.color_text, 'color_bg': route.color_bg, 'sequences': [stop.sequence for stop in route.stops], 'platforms': [stop.platform for stop in route.stops]}))
+    for stop in route.stops:
+      arrays['route_stop_nodes'].append(node_indexes[stop.node])
+      arrays['route_stop_arrivals'].append(get_seconds(stop.arrival))
+      arrays['route_stop_departures'].append(get_seconds(stop.departure))
+      arrays['route_stop_skips'].append(1 if stop.skip else 0)
+    arrays['route_stops_offset'].append(len(arrays['route_stop_nodes']))
+
+  # Create the arrays of the stops and times of the trips
+  # The stops of a trip are stored as the time, begin, end, no_arrival and no_departure of its view of the stops of its route
+  # Other trips have NO_TIME as time and store every stop, which refers to the stop of its route with the same sequence
+  arrays['trip_stops_offset'].append(0)
+  for trip in feed.get_trips():
+    route = trip.route
+    data = {property: getattr(trip, property) for property in TRIP_ROUTE_PROPERTIES if getattr(trip, property) != getattr(route, property)}
+    if trip.agency != route.agency:
+      data['agency'] = trip.agency.id
+    if trip.modality != route.modality:
+      data['modality'] = trip.modality.id
+    meta['trips'].append((trip.id, route_indexes[route], data))
+
+    stops = trip.stops
+    if isinstance(stops, TripStopList) and not stops.materialized and stops.parent is route.stops:
+      arrays['trip_views'].extend((stops.time.seconds, stops.begin, stops.end, stops.no_arrival, stops.no_departure))
+      arrays['trip_stops_offset'].append(len(arrays['trip_stop_indexes']))
+      continue
+    arrays['trip_views'].extend((NO_TIME, -1, -1, -1, -1))
+
+    route_stop_indexes = {stop.sequence: index for index, stop in enumerate(route.stops)}
+    for stop in stops:
+      index = route_stop_indexes.get(stop.sequence)
+      if index is None or (route_stop := route.stops.stops[index]).node != stop.node or route_stop.platform != stop.platform or route_stop.skip != stop.skip:
+        raise ValueError(f"Stop with sequence {stop.sequence!r} of trip {trip.id!r} does not match a stop of route {route.id!r}")
+      arrays['trip_stop_indexes'].append(index)
+      arrays['trip_stop_arrivals'].append(get_seconds(stop.arrival))
+      arrays['trip_stop_departures'].append(get_seconds(stop.departure))
+    arrays['trip_stops_offset'].append(len(arrays['trip_stop_indexes']))
+
+  # Create the arrays of the trip tables of the routes, where the trips in a column are only stored for routes that are not FIFO
+  trip_indexes = {trip: i for i, trip in enumerate(feed.get_trips())}
+  for name in ('table_trips_offset', 'table_columns_offset', 'table_column_trips_offset'):
+    arrays[name].append(0)
+  for route in routes:
+    table = feed.get_trip_table(route)
+    arrays['table_trips'].extend(trip_indexes[trip] for trip in table.trips)
+    arrays['table_trips_offset'].append(len(arrays['table_trips']))
+    arrays['table_fifo'].append(1 if table.fifo else 0)
+    for column, arrival_column in zip(table.columns, table.arrival_columns):
+      arrays['table_columns'].extend(column)
+      arrays['table_arrival_columns'].extend(arrival_column)
+    arrays['table_columns_offset'].append(len(arrays['table_columns']))
+    if not table.fifo:
+      for column_trips, arrival_column_trips in zip(table.column_trips, table.arrival_column_trips):
+        arrays['table_column_trips'].extend(trip_indexes[trip] for trip in column_trips)
+        arrays['table_arrival_column_trips'].extend(trip_indexes[trip] for trip in arrival_column_trips)
+    arrays['table_column_trips_offset'].append(len(arrays['table_column_trips']))
+
+  # Create the sections
+  sections = [('meta', json.dumps(meta, separators = (',', ':')).encode())]
+  for name, integers in arrays.items():
+    if sys.byteorder != 'little':
+      integers.byteswap()
+    sections.append((name, integers.tobytes()))
+
+  # Create the section table and the payload, where every section is aligned to 8 bytes
+  section_table = bytearray()
+  payload = bytearray()
+  for name, data in sections:
+    section_table += SNAPSHOT_SECTION.pack(name.encode(), len(payload), len(data))
+    payload += data
+    payload += b'\0' * (-len(payload) % 8)
+
+  # Create the header
+  source_mtime, source_size = get_feed_stamp(source) if source is not None else (-1, -1)
+  header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections), source_mtime, source_size, len(payload), zlib.crc32(payload))
+
+  # Write the snapshot to a temporary file and replace the file with it
+  temp_file = f"{file}.{os.getpid()}.tmp"
+  try:
+    with open(temp_file, 'wb') as f:
+      f.write(header)
+      f.write(section_table)
+      f.write(payload)
+    os.replace(temp_file, file)
+  except BaseException:
+    if os.path.exists(temp_file):
+      os.remove(temp_file)
+    raise
+
+
+# Return the seconds of a time, or NO_TIME if there is no time
+def get_seconds(time):
+  return time.seconds if time is not None else NO_TIME
@@ -0,0 +1,183 @@
+import collections
+import datetime
+import hashlib
+import threading
+import time
+
+from .decoder import FeedDecoderError, GATTFeedDecoder
+from .decoder.decoder import pause_gc
+from .decoder.decoder_gatt import get_feed_stamp
+from .planner import CompiledFeed
+
+
+# Class that defines the state of a loaded feed, which is replaced as a whole when the feed is reloaded
+class FeedState:
+  __slots__ = ('feed', 'compiled_feed', 'version', 'loaded_at', 'load_duration', 'changed_routes', 'reused_routes')
+
+  # Constructor
+  def __init__(self, feed, compiled_feed, version, loaded_at, load_duration, changed_routes = None, reused_routes = 0):
+    self.feed = feed
+    self.compiled_feed = compiled_feed
+    self.version = version
+    self.loaded_at = loaded_at
+    self.load_duration = load_duration
+    self.changed_routes = changed_routes
+    self.reused_routes = reused_routes
+
+  # Return the internal representation for this state
+  def __repr__(self):
+    return f"<{self.__class__.__name__} version {self.version}>"
+
+  # Return the JSON representation for this state
+  def to_json(self):
+    return collections.OrderedDict(
+      version = self.version,
+      feed_id = self.feed.id,
+      feed_version = self.feed.version,
+      loaded_at = datetime.datetime.fromtimestamp(self.loaded_at).isoformat(timespec = 'seconds'),
+      load_duration = round(self.load_duration, 3),
+      routes = len(self.feed.routes),
+      trips = len(self.feed.trips),
+      changed_routes = self.changed_routes,
+      reused_routes = self.reused_routes,
+    )
+
+
+# Class that defines a manager of a feed that is decoded from a file or a directory of files and reloaded in a background thread when the watched files change
+# A reloaded GATT feed is compared to the live feed by route id, so the trip tables of routes of which the data and the trips did not change are reused
+# The state of the live feed is replaced atomically, so requests that already got the old state finish on the old feed
+class FeedManager:
+  # Constructor
+  def __init__(self, path, decoder = None, **kwargs):
+    self.path = path
+    self.decoder = decoder or GATTFeedDecoder()
+
+    # Add optional properties
+    self.source = kwargs.get('source') or path  # Defaults to path, otherwise the file that is watched for changes
+    self.interval = kwargs.get('interval')  # Defaults to None, otherwise the interval in seconds of polling the modification time of the source
+    self.compile = kwargs.get('compile', True)  # Defaults to True
+
+    # state denotes the state of the live feed, which is only replaced and never modified
+    self.state = None
+    self.last_error = None
+
+    # route_digests[id] denotes the digest of the data of the route with the id and its trips in the live feed
+    self.route_digests = {}
+    self.source_stat = None
+
+    # The lock serializes reloads, and the event stops the watch thread
+    self.lock = threading.Lock()
+    self.stopped = threading.Event()
+    self.thread = None
+
+    # Load the feed and start watching the source
+    self.reload()
+    if self.interval:
+      self.start()
+
+  # Return the live feed
+  @property
+  def feed(self):
+    return self.state.feed
+
+  # Return the compiled live feed
+  @property
+  def compiled_feed(self):
+    return self.state.compiled_feed
+
+  # Load the feed from the path, replace the live feed and return the new state
+  def reload(self):
+    with self.lock:
+      start = time.perf_counter()
+      source_stat = self.get_source_stat()
+
+      # Decode the feed, which reuses the trip tables of unchanged routes for a GATT feed
+      if isinstance(self.decoder, GATTFeedDecoder):
+        with pause_gc():
+          feed, route_digests, changed_routes, reused_routes = self.decode_incremental(self.decoder.parse(self.path))
+      else:
+        feed, route_digests, changed_routes, reused_routes = self.decoder.decode(self.path), {}, None, 0
+
+      # Compile the feed for the planner
+      compiled_feed = CompiledFeed.from_feed(feed) if self.compile else None
+
+      # Replace the state
+      version = self.state.version + 1 if self.state is not None else 1
+      self.state = FeedState(feed, compiled_feed, version, time.time(), time.perf_counter() - start, changed_routes, reused_routes)
+      self.route_digests = route_digests
+      self.source_stat = source_stat
+      self.last_error = None
+      return self.state
+
+  # Decode a feed from the parsed data of a GATT file and build its indexes with the trip tables of the routes that are unchanged in the live feed
+  # Return a tuple of the feed, the digests of its routes, the number of changed routes and the number of reused trip tables
+  def decode_incremental(self, data):
+    route_digests = self.get_route_digests(data)
+    feed = self.decoder.decode_data(data, build_indexes = False)
+
+    # Reuse the trip tables of the routes with the same digest as in the live feed
+    trip_tables = {}
+    if self.state is not None:
+      live_feed = self.state.feed
+      for route in feed.get_routes():
+        if route.id in live_feed.routes and self.route_digests.get(route.id) == route_digests[route.id]:
+          trip_tables[route] = live_feed.get_trip_table(live_feed.routes[route.id]).remapped(route, feed.trips)
+
+    # Build the indexes, which builds the trip tables of the other routes
+    feed.build_indexes(trip_tables)
+    changed_routes = len(feed.routes) - len(trip_tables) if self.state is not None else None
+    return feed, route_digests, changed_routes, len(trip_tables)
+
+  # Return a dict that maps the id of every route in the parsed data of a GATT file to a digest of the data of the route and its trips in feed order
+  @staticmethod
+  def get_route_digests(data):
+    route_trips = collections.defaultdict(list)
+    for id, trip_data in data.get('trips', {}).items():
+      route_trips[trip_data.get('route')].append((id, trip_data))
+    return {id: hashlib.blake2b(repr((route_data, route_trips[id])).encode(), digest_size = 16).digest() for id, route_data in data.get('routes', {}).items()}
+
+  # Return the stamp of the source, which is the latest modification time and the total size of its files, or None if there is no source or it cannot be read
+  def get_source_stat(self):
+    if self.source is None:
+      return None
+    try:
+      return get_feed_stamp(self.source)
+    except OSError:
+      return None
+
+  # Reload the feed if the source changed since it was loaded and return if the live feed was replaced
+  # If the feed cannot be decoded, then the live feed is kept and the error is stored until the source changes again
+  def check(self):
+    source_stat = self.get_source_stat()
+    if source_stat is None or source_stat == self.source_stat:
+      return False
+    try:
+      self.reload()
+      return True
+    except (FeedDecoderError, OSError, ValueError) as err:
+      self.last_error = str(err)
+      self.source_stat = source_stat
+      return False
+
+  # Start watching the source in a background thread
+  def start(self):
+    if self.thread is None:
+      self.stopped.clear()
+      self.thread = threading.Thread(target = self.watch, name = 'feed-manager', daemon = True)
+      self.thread.start()
+
+  # Stop watching the source
+  def stop(self):
+    if self.thread is not None:
+      self.stopped.set()
+      self.thread.join()
+      self.thread = None
+
+  # Poll the source until the manager is stopped
+  def watch(self):
+    while not self.stopped.wait(self.interval):
+      self.check()
+
+  # Return the JSON representation for this manager, which is the state of the live feed and the last error
+  def to_json(self):
+    return collections.OrderedDict(self.state.to_json(), last_error = self.last_error)
@@ -1,9 +1,12 @@
 from .agency import Agency
+from .departure_board import DepartureBoard
 from .feed import Feed
 from .modality import Modality, ModalityType
 from .node import Node, NodeType
 from .route import Route
-from .stop import StopList, Stop
+from .search_index import SearchIndex
+from .stop import StopList, StopListView, TripStopList, Stop
 from .transfer import Transfer
-from .trip import Trip
-from .utils import Time
+from .trip import Trip, TripView
+from .trip_table import TripTable
+from .utils import Time, Duration, References, JSON_MODES
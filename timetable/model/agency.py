@@ -5,6 +5,8 @@ import functools
 # Class that defines an agency
 @functools.total_ordering
 class Agency:
+  __slots__ = ('feed', 'id', 'name', 'abbr')
+
   # Constructor
   def __init__(self, feed, id, **kwargs):
     self.feed = feed
@@ -18,11 +20,11 @@ class Agency:
 
   # Return the routes that are part of this agency
   def get_routes_with_agency(self):
-    return filter(lambda route: route.agency == self, self.feed.get_routes())
+    return self.feed.get_routes_with_agency(self)
 
   # Return the trips that are part of this agency
   def get_trips_with_agency(self):
-    return filter(lambda trip: trip.agency == self, self.feed.get_trips())
+    return self.feed.get_trips_with_agency(self)
 
   # Return if this agency equals another object
   def __eq__(self, other):
@@ -48,8 +50,8 @@ class Agency:
   def __str__(self):
     return self.abbr or self.name
 
-  # Return the JSON representation for this agency
-  def to_json(self):
+  # Return the JSON representation for this agency, which is the same in every mode since it does not reference other objects
+  def to_json(self, mode = 'full', refs = None):
     return collections.OrderedDict(
       id = self.id,
       name = self.name,
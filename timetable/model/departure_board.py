@@ -0,0 +1,63 @@
+import array
+import bisect
+
+
+# Class that defines the departures or arrivals of the trips at a node sorted by their time at the node, which is built once per node
+# The board contains the time in seconds, the trip and the index of the stop at the node of every row, so a time window of the board is found by
+# a binary search and only the trips in the window are sliced at the node
+class DepartureBoard:
+  # Constructor
+  def __init__(self, node, trips, arrivals = False):
+    self.node = node
+    self.arrivals = arrivals
+
+    # Get the rows of the board, which contain the trips that do not begin at the node for arrivals or do not end at the node for departures
+    rows = []
+    for trip in trips:
+      if (trip.departure_node if arrivals else trip.arrival_node) == node:
+        continue
+
+      # Get the time of the trip at the first stop at the node, which falls back to the other time of the stop if the trip does not arrive or depart there
+      index = trip.stops.get_stop_index_at_node(node)
+      stop = trip.stops.beginning_at_index(index).departure
+      time = (stop.arrival or stop.departure) if arrivals else (stop.departure or stop.arrival)
+      if time is None:
+        continue
+      rows.append((int(time), trip.number, trip.id, index, trip))
+
+    # Sort the rows like the trips sliced at the node, which is by time, number and id
+    rows.sort(key = lambda row: row[:3])
+
+    # times[i], trips[i] and indexes[i] denote the time in seconds, the trip and the index of the stop at the node of the i-th row
+    self.times = array.array('q', (row[0] for row in rows))
+    self.trips = [row[4] for row in rows]
+    self.indexes = array.array('q', (row[3] for row in rows))
+
+  # Return the range of the rows with a time in seconds from after up to until, up to limit rows if a limit is specified
+  def get_range(self, after = None, limit = None, until = None):
+    begin = bisect.bisect_left(self.times, int(after)) if after is not None else 0
+    end = bisect.bisect_left(self.times, int(until), begin) if until is not None else len(self.times)
+    if limit is not None:
+      end = min(end, begin + max(limit, 0))
+    return begin, end
+
+  # Return the rows with a time in seconds from after up to until as tuples of the time, the number and the id of the trip and the trip itself
+  def get_rows(self, after = None, limit = None, until = None):
+    begin, end = self.get_range(after, limit, until)
+    return [(self.times[i], self.trips[i].number, self.trips[i].id, self.trips[i]) for i in range(begin, end)]
+
+  # Return the trips with a time at the node from after up to until, up to limit trips if a limit is specified
+  # The trips begin at the node for departures and end at the node for arrivals
+  def get_trips(self, after = None, limit = None, until = None):
+    begin, end = self.get_range(after, limit, until)
+    if self.arrivals:
+      return [self.trips[i].ending_at_index(self.indexes[i]) for i in range(begin, end)]
+    return [self.trips[i].beginning_at_index(self.indexes[i]) for i in range(begin, end)]
+
+  # Return the number of rows of this board
+  def __len__(self):
+    return len(self.times)
+
+  # Return the internal representation for this board
+  def __repr__(self):
+    return f"<{self.__class__.__name__} {self.node.id!r} {'arrivals' if self.arrivals else 'departures'} ({len(self)} rows)>"
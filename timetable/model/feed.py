@@ -1,3 +1,23 @@
+import collections
+import enum
+import itertools
+import sys
+
+from .agency import Agency
+from .departure_board import DepartureBoard
+from .modality import Modality
+from .node import Node
+from .route import Route
+from .search_index import SearchIndex
+from .transfer import Transfer
+from .trip import Trip
+from .trip_table import TripTable
+
+
+# Counter of the versions of the feeds, which increases on every change to any feed in this process
+feed_versions = itertools.count(1)
+
+
 # Class that defines a transit feed
 class Feed:
   # Constructor
@@ -14,6 +34,13 @@ class Feed:
     self.name = kwargs.get('name')  # Defaults to None
     self.author = kwargs.get('author')  # Defaults to None
 
+    # version denotes the version of the feed, which is unique among all feeds and their changes in this process, so caches can detect that the feed changed
+    # or that it was replaced by another feed, even if the other feed is at the same address in memory
+    self.version = next(feed_versions)
+
+    # Create the reverse indexes
+    self.clear_indexes()
+
   # Return all agencies
   def get_agencies(self):
     return list(self.agencies.values())
@@ -25,6 +52,16 @@ class Feed:
     except KeyError:
       raise ValueError(f"Undefined agency with id {id!r}")
 
+  # Add an agency with the specified id and data and return it
+  def add_agency(self, id, **kwargs):
+    if id in self.agencies:
+      raise ValueError(f"Duplicate agency id {id!r}")
+
+    agency = Agency(self, id, **kwargs)
+    self.agencies[id] = agency
+    self.version = next(feed_versions)
+    return agency
+
   # Return all nodes
   def get_nodes(self):
     return self.nodes.values()
@@ -38,7 +75,28 @@ class Feed:
 
   # Return a node with the specified name, or a default value if no such node exists
   def get_node_by_name(self, name, default = None):
-    return next(filter(lambda node: node.name == name, self.get_nodes()), default)
+    return self.get_search_index().get_node_by_name(name, default)
+
+  # Return the nodes that match a query, ranked by the search index of the feed and up to limit nodes if a limit is specified
+  def query_nodes(self, query, limit = None):
+    return self.get_search_index().query(query, limit)
+
+  # Return the search index of the nodes, which is built on first use and rebuilt when the feed changes
+  def get_search_index(self):
+    if self.search_index is None or self.search_index_version != self.version:
+      self.search_index = SearchIndex(self.get_nodes())
+      self.search_index_version = self.version
+    return self.search_index
+
+  # Add a node with the specified id and data and return it
+  def add_node(self, id, **kwargs):
+    if id in self.nodes:
+      raise ValueError(f"Duplicate node id {id!r}")
+
+    node = Node(self, id, **kwargs)
+    self.nodes[id] = node
+    self.version = next(feed_versions)
+    return node
 
   # Return all transfers
   def get_transfers(self):
@@ -47,10 +105,21 @@ class Feed:
   # Return a transfer with the specified id
   def get_transfer(self, id):
     try:
-      return self.transfers.get[id]
+      return self.transfers[id]
     except KeyError:
       raise ValueError(f"Undefined transfer with id {id!r}")
 
+  # Add a transfer with the specified id and data and return it
+  def add_transfer(self, id, **kwargs):
+    if id in self.transfers:
+      raise ValueError(f"Duplicate transfer id {id!r}")
+
+    transfer = Transfer(self, id, **kwargs)
+    self.transfers[id] = transfer
+    self.index_transfer(transfer)
+    self.version = next(feed_versions)
+    return transfer
+
   # Return all modalities
   def get_modalities(self):
     return self.modalities.values()
@@ -69,6 +138,7 @@ class Feed:
 
     modality = Modality(self, id, **kwargs)
     self.modalities[id] = modality
+    self.version = next(feed_versions)
     return modality
 
   # Return all routes
@@ -82,6 +152,17 @@ class Feed:
     except KeyError:
       raise ValueError(f"Undefined route with id {id!r}")
 
+  # Add a route with the specified id and data and return it
+  def add_route(self, id, **kwargs):
+    if id in self.routes:
+      raise ValueError(f"Duplicate route id {id!r}")
+
+    route = Route(self, id, **kwargs)
+    self.routes[id] = route
+    self.index_route(route)
+    self.version = next(feed_versions)
+    return route
+
   # Return all trips
   def get_trips(self):
     return self.trips.values()
@@ -92,3 +173,155 @@ class Feed:
       return self.trips[id]
     except KeyError:
       raise ValueError(f"Undefined trip with id {id!r}")
+
+  # Add a trip with the specified id and data and return it
+  def add_trip(self, id, **kwargs):
+    if id in self.trips:
+      raise ValueError(f"Duplicate trip id {id!r}")
+
+    trip = Trip(self, id, **kwargs)
+    self.trips[id] = trip
+    self.index_trip(trip)
+    self.version = next(feed_versions)
+    return trip
+
+  # Return the routes that have a stop at the specified node
+  def get_routes_with_node(self, node, skips = False):
+    return [route for route in self.node_routes.get(node, ()) if not skips or route.stops.has_stop_at_node(node, skips)]
+
+  # Return the trips that have a stop at the specified node
+  def get_trips_with_node(self, node, skips = False):
+    return [trip for trip in self.node_trips.get(node, ()) if not skips or trip.stops.has_stop_at_node(node, skips)]
+
+  # Return the departure board of the specified node, or the arrival board if arrivals is true, which is built on first use after the trips at the node changed
+  def get_departure_board(self, node, arrivals = False):
+    boards = self.node_arrival_boards if arrivals else self.node_departure_boards
+    if node not in boards:
+      boards[node] = DepartureBoard(node, self.get_trips_with_node(node), arrivals)
+    return boards[node]
+
+  # Return the transfers that begin at the specified node, including the reverse of symmetric transfers that end at the node
+  def get_transfers_with_node(self, node):
+    return list(self.node_transfers.get(node, ()))
+
+  # Return the trips that are part of the specified route
+  def get_trips_with_route(self, route):
+    return list(self.route_trips.get(route, ()))
+
+  # Return the trip table of the specified route, which is built on first use after its trips changed
+  def get_trip_table(self, route):
+    if route not in self.route_trip_tables:
+      self.route_trip_tables[route] = TripTable(route, self.get_trips_with_route(route))
+    return self.route_trip_tables[route]
+
+  # Return the routes that are part of the specified agency
+  def get_routes_with_agency(self, agency):
+    return list(self.agency_routes.get(agency, ()))
+
+  # Return the trips that are part of the specified agency
+  def get_trips_with_agency(self, agency):
+    return list(self.agency_trips.get(agency, ()))
+
+  # Return the routes that are part of the specified modality
+  def get_routes_with_modality(self, modality):
+    return list(self.modality_routes.get(modality, ()))
+
+  # Return the trips that are part of the specified modality
+  def get_trips_with_modality(self, modality):
+    return list(self.modality_trips.get(modality, ()))
+
+  # Clear the reverse indexes
+  def clear_indexes(self):
+    # Every index maps an object to the objects referencing it, in feed order
+    self.node_routes = collections.defaultdict(list)
+    self.node_trips = collections.defaultdict(list)
+    self.route_trips = collections.defaultdict(list)
+    self.agency_routes = collections.defaultdict(list)
+    self.agency_trips = collections.defaultdict(list)
+    self.modality_routes = collections.defaultdict(list)
+    self.modality_trips = collections.defaultdict(list)
+    self.node_transfers = collections.defaultdict(list)
+
+    # Trip tables of routes, which are removed when a trip is added to the route
+    self.route_trip_tables = {}
+
+    # Departure and arrival boards of nodes, which are removed when a trip is added at the node
+    self.node_departure_boards = {}
+    self.node_arrival_boards = {}
+
+    # Search index of the nodes and the version of the feed it was built for
+    self.search_index = None
+    self.search_index_version = None
+
+  # Rebuild the reverse indexes and trip tables from the routes and trips in the feed
+  # Trip tables that are built beforehand, such as in a snapshot, can be specified as a dict that maps routes to trip tables
+  def build_indexes(self, trip_tables = None):
+    self.version = next(feed_versions)
+    self.clear_indexes()
+    for route in self.get_routes():
+      self.index_route(route)
+    for trip in self.get_trips():
+      self.index_trip(trip)
+    for transfer in self.get_transfers():
+      self.index_transfer(transfer)
+    if trip_tables is not None:
+      self.route_trip_tables.update(trip_tables)
+    for route in self.get_routes():
+      self.get_trip_table(route)
+
+  # Add a route to the reverse indexes
+  def index_route(self, route):
+    for node in dict.fromkeys(route.stops.get_nodes()):
+      self.node_routes[node].append(route)
+    self.agency_routes[route.agency].append(route)
+    self.modality_routes[route.modality].append(route)
+
+  # Add a trip to the reverse indexes
+  def index_trip(self, trip):
+    for node in dict.fromkeys(trip.stops.get_nodes()):
+      self.node_trips[node].append(trip)
+      self.node_departure_boards.pop(node, None)
+      self.node_arrival_boards.pop(node, None)
+    self.route_trips[trip.route].append(trip)
+    self.route_trip_tables.pop(trip.route, None)
+    self.agency_trips[trip.agency].append(trip)
+    self.modality_trips[trip.modality].append(trip)
+
+  # Add a transfer to the reverse indexes
+  def index_transfer(self, transfer):
+    self.node_transfers[transfer.begin].append(transfer)
+    if transfer.symmetric:
+      self.node_transfers[transfer.end].append(transfer.reversed())
+
+  # Return a report of the memory used by the objects in the feed, which is an ordered dict that maps the name of every type to an ordered dict
+  # of the count and the size in bytes of its objects, sorted from the largest to the smallest size
+  # Every object that is reachable from the feed is counted once, except for the feed itself, None, booleans, classes and enum members
+  def memory_report(self):
+    report = collections.defaultdict(lambda: [0, 0])
+    seen = {id(self)}
+    stack = list(vars(self).values())
+    while stack:
+      obj = stack.pop()
+      if id(obj) in seen or obj is None or isinstance(obj, (bool, type, enum.Enum)):
+        continue
+      seen.add(id(obj))
+
+      # Count the object
+      counter = report[type(obj).__name__]
+      counter[0] += 1
+      counter[1] += sys.getsizeof(obj)
+
+      # Add the objects that are referenced by the object
+      if isinstance(obj, dict):
+        stack.extend(obj.keys())
+        stack.extend(obj.values())
+      elif isinstance(obj, (list, tuple, set, frozenset)):
+        stack.extend(obj)
+      else:
+        if hasattr(obj, '__dict__'):
+          stack.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+          stack.extend(getattr(obj, slot, None) for slot in getattr(cls, '__slots__', ()))
+
+    # Return the report sorted by size
+    return collections.OrderedDict((name, collections.OrderedDict(count = count, bytes = size)) for name, (count, size) in sorted(report.items(), key = lambda item: item[1][1], reverse = True))
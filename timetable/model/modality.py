@@ -7,6 +7,8 @@ import functools
 # Modalities are sorted based on their priorities, names and types
 @functools.total_ordering
 class Modality:
+  __slots__ = ('feed', 'id', 'name', 'abbr', 'type', 'priority', 'color_text', 'color_bg')
+
   # Constructor
   def __init__(self, feed, id, **kwargs):
     self.feed = feed
@@ -24,11 +26,11 @@ class Modality:
 
   # Return the routes that are part of this modality
   def get_routes_with_modality(self):
-    return filter(lambda route: route.modality == self, self.feed.get_routes())
+    return self.feed.get_routes_with_modality(self)
 
   # Return the trips that are part of this modality
   def get_trips_with_modality(self):
-    return filter(lambda trip: trip.modality == self, self.feed.get_trips())
+    return self.feed.get_trips_with_modality(self)
 
   # Return if this modality equals another object
   def __eq__(self, other):
@@ -54,8 +56,8 @@ class Modality:
   def __str__(self):
     return self.name
 
-  # Return the JSON representation for this modality
-  def to_json(self):
+  # Return the JSON representation for this modality, which is the same in every mode since it does not reference other objects
+  def to_json(self, mode = 'full', refs = None):
     return collections.OrderedDict(
       id = self.id,
       name = self.name,
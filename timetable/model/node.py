@@ -1,12 +1,17 @@
 import collections
 import enum
 import functools
+import heapq
+
+from .utils import Duration, EMPTY_DICT
 
 
 # Class that defines a node
 # Nodes sort aplhabetically based on their names and types
 @functools.total_ordering
 class Node:
+  __slots__ = ('feed', 'id', 'name', 'short_name', 'abbr', 'type', 'x', 'y', 'node', 'change_time', 'modalities', 'remarks', 'services')
+
   # Constructor
   def __init__(self, feed, id, **kwargs):
     self.feed = feed
@@ -22,21 +27,46 @@ class Node:
     self.x = kwargs.get('x') or kwargs.get('lon')  # Defaults to None
     self.y = kwargs.get('y') or kwargs.get('lat')  # Defaults to None
     self.node = kwargs.get('node', False)  # Defaults to False
+    self.change_time = kwargs.get('change_time', Duration(0))  # Defaults to 0
     self.modalities = kwargs.get('modalities', [])  # Defaults to []
-    self.remarks = kwargs.get('remarks', {})  # Defaults to {}
-    self.services = kwargs.get('services', {})  # Defaults to {}
+    self.remarks = kwargs.get('remarks', EMPTY_DICT)  # Defaults to a shared empty dict
+    self.services = kwargs.get('services', EMPTY_DICT)  # Defaults to a shared empty dict
 
   # Return the routes that have a stop at this node
   def get_routes_with_node(self, skips = False):
-    return filter(lambda route: route.stops.has_stop_at_node(self, skips), self.feed.get_routes())
+    return self.feed.get_routes_with_node(self, skips)
 
   # Return the trips that have a stop at this node
   def get_trips_with_node(self, skips = False):
-    return filter(lambda trip: trip.stops.has_stop_at_node(self, skips), self.feed.get_trips())
+    return self.feed.get_trips_with_node(self, skips)
 
-  # Return the transfers at this node
+  # Return the transfers that begin at this node
   def get_transfers_with_node(self):
-    return []
+    return self.feed.get_transfers_with_node(self)
+
+  # Return the trips that depart at this node from after up to until in order of their departure, up to limit trips if a limit is specified
+  # The trips begin at this node and do not include trips that end at this node
+  def departures(self, after = None, limit = None, until = None):
+    return self.feed.get_departure_board(self).get_trips(after, limit, until)
+
+  # Return the trips that arrive at this node from after up to until in order of their arrival, up to limit trips if a limit is specified
+  # The trips end at this node and do not include trips that begin at this node
+  def arrivals(self, after = None, limit = None, until = None):
+    return self.feed.get_departure_board(self, True).get_trips(after, limit, until)
+
+  # Return the trips that depart or arrive at this node from after up to until in order of their time at this node, up to limit trips if a limit is specified
+  # A trip that both arrives and departs at this node is returned once, at the earliest of its times
+  def get_trains(self, departures = True, arrivals = True, after = None, limit = None, until = None):
+    boards = ([self.feed.get_departure_board(self, True)] if arrivals else []) + ([self.feed.get_departure_board(self)] if departures else [])
+    rows = [board.get_rows(after, limit, until) for board in boards]
+
+    # Merge the rows of the boards, which are sorted by time, number and id
+    trips = {}
+    for time, number, id, trip in heapq.merge(*rows, key = lambda row: row[:3]):
+      trips.setdefault(id, trip)
+      if limit is not None and len(trips) >= limit:
+        break
+    return list(trips.values())
 
   # Return if this node equals another object
   def __eq__(self, other):
@@ -62,8 +92,8 @@ class Node:
   def __str__(self):
     return self.name
 
-  # Return the JSON representation for this node
-  def to_json(self):
+  # Return the JSON representation for this node, which is the same in every mode since it does not reference other objects
+  def to_json(self, mode = 'full', refs = None):
     return collections.OrderedDict(
       id = self.id,
       name = self.name,
@@ -73,6 +103,7 @@ class Node:
       x = self.x,
       y = self.y,
       node = self.node,
+      change_time = format(self.change_time, "%H:%M"),
       modalities = self.modalities,
       remarks = self.remarks,
       services = self.services,
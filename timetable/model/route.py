@@ -1,11 +1,15 @@
 import collections
 import functools
 
+from .utils import EMPTY_DICT, reference_to_json
+
 
 # Class that defines a route
 # Routes sort alphabetically based on their numbers
 @functools.total_ordering
 class Route:
+  __slots__ = ('feed', 'id', 'agency', 'modality', 'name', 'stops', 'abbr', 'number', 'remarks', 'services', 'priority', 'color_text', 'color_bg')
+
   # Constructor
   def __init__(self, feed, id, **kwargs):
     self.feed = feed
@@ -20,15 +24,19 @@ class Route:
     # Add optional properties
     self.abbr = kwargs.get('abbr')  # Defaults to None
     self.number = kwargs.get('number')  # Defaults to None
-    self.remarks = kwargs.get('remarks', {})  # Defaults to {}
-    self.services = kwargs.get('services', {})  # Defaults to {}
+    self.remarks = kwargs.get('remarks', EMPTY_DICT)  # Defaults to a shared empty dict
+    self.services = kwargs.get('services', EMPTY_DICT)  # Defaults to a shared empty dict
     self.priority = kwargs.get('priority', self.modality.priority)  # Defaults to priority of the modality
     self.color_text = kwargs.get('color_text', self.modality.color_text)  # Defaults to color_text of the modality
     self.color_bg = kwargs.get('color_bg', self.modality.color_bg)  # Defaults to color_bg of the modality
 
   # Return the trips that are part of this route
   def get_trips_with_route(self):
-    return filter(lambda trip: trip.route == self, self.feed.get_trips())
+    return self.feed.get_trips_with_route(self)
+
+  # Return the trips that are part of this route sorted by departure time at every stop
+  def get_trip_table(self):
+    return self.feed.get_trip_table(self)
 
   # Return the nodes that this route stops at or passes through
   def get_nodes(self, skips = False):
@@ -58,12 +66,12 @@ class Route:
   def __str__(self):
     return self.name
 
-  # Return the JSON representation for this route
-  def to_json(self):
+  # Return the JSON representation for this route, which references its agency, modality and nodes by id in reference mode
+  def to_json(self, mode = 'full', refs = None):
     return collections.OrderedDict(
       id = self.id,
-      agency = self.agency.to_json(),
-      modality = self.modality.to_json(),
+      agency = reference_to_json(self.agency, 'agencies', mode, refs),
+      modality = reference_to_json(self.modality, 'modalities', mode, refs),
       name = self.name,
       abbr = self.abbr,
       number = self.number,
@@ -72,5 +80,5 @@ class Route:
       priority = self.priority,
       color_text = self.color_text,
       color_bg = self.color_bg,
-      stops = self.stops.to_json(),
+      stops = self.stops.to_json(mode, refs),
     )
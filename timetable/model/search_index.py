@@ -0,0 +1,104 @@
+import array
+import bisect
+import heapq
+import re
+import unicodedata
+
+
+# Pattern of a word in a normalized string
+WORD_PATTERN = re.compile(r'\w+')
+
+# Ranks of a match, where a match at the start of a string ranks before a match at the start of another word in the string
+MATCH_STRING = 0
+MATCH_WORD = 1
+
+
+# Return a string that is folded for case and accents, so strings can be matched regardless of case and accents
+def normalize(string):
+  return ''.join(char for char in unicodedata.normalize('NFKD', string.casefold()) if not unicodedata.combining(char))
+
+
+# Class that defines a search index of nodes, which is built once per feed
+# The index contains a dict of the exact names and a sorted array of the normalized strings from the start of every word in the names, short names and
+# abbreviations, so the strings that start with a query are found by a binary search
+# A sparse table of the best ranked string in every range of the array selects the top results of a query without scanning or sorting all matches
+class SearchIndex:
+  # Constructor
+  def __init__(self, nodes, attributes = ('name', 'short_name', 'abbr')):
+    # nodes denotes the nodes in their natural order, which ranks nodes with matches of the same rank
+    self.nodes = sorted(nodes)
+
+    # names[name] denotes the first node in feed order with the specified name
+    self.names = {}
+    for node in nodes:
+      self.names.setdefault(node.name, node)
+
+    # Create the entries of every node, which are tuples of the normalized string from the start and from every word in an attribute of the node
+    # and the key of the match, which is the rank of the match times the number of nodes plus the order of the node
+    entries = set()
+    for order, node in enumerate(self.nodes):
+      for attribute in attributes:
+        value = getattr(node, attribute, None)
+        if isinstance(value, str):
+          string = normalize(value)
+          for start in dict.fromkeys([0] + [match.start() for match in WORD_PATTERN.finditer(string)]):
+            entries.add((string[start:], (MATCH_STRING if start == 0 else MATCH_WORD) * len(self.nodes) + order))
+    entries = sorted(entries)
+
+    # suffixes[i] and keys[i] denote the string and the key of the i-th entry in sorted order of the strings
+    self.suffixes = [suffix for suffix, key in entries]
+    self.keys = array.array('q', (key for suffix, key in entries))
+
+    # minimums[j][i] denotes the index of the entry with the smallest key in the entries from i up to i + 2 ** j
+    self.minimums = [array.array('q', range(len(entries)))]
+    width = 1
+    while width * 2 <= len(entries):
+      previous = self.minimums[-1]
+      self.minimums.append(array.array('q', (a if self.keys[a] <= self.keys[b] else b for a, b in zip(previous, previous[width:]))))
+      width *= 2
+
+  # Return the node with the specified name, or a default value if no such node exists
+  def get_node_by_name(self, name, default = None):
+    return self.names.get(name, default)
+
+  # Return the index of the entry with the smallest key in the entries from begin up to end
+  def get_minimum(self, begin, end):
+    level = (end - begin).bit_length() - 1
+    a = self.minimums[level][begin]
+    b = self.minimums[level][end - (1 << level)]
+    return a if self.keys[a] <= self.keys[b] else b
+
+  # Return the nodes of which a word in the name, short name or abbreviation starts with the query, regardless of case and accents
+  # The nodes are ranked by matches at the start of a string before matches at the start of another word and then by their order
+  # If a limit is specified, then only the top nodes up to the limit are returned
+  def query(self, query, limit = None):
+    query = normalize(query or '').strip()
+
+    # Return the nodes in their order if there is no query
+    if not query:
+      return self.nodes[:limit]
+
+    # Get the range of the entries with a string that starts with the query
+    begin = bisect.bisect_left(self.suffixes, query)
+    end = bisect.bisect_left(self.suffixes, query + '\U0010ffff', begin)
+
+    # Select the entries in the range in ascending order of their keys, which finds every node first at its best ranked match
+    orders = {}
+    heap = []
+    self.push_minimum(heap, begin, end)
+    while heap and (limit is None or len(orders) < limit):
+      key, index, begin, end = heapq.heappop(heap)
+      orders.setdefault(key % len(self.nodes), None)
+
+      # Add the ranges before and after the selected entry
+      self.push_minimum(heap, begin, index)
+      self.push_minimum(heap, index + 1, end)
+
+    # Return the nodes
+    return [self.nodes[order] for order in orders]
+
+  # Push the entry with the smallest key in the entries from begin up to end and its range on a heap, if the range is not empty
+  def push_minimum(self, heap, begin, end):
+    if begin < end:
+      index = self.get_minimum(begin, end)
+      heapq.heappush(heap, (self.keys[index], index, begin, end))
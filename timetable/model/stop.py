@@ -1,42 +1,94 @@
 import collections
 import functools
+import itertools
+
+from .utils import reference_to_json
 
 
 # Class that defines a list of stops
 class StopList:
+  __slots__ = ('feed', '_stops', '_node_indexes', '_slice_node_indexes')
+
   # Constructor
   def __init__(self, feed, stops = None):
     self.feed = feed
     self.stops = stops or []
 
+  # Return the list of stops
+  @property
+  def stops(self):
+    return self._stops
+
+  # Set the list of stops and invalidate the node indexes
+  @stops.setter
+  def stops(self, stops):
+    self._stops = stops
+    self._node_indexes = None
+    self._slice_node_indexes = None
+
+  # Append a stop to this stop list
+  def append(self, stop):
+    self._stops.append(stop)
+    self._node_indexes = None
+    self._slice_node_indexes = None
+
+  # Return a dict that maps each node to the index of its first stop, which is built on first use
+  def get_node_indexes(self, skips = False):
+    if self._node_indexes is None:
+      indexes = {}
+      indexes_skips = {}
+      for index, stop in enumerate(self._stops):
+        indexes.setdefault(stop.node, index)
+        if not stop.skip:
+          indexes_skips.setdefault(stop.node, index)
+      self._node_indexes = (indexes, indexes_skips)
+    return self._node_indexes[1 if skips else 0]
+
+  # Return a dict that maps each node to the index of its first stop in the stops from begin up to end, relative to begin
+  # The dicts are cached per slice, so they are shared by the trip stop lists that view the same slice of this stop list
+  def get_slice_node_indexes(self, begin, end, skips = False):
+    key = (begin, end, skips)
+    if self._slice_node_indexes is None:
+      self._slice_node_indexes = {}
+    if (indexes := self._slice_node_indexes.get(key)) is None:
+      indexes = {}
+      for index, stop in enumerate(self._stops[begin:end]):
+        if not skips or not stop.skip:
+          indexes.setdefault(stop.node, index)
+      self._slice_node_indexes[key] = indexes
+    return indexes
+
+  # Return a tuple of the departure and arrival times in seconds at the first stop that is not skipped at every specified node, or None if there is no time
+  def get_seconds_at_nodes(self, nodes):
+    node_indexes = self.get_node_indexes(True)
+    stops = [self.stops[index] if (index := node_indexes.get(node)) is not None else None for node in nodes]
+    departures = [stop.departure.seconds if stop is not None and stop.departure is not None else None for stop in stops]
+    arrivals = [stop.arrival.seconds if stop is not None and stop.arrival is not None else None for stop in stops]
+    return departures, arrivals
+
   # Get the nodes that this stop list stops at or passes through
   def get_nodes(self, skips = False):
     return [stop.node for stop in self.stops if not skips or not stop.skip]
 
   # Return the stop with the specified node
   def get_stop_at_node(self, node, skips = False):
-    for stop in self.stops:
-      if stop.node == node and (not skips or not stop.skip):
-        return stop
-
-    raise ValueError(f"No stops found with node {node!r}")
+    return self.stops[self.get_stop_index_at_node(node, skips)]
 
   # Return the index of the stop with the specified node
   def get_stop_index_at_node(self, node, skips = False):
-    return self.stops.index(self.get_stop_at_node(node))
+    try:
+      return self.get_node_indexes(skips)[node]
+    except KeyError:
+      raise ValueError(f"No stops found with node {node!r}")
 
   # Return if the stop list contains a stop with the specified node
   def has_stop_at_node(self, node, skips = False):
-    try:
-      self.get_stop_at_node(node)
-      return True
-    except ValueError:
-      return False
+    return node in self.get_node_indexes(skips)
 
   # Return the platform at the stop with the specified node
   def get_platform_at_node(self, node):
     try:
-      return self.get_stop_at_node(node, True).arrival
+      return self.get_stop_at_node(node, True).platform
     except ValueError:
       return None
 
@@ -61,21 +113,27 @@ class StopList:
     except ValueError:
       return None
 
-  # Return the stop list beginning at the specified node
+  # Return the stop list beginning at the specified node, which is a view of the stops of this stop list
   def beginning_at_node(self, node):
     if node is None:
       return self
 
-    index = self.get_stop_index_at_node(node)
-    return StopList(self.feed, self.stops[index:])
+    return self.beginning_at_index(self.get_stop_index_at_node(node))
 
-  # Return the stop list starting at the specified node
+  # Return the stop list ending at the specified node, which is a view of the stops of this stop list
   def ending_at_node(self, node):
     if node is None:
       return self
 
-    index = self.get_stop_index_at_node(node)
-    return StopList(self.feed, self.stops[:index + 1])
+    return self.ending_at_index(self.get_stop_index_at_node(node))
+
+  # Return the stop list beginning at the stop with the specified index, which is a view of the stops of this stop list
+  def beginning_at_index(self, index):
+    return StopListView(self.feed, self, index, len(self._stops))
+
+  # Return the stop list ending at the stop with the specified index, which is a view of the stops of this stop list
+  def ending_at_index(self, index):
+    return StopListView(self.feed, self, 0, index + 1)
 
   # Return the departure of this stop list
   @property
@@ -101,7 +159,7 @@ class StopList:
 
   # Return if this stop list equals another object
   def __eq__(self, other):
-    if not isinstance(other, self.__class__):
+    if not isinstance(other, StopList):
       return False
     return self.stops == other.stops
 
@@ -110,14 +168,220 @@ class StopList:
     return '\n'.join(str(stop) for stop in self.stops)
 
   # Return the JSON representation for this stop list
-  def to_json(self):
-    return [stop.to_json() for stop in self.stops]
+  def to_json(self, mode = 'full', refs = None):
+    return [stop.to_json(mode, refs) for stop in self.stops]
+
+
+# Class that defines a view of the stops of a parent stop list from begin up to end, which shares the list of stops of the parent instead of copying it
+# Slicing a view returns a view of the same parent, so chained slices do not create intermediate lists
+# Accessing the stops as a list materializes them, after which this stop list behaves like a regular stop list that is independent of its parent
+class StopListView(StopList):
+  __slots__ = ('parent', 'begin', 'end')
+
+  # Constructor
+  def __init__(self, feed, parent, begin = 0, end = None):
+    self.feed = feed
+    self.parent = parent
+    self.begin = begin
+    self.end = end if end is not None else len(parent.stops)
+    self._stops = None
+    self._node_indexes = None
+    self._slice_node_indexes = None
+
+  # Return if the stops are materialized as a list
+  @property
+  def materialized(self):
+    return self._stops is not None
+
+  # Return the list of stops, which materializes them
+  @property
+  def stops(self):
+    if self._stops is None:
+      self._stops = [self.get_stop(index) for index in range(self.begin, self.end)]
+    return self._stops
+
+  # Set the list of stops and invalidate the node indexes
+  @stops.setter
+  def stops(self, stops):
+    self._stops = stops
+    self._node_indexes = None
+    self._slice_node_indexes = None
+
+  # Append a stop to this stop list, which materializes the stops
+  def append(self, stop):
+    self.stops.append(stop)
+    self._node_indexes = None
+    self._slice_node_indexes = None
+
+  # Return the stop with the specified index in the parent
+  def get_stop(self, index):
+    return self.parent.stops[index]
+
+  # Return a view of the same parent from begin up to end
+  def get_slice(self, begin, end):
+    return StopListView(self.feed, self.parent, begin, end)
+
+  # Return a dict that maps each node to the index of its first stop, which is shared with the views of the same slice of the parent
+  def get_node_indexes(self, skips = False):
+    if self._stops is not None:
+      return super().get_node_indexes(skips)
+    return self.parent.get_slice_node_indexes(self.begin, self.end, skips)
+
+  # Get the nodes that this stop list stops at or passes through
+  def get_nodes(self, skips = False):
+    if self._stops is not None:
+      return super().get_nodes(skips)
+    return [stop.node for stop in itertools.islice(self.parent.stops, self.begin, self.end) if not skips or not stop.skip]
+
+  # Return the stop with the specified node
+  def get_stop_at_node(self, node, skips = False):
+    if self._stops is not None:
+      return super().get_stop_at_node(node, skips)
+    return self.get_stop(self.begin + self.get_stop_index_at_node(node, skips))
+
+  # Return the stop list beginning at the stop with the specified index, which is a view of the same parent if the stops are not materialized
+  def beginning_at_index(self, index):
+    if self._stops is not None:
+      return super().beginning_at_index(index)
+    return self.get_slice(self.begin + index, self.end)
+
+  # Return the stop list ending at the stop with the specified index, which is a view of the same parent if the stops are not materialized
+  def ending_at_index(self, index):
+    if self._stops is not None:
+      return super().ending_at_index(index)
+    return self.get_slice(self.begin, self.begin + index + 1)
+
+  # Return the departure of this stop list
+  @property
+  def departure(self):
+    if self._stops is not None:
+      return super().departure
+    return self.get_stop(self.begin) if self.end > self.begin else None
+
+  # Return the arrival of this stop list
+  @property
+  def arrival(self):
+    if self._stops is not None:
+      return super().arrival
+    return self.get_stop(self.end - 1) if self.end > self.begin else None
+
+  # Return an iterator for this stop list, which does not materialize the stops
+  def __iter__(self):
+    if self._stops is not None:
+      return iter(self._stops)
+    return (self.get_stop(index) for index in range(self.begin, self.end))
+
+  # Return the length for this stop list
+  def __len__(self):
+    if self._stops is not None:
+      return len(self._stops)
+    return self.end - self.begin
+
+  # Return the boolean value for this stop list
+  def __bool__(self):
+    return len(self) > 0
+
+  # Return if this stop list equals another object
+  def __eq__(self, other):
+    if type(other) is StopListView and self._stops is None and other._stops is None and self.parent is other.parent and (self.begin, self.end) == (other.begin, other.end):
+      return True
+    return super().__eq__(other)
+
+  # Return the string representation for this stop list
+  def __str__(self):
+    return '\n'.join(str(stop) for stop in self)
+
+  # Return the JSON representation for this stop list
+  def to_json(self, mode = 'full', refs = None):
+    return [stop.to_json(mode, refs) for stop in self]
+
+
+# Class that defines a view of the stops of a trip, which are the stops of its route from begin up to end with the departure time of the trip added
+# The arrival at the stop with index no_arrival and the departure at the stop with index no_departure in the route are removed, or none if the index is -1
+# The times are computed when they are accessed, and Stop objects are only created when the stops are iterated, converted or accessed as a list
+class TripStopList(StopListView):
+  __slots__ = ('time', 'no_arrival', 'no_departure')
+
+  # Constructor
+  def __init__(self, feed, route_stops, time, begin = 0, end = None, no_arrival = -1, no_departure = -1):
+    super().__init__(feed, route_stops, begin, end)
+    self.time = time
+    self.no_arrival = no_arrival
+    self.no_departure = no_departure
+
+  # Return a new stop for the stop with the specified index in the route
+  def get_stop(self, index):
+    stop = self.parent.stops[index]
+    arrival = stop.arrival + self.time if stop.arrival is not None and index != self.no_arrival else None
+    departure = stop.departure + self.time if stop.departure is not None and index != self.no_departure else None
+    return Stop(self.feed, self, stop.sequence, node = stop.node, platform = stop.platform, a = arrival, d = departure, skip = stop.skip)
+
+  # Return a view of the same route stops and times from begin up to end
+  def get_slice(self, begin, end):
+    return TripStopList(self.feed, self.parent, self.time, begin, end, self.no_arrival, self.no_departure)
+
+  # Return the route stop at the specified node and the index of the stop in the route, or None if there is no such stop
+  def get_route_stop_at_node(self, node):
+    index = self.get_node_indexes(True).get(node)
+    if index is None:
+      return None, None
+    return self.parent.stops[self.begin + index], self.begin + index
+
+  # Return a tuple of the departure and arrival times in seconds at the first stop that is not skipped at every specified node, or None if there is no time
+  def get_seconds_at_nodes(self, nodes):
+    if self._stops is not None:
+      return super().get_seconds_at_nodes(nodes)
+
+    offset = self.time.seconds
+    departures = []
+    arrivals = []
+    for node in nodes:
+      stop, index = self.get_route_stop_at_node(node)
+      departures.append(stop.departure.seconds + offset if stop is not None and stop.departure is not None and index != self.no_departure else None)
+      arrivals.append(stop.arrival.seconds + offset if stop is not None and stop.arrival is not None and index != self.no_arrival else None)
+    return departures, arrivals
+
+  # Return the platform at the stop with the specified node
+  def get_platform_at_node(self, node):
+    if self._stops is not None:
+      return super().get_platform_at_node(node)
+    stop, index = self.get_route_stop_at_node(node)
+    return stop.platform if stop is not None else None
+
+  # Return the arrival time at the stop with the specified node
+  def get_arrival_at_node(self, node):
+    if self._stops is not None:
+      return super().get_arrival_at_node(node)
+    stop, index = self.get_route_stop_at_node(node)
+    return stop.arrival + self.time if stop is not None and stop.arrival is not None and index != self.no_arrival else None
+
+  # Return the departure time at the stop with the specified node
+  def get_departure_at_node(self, node):
+    if self._stops is not None:
+      return super().get_departure_at_node(node)
+    stop, index = self.get_route_stop_at_node(node)
+    return stop.departure + self.time if stop is not None and stop.departure is not None and index != self.no_departure else None
+
+  # Return if the stop with the specified node is skipped
+  def get_skip_at_node(self, node):
+    if self._stops is not None:
+      return super().get_skip_at_node(node)
+    stop, index = self.get_route_stop_at_node(node)
+    return stop.skip if stop is not None else None
+
+  # Return if this stop list equals another object
+  def __eq__(self, other):
+    if isinstance(other, TripStopList) and self._stops is None and other._stops is None:
+      return self.parent is other.parent and (self.time, self.begin, self.end, self.no_arrival, self.no_departure) == (other.time, other.begin, other.end, other.no_arrival, other.no_departure)
+    return super().__eq__(other)
 
 
 # Class that defines a stop
 # Stop sort alphabetically by their sequences
 @functools.total_ordering
 class Stop:
+  __slots__ = ('feed', 'stop_list', 'sequence', 'node', 'platform', 'arrival', 'departure', 'skip')
+
   # Constructor
   def __init__(self, feed, stop_list, sequence, **kwargs):
     self.feed = feed
@@ -160,11 +424,11 @@ class Stop:
     buffer += f" (platform {self.platform})" if self.platform is not None else ""
     return buffer
 
-  # Return the JSON representation for this stop
-  def to_json(self):
+  # Return the JSON representation for this stop, which references its node by id in reference mode
+  def to_json(self, mode = 'full', refs = None):
     return collections.OrderedDict(
       sequence = self.sequence,
-      node = self.node.to_json(),
+      node = reference_to_json(self.node, 'nodes', mode, refs),
       platform = self.platform,
       arrival = format(self.arrival, "%H:%M") if self.arrival else None,
       departure = format(self.departure, "%H:%M") if self.departure else None,
@@ -1,8 +1,15 @@
-from .utils import Time
+import collections
+import functools
+
+from .utils import Duration, reference_to_json
 
 
 # Class that defines a transfer
+# Transfers sort based on their begin and end nodes
+@functools.total_ordering
 class Transfer:
+  __slots__ = ('feed', 'id', 'begin', 'end', 'duration', 'symmetric')
+
   # Constructor
   def __init__(self, feed, id, **kwargs):
     self.feed = feed
@@ -11,35 +18,45 @@ class Transfer:
     # Add required properties
     self.begin = kwargs['begin']
     self.end = kwargs['end']
-    self.duration = kwargs.get('duration', Time(0))  # Defaults to 0
+
+    # Add optional properties
+    self.duration = kwargs.get('duration', Duration(0))  # Defaults to 0
+    self.symmetric = kwargs.get('symmetric', False)  # Defaults to False
+
+  # Return the transfer in the opposite direction
+  def reversed(self):
+    return Transfer(self.feed, self.id, begin = self.end, end = self.begin, duration = self.duration, symmetric = self.symmetric)
 
   # Return if this transfer equals another object
   def __eq__(self, other):
     if not isinstance(other, self.__class__):
       return False
-    return (self.stop_list, self.sequence) == (other.stop_list, other.sequence)
+    return (self.id, self.begin, self.end) == (other.id, other.begin, other.end)
 
   # Return if this transfer is less than another object
   def __lt__(self, other):
     if not isinstance(other, self.__class__):
       return NotImplemented
-    if self.stop_list != other.stop_list:
-      return NotImplemented
-    return self.sequence < other.sequence
+    return (self.begin, self.end, self.id) < (other.begin, other.end, other.id)
+
+  # Return the hash for this transfer
+  def __hash__(self):
+    return hash((self.id, self.begin, self.end))
 
-  # Return the internal representation for this stop
+  # Return the internal representation for this transfer
   def __repr__(self):
     return f"<{self.__class__.__name__} {self.id!r}>"
 
-  # Return the string representation for this stop
+  # Return the string representation for this transfer
   def __str__(self):
     return f"Transfer between {self.begin} and {self.end}"
 
-  # Return the JSON representation for this stop
-  def to_json(self):
+  # Return the JSON representation for this transfer, which references its nodes by id in reference mode
+  def to_json(self, mode = 'full', refs = None):
     return collections.OrderedDict(
       id = self.id,
-      begin = self.begin,
-      end = self.end,
-      duration = self.duration,
+      begin = reference_to_json(self.begin, 'nodes', mode, refs),
+      end = reference_to_json(self.end, 'nodes', mode, refs),
+      duration = format(self.duration, "%H:%M"),
+      symmetric = self.symmetric,
     )
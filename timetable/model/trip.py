@@ -1,12 +1,15 @@
 import collections
-import copy
 import functools
 
+from .utils import reference_to_json
+
 
 # Class that defines a trip
 # Trips sort chronologically based on their canonical times and numbers
 @functools.total_ordering
 class Trip:
+  __slots__ = ('feed', 'id', 'route', 'stops', 'agency', 'modality', 'name', 'abbr', 'number', 'priority', 'remarks', 'services', 'color_text', 'color_bg')
+
   # Constructor
   def __init__(self, feed, id, **kwargs):
     self.feed = feed
@@ -75,29 +78,33 @@ class Trip:
   # Return the nodes of this trip
   @property
   def nodes(self):
-    return [stop.node for stop in self.stops]
+    return self.stops.get_nodes()
 
-  # Return the trip beginning at the specified node
+  # Return the trip beginning at the specified node, which is a view of this trip
   def beginning_at_node(self, node):
-    trip = copy.copy(self)
-    trip.stops = trip.stops.beginning_at_node(node)
-    return trip
+    return TripView(self, self.stops.beginning_at_node(node))
 
-  # Return the trip starting at the specified node
+  # Return the trip ending at the specified node, which is a view of this trip
   def ending_at_node(self, node):
-    trip = copy.copy(self)
-    trip.stops = trip.stops.ending_at_node(node)
-    return trip
+    return TripView(self, self.stops.ending_at_node(node))
+
+  # Return the trip beginning at the stop with the specified index, which is a view of this trip
+  def beginning_at_index(self, index):
+    return TripView(self, self.stops.beginning_at_index(index))
+
+  # Return the trip ending at the stop with the specified index, which is a view of this trip
+  def ending_at_index(self, index):
+    return TripView(self, self.stops.ending_at_index(index))
 
   # Return if this trip equals another object
   def __eq__(self, other):
-    if not isinstance(other, self.__class__):
+    if not isinstance(other, Trip):
       return False
     return self.id == other.id
 
   # Return if this trip is less than another object
   def __lt__(self, other):
-    if not isinstance(other, self.__class__):
+    if not isinstance(other, Trip):
       return NotImplemented
     return (self.canonical_time, self.number, self.id) < (other.canonical_time, other.number, other.id)
 
@@ -113,12 +120,12 @@ class Trip:
   def __str__(self):
     return self.name
 
-  # Return the JSON representation for this trip
-  def to_json(self):
+  # Return the JSON representation for this trip, which references its agency, modality and nodes by id in reference mode
+  def to_json(self, mode = 'full', refs = None):
     return collections.OrderedDict(
       id = self.id,
-      agency = self.agency.to_json(),
-      modality = self.modality.to_json(),
+      agency = reference_to_json(self.agency, 'agencies', mode, refs),
+      modality = reference_to_json(self.modality, 'modalities', mode, refs),
       name = self.name,
       abbr = self.abbr,
       number = self.number,
@@ -127,5 +134,38 @@ class Trip:
       priority = self.priority,
       color_text = self.color_text,
       color_bg = self.color_bg,
-      stops = self.stops.to_json(),
+      stops = self.stops.to_json(mode, refs),
     )
+
+
+# Class that defines a view of a trip with other stops, which references the parent trip for its other properties instead of copying them
+# A view equals and hashes like its parent trip, and slicing a view returns a view of the same parent trip
+class TripView(Trip):
+  __slots__ = ('parent',)
+
+  # Constructor
+  def __init__(self, parent, stops):
+    self.parent = parent
+    self.stops = stops
+
+  # Return the property of the parent trip if this view does not define it
+  def __getattr__(self, name):
+    if name == 'parent':
+      raise AttributeError(name)
+    return getattr(self.parent, name)
+
+  # Return the trip beginning at the specified node, which is a view of the parent trip
+  def beginning_at_node(self, node):
+    return TripView(self.parent, self.stops.beginning_at_node(node))
+
+  # Return the trip ending at the specified node, which is a view of the parent trip
+  def ending_at_node(self, node):
+    return TripView(self.parent, self.stops.ending_at_node(node))
+
+  # Return the trip beginning at the stop with the specified index, which is a view of the parent trip
+  def beginning_at_index(self, index):
+    return TripView(self.parent, self.stops.beginning_at_index(index))
+
+  # Return the trip ending at the stop with the specified index, which is a view of the parent trip
+  def ending_at_index(self, index):
+    return TripView(self.parent, self.stops.ending_at_index(index))
@@ -0,0 +1,164 @@
+import bisect
+
+
+# Value that denotes the departure of a trip that does not depart at a stop in a column
+NO_DEPARTURE = 2 ** 62
+
+# Value that denotes the arrival of a trip that does not arrive at a stop in a column
+NO_ARRIVAL = -1
+
+
+# Class that defines the trips of a route sorted by departure and arrival time at every stop of the route
+# Routes where no trip overtakes another trip share one trip order for all stops, other routes get a sorted order per stop
+class TripTable:
+  # Constructor
+  def __init__(self, route, trips):
+    self.route = route
+
+    # Get the departure and arrival times in seconds of every trip at every stop of the route
+    nodes = route.stops.get_nodes()
+    trip_departures = []
+    trip_arrivals = []
+    for trip in trips:
+      departures, arrivals = trip.stops.get_seconds_at_nodes(nodes)
+      trip_departures.append(departures)
+      trip_arrivals.append(arrivals)
+
+    # Sort the trips by their offset to the route, which keeps trips with equal offsets in feed order
+    template = [self.get_seconds(route.stops.get_departure_at_node(node)) for node in nodes]
+    order = sorted(range(len(trips)), key = lambda i: self.get_offset(trip_departures[i], template))
+    self.trips = [trips[i] for i in order]
+
+    # departures[i][j] and arrivals[i][j] denote the departure and arrival time of the j-th trip in table order at the i-th stop of the route
+    departures = list(zip(*(trip_departures[i] for i in order))) or [()] * len(nodes)
+    arrivals = list(zip(*(trip_arrivals[i] for i in order))) or [()] * len(nodes)
+
+    # Check if the trips depart and arrive in the same order at every stop
+    self.fifo = all(self.is_sorted(departures[index]) and self.is_sorted(arrivals[index]) for index in range(len(nodes)))
+
+    # columns[i] denotes the sorted departure times at the i-th stop of the route
+    # column_trips[i] denotes the trips in the same order as columns[i], which is None if the trips are in table order
+    self.columns = []
+    self.column_trips = []
+    for index in range(len(nodes)):
+      if self.fifo:
+        # Fill missing departures with the previous departure, so a binary search never ends on a trip without departure
+        column = []
+        last_departure = -1
+        for departure in departures[index]:
+          if departure is not None:
+            last_departure = departure
+          column.append(last_departure)
+        self.columns.append(column)
+        self.column_trips.append(None)
+      else:
+        # Sort the trips that depart at the stop and put the others at the end
+        column = [NO_DEPARTURE if departure is None else departure for departure in departures[index]]
+        column_order = sorted(range(len(column)), key = column.__getitem__)
+        self.columns.append([column[j] for j in column_order])
+        self.column_trips.append([self.trips[j] for j in column_order])
+
+    # arrival_columns[i] denotes the sorted arrival times at the i-th stop of the route
+    # arrival_column_trips[i] denotes the trips in the same order as arrival_columns[i], which is None if the trips are in table order
+    self.arrival_columns = []
+    self.arrival_column_trips = []
+    for index in range(len(nodes)):
+      if self.fifo:
+        # Fill missing arrivals with the next arrival, so a binary search never ends on a trip without arrival
+        column = []
+        next_arrival = NO_DEPARTURE
+        for arrival in reversed(arrivals[index]):
+          if arrival is not None:
+            next_arrival = arrival
+          column.append(next_arrival)
+        column.reverse()
+        self.arrival_columns.append(column)
+        self.arrival_column_trips.append(None)
+      else:
+        # Sort the trips that arrive at the stop and put the others at the beginning
+        column = [NO_ARRIVAL if arrival is None else arrival for arrival in arrivals[index]]
+        column_order = sorted(range(len(column)), key = column.__getitem__)
+        self.arrival_columns.append([column[j] for j in column_order])
+        self.arrival_column_trips.append([self.trips[j] for j in column_order])
+
+  # Return a trip table with the specified trips in table order and columns, which are built beforehand such as in a snapshot
+  @classmethod
+  def from_columns(cls, route, trips, fifo, columns, column_trips, arrival_columns, arrival_column_trips):
+    table = cls.__new__(cls)
+    table.route = route
+    table.trips = trips
+    table.fifo = fifo
+    table.columns = columns
+    table.column_trips = column_trips
+    table.arrival_columns = arrival_columns
+    table.arrival_column_trips = arrival_column_trips
+    return table
+
+  # Return a copy of this trip table for an equal route with equal trips in another feed, which shares the columns of this trip table
+  # The route and the trips are replaced by the specified route and the trips with the same ids in the specified dict
+  def remapped(self, route, trips):
+    remap = lambda column_trips: [trips[trip.id] for trip in column_trips] if column_trips is not None else None
+    return self.from_columns(route, remap(self.trips), self.fifo, self.columns, [remap(column_trips) for column_trips in self.column_trips], self.arrival_columns, [remap(column_trips) for column_trips in self.arrival_column_trips])
+
+  # Return the position in the column of the earliest trip that departs at the stop with the specified index at or after the specified time in seconds
+  def earliest_position(self, index, time):
+    position = bisect.bisect_left(self.columns[index], time)
+    if position == len(self.trips) or self.columns[index][position] == NO_DEPARTURE:
+      return None
+    return position
+
+  # Return the earliest trip that departs at the stop with the specified index at or after the specified time in seconds
+  def earliest_trip(self, index, time):
+    position = self.earliest_position(index, time)
+    if position is None:
+      return None
+    column_trips = self.column_trips[index]
+    return column_trips[position] if column_trips is not None else self.trips[position]
+
+  # Return the position in the column of the latest trip that arrives at the stop with the specified index at or before the specified time in seconds
+  def latest_position(self, index, time):
+    position = bisect.bisect_right(self.arrival_columns[index], time) - 1
+    if position < 0 or self.arrival_columns[index][position] == NO_ARRIVAL:
+      return None
+    return position
+
+  # Return the latest trip that arrives at the stop with the specified index at or before the specified time in seconds
+  def latest_trip(self, index, time):
+    position = self.latest_position(index, time)
+    if position is None:
+      return None
+    column_trips = self.arrival_column_trips[index]
+    return column_trips[position] if column_trips is not None else self.trips[position]
+
+  # Return the length of this trip table
+  def __len__(self):
+    return len(self.trips)
+
+  # Return the internal representation for this trip table
+  def __repr__(self):
+    return f"<{self.__class__.__name__} {self.route.id!r}, trips={len(self.trips)}, fifo={self.fifo}>"
+
+  # Return the seconds of a time, or None if there is no time
+  @staticmethod
+  def get_seconds(time):
+    return time.seconds if time is not None else None
+
+  # Return the offset of the departures of a trip to the departures of its route at the first stop where both depart
+  @staticmethod
+  def get_offset(departures, template):
+    for departure, template_departure in zip(departures, template):
+      if departure is not None:
+        return departure - (template_departure or 0)
+    return NO_DEPARTURE
+
+  # Return if the specified departure times are sorted, ignoring missing departures
+  @staticmethod
+  def is_sorted(departures):
+    last_departure = -1
+    for departure in departures:
+      if departure is None:
+        continue
+      if departure < last_departure:
+        return False
+      last_departure = departure
+    return True
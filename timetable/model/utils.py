@@ -1,84 +1,151 @@
-import copy
+import collections
 import datetime
 import functools
 import re
 
 
-# Class that defines a time with a day offset
-@functools.total_ordering
-class Time:
+# Pattern of a time string in the format HH, HH:MM or HH:MM:SS
+TIME_PATTERN = re.compile(r'(\d{2})(?::(\d{2})(?::(\d{2}))?)?')
+
+
+# Class that defines a read-only dict, which is used as a shared default container of the model objects
+class FrozenDict(dict):
+  # Raise an error when the dict is modified
+  def modify(self, *args, **kwargs):
+    raise TypeError(f"{self.__class__.__name__} object is read-only")
+
+  __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = modify
+
+  # Return the arguments to reconstruct this dict, since the dict cannot be filled item by item
+  def __reduce__(self):
+    return (self.__class__, (dict(self),))
+
+
+# Empty read-only dict that is shared by the model objects without remarks or services
+EMPTY_DICT = FrozenDict()
+
+
+# Modes of the JSON representation of model objects, where referenced agencies, modalities and nodes are embedded completely or replaced by their ids
+JSON_MODES = ('full', 'ref')
+
+
+# Class that defines a side table of the objects that are referenced by their ids in JSON representations in reference mode
+# Every referenced object is added once to the table of its kind, so a response contains the complete representation of every object once
+class References:
   # Constructor
-  def __init__(self, seconds):
-    self.seconds = seconds
+  def __init__(self):
+    # tables[table][id] denotes the referenced object with the id in the table, in order of the first reference
+    self.tables = collections.OrderedDict((table, {}) for table in ('agencies', 'modalities', 'nodes'))
+
+  # Add an object to a table and return its id
+  def add(self, table, obj):
+    self.tables[table].setdefault(obj.id, obj)
+    return obj.id
+
+  # Return the JSON representation for these references, which maps every table to the complete representations of its objects by id
+  def to_json(self):
+    return collections.OrderedDict((table, collections.OrderedDict((id, obj.to_json()) for id, obj in objects.items())) for table, objects in self.tables.items())
+
+
+# Return the JSON representation of an object that is referenced by another object, which is the complete representation in full mode or the id in reference mode
+# In reference mode the object is also added to a table of the references, if specified
+def reference_to_json(obj, table, mode = 'full', refs = None):
+  if mode == 'full':
+    return obj.to_json()
+  if mode == 'ref':
+    return refs.add(table, obj) if refs is not None else obj.id
+  raise ValueError(f"Undefined JSON mode {mode!r}")
+
+
+# Format specs of times whose formatted strings are cached, since they are formatted for every stop in JSON and templates
+CACHED_FORMAT_SPECS = ('%H:%M', '%H:%M:%S')
+
+# Maximum number of formatted strings that are cached per format spec
+FORMAT_CACHE_SIZE = 1 << 17
+
+
+# Class that defines a time with a day offset, which is an int of the seconds since the start of the first day
+# Times are always true, also at the start of the day, so a time of zero is never mistaken for a missing time
+class Time(int):
+  __slots__ = ()
+
+  # format_cache[spec] maps the seconds of a time to its string formatted with the spec, for every spec in CACHED_FORMAT_SPECS
+  format_cache = {spec: {} for spec in CACHED_FORMAT_SPECS}
+
+  # Return the seconds of this time
+  @property
+  def seconds(self):
+    return int(self)
 
   # Return the time components
   @property
   def day(self):
-    return self.seconds // 86400
+    return int(self) // 86400
 
   @property
   def hour(self):
-    return (self.seconds % 86400) // 3600
+    return (int(self) % 86400) // 3600
 
   @property
   def minute(self):
-    return ((self.seconds % 86400) % 3600) // 60
+    return (int(self) % 3600) // 60
 
   @property
   def second(self):
-    return ((self.seconds % 86400) % 3600) % 60
-
-  # Return if this time equals another object
-  def __eq__(self, other):
-    if not isinstance(other, self.__class__):
-      return False
-    return self.seconds == other.seconds
-
-  # Return if this time is less than another object
-  def __lt__(self, other):
-    if isinstance(other, (int, float)):
-        return self.seconds < other
-    if not isinstance(other, self.__class__):
-      return NotImplemented
-    return self.seconds < other.seconds
+    return int(self) % 60
+
+  # Return the boolean value for this time, which is always true
+  def __bool__(self):
+    return True
 
-  # Add two time objects
+  # Add a time, duration or number of seconds to this time
+  # The sum is a duration if this time is a duration and the other value is a duration or number of seconds, and a time otherwise
   def __add__(self, other):
-    # TODO: Add a duration type and implement this properly
-    if not isinstance(other, self.__class__):
+    if not isinstance(other, int):
       return NotImplemented
-    return Time(self.seconds + other.seconds)
+    cls = Duration if isinstance(self, Duration) and (isinstance(other, Duration) or not isinstance(other, Time)) else Time
+    return cls(int.__add__(self, other))
 
-  # Subtract two time objects
+  __radd__ = __add__
+
+  # Subtract a time, duration or number of seconds from this time
+  # The difference is a duration if this time is a duration or the other value is a time that is not a duration, and a time otherwise
   def __sub__(self, other):
-    # TODO: Add a duration type and implement this properly
-    if not isinstance(other, self.__class__):
+    if not isinstance(other, int):
       return NotImplemented
-    if other.seconds > self.seconds:
+    if other > self:
       raise ValueError(f"Difference between {self} and {other} is negative")
-    return Time(self.seconds - other.seconds)
-
-  # Return a copy of this time
-  def __copy__(self):
-    return Time(self.seconds)
+    cls = Duration if isinstance(self, Duration) or (isinstance(other, Time) and not isinstance(other, Duration)) else Time
+    return cls(int.__sub__(self, other))
 
   # Return the internal representation for this time
   def __repr__(self):
-    return f"{self.__class__.__name__}({self.seconds!r})"
+    return f"{self.__class__.__name__}({int(self)!r})"
 
-  # Return a formatted representation for this time
+  # Return a formatted representation for this time, which is cached for the format specs in CACHED_FORMAT_SPECS
   def __format__(self, format_spec):
-    string = format_spec or '%H:%M:%S'
-    string = string.replace('%H', f"{self.hour:02d}")
-    string = string.replace('%M', f"{self.minute:02d}")
-    string = string.replace('%S', f"{self.second:02d}")
+    format_spec = format_spec or '%H:%M:%S'
+    cache = self.format_cache.get(format_spec)
+    if cache is None:
+      return self.format(format_spec)
+
+    string = cache.get(self)
+    if string is None:
+      string = self.format(format_spec)
+      if len(cache) < FORMAT_CACHE_SIZE:
+        cache[int(self)] = string
     return string
 
+  # Return this time formatted with a format spec, where %H, %M and %S are replaced by the hour, minute and second
+  def format(self, format_spec):
+    hour, seconds = divmod(int(self) % 86400, 3600)
+    minute, second = divmod(seconds, 60)
+    return format_spec.replace('%H', f"{hour:02d}").replace('%M', f"{minute:02d}").replace('%S', f"{second:02d}")
+
   # Return the string representation for this time
   def __str__(self):
     return format(self)
 
-
   # Return a time from a (day, hour, minute, second) tuple
   @classmethod
   def fromtime(cls, day, hour, minute, second):
@@ -87,22 +154,28 @@ class Time:
   # Return a time from a string
   @classmethod
   def fromstring(cls, string):
-    # Match the string
     if not isinstance(string, str):
       raise TypeError(f"Invalid time format type: {type(string)}, must be str")
-    if not (match := re.fullmatch('(\d{2})(?:\:(\d{2})(?:\:(\d{2}))?)?', string)):
-      raise ValueError(f"Invalid time format value: {string!r}")
+    return cls(cls.parse_seconds(string))
 
-    # Get the variables
-    hour = int(match.group(1))
-    minute = int(match.group(2) or 0)
-    second = int(match.group(3) or 0)
+  # Return the seconds of a time string, which are memoized since feeds contain few distinct time strings
+  @staticmethod
+  @functools.lru_cache(maxsize = 4096)
+  def parse_seconds(string):
+    # Match the string
+    if not (match := TIME_PATTERN.fullmatch(string)):
+      raise ValueError(f"Invalid time format value: {string!r}")
 
-    # Return the time
-    return cls.fromtime(0, hour, minute, second)
+    # Return the seconds
+    return int(match.group(1)) * 3600 + int(match.group(2) or 0) * 60 + int(match.group(3) or 0)
 
   # Return the current time
   @classmethod
   def now(cls):
     now = datetime.datetime.now()
     return cls.fromtime(0, now.hour, now.minute, now.second)
+
+
+# Class that defines a duration, which is an int of seconds and the difference between two times
+class Duration(Time):
+  __slots__ = ()
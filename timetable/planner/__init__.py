@@ -1,2 +1,7 @@
 from .algorithm import RaptorAlgorithm
+from .mc_algorithm import McRaptorAlgorithm
+from .compiled import CompiledFeed
+from .workspace import RaptorWorkspace
 from .journey import Journey, JourneyTripLeg, JourneyTransferLeg
+from .batch import plan_many
+from .cache import QueryCache
@@ -1,18 +1,47 @@
+import bisect
+import itertools
 import math
+import threading
+import time
 
+from .compiled import CompiledFeed, NO_TIME, UNREACHED
 from .journey import Journey, JourneyTripLeg, JourneyTransferLeg
-from ..model import Trip, Transfer
+from .workspace import RaptorWorkspace
+from ..model import Trip, Time
+
+
+# Scratch workspaces of the compiled engine, one per thread
+workspaces = threading.local()
 
 
 # Class that executes the RAPTOR algorithm on a transit feed
 # Adapted from https://www.microsoft.com/en-us/research/wp-content/uploads/2012/01/raptor_alenex.pdf
 class RaptorAlgorithm:
   # Constructor
-  def __init__(self, feed):
+  def __init__(self, feed, **kwargs):
     self.feed = feed
 
+    # Add optional properties
+    self.engine = kwargs.get('engine', 'objects')  # Defaults to 'objects'
+    self.compiled_feed = kwargs.get('compiled_feed')  # Defaults to None
+    self.max_rounds = kwargs.get('max_rounds')  # Defaults to None
+    self.budget = kwargs.get('budget')  # Defaults to None, otherwise the wall-clock budget of a query in seconds
+
+    # Validate the engine and compile the feed if the compiled engine is used
+    if self.engine not in ('objects', 'compiled'):
+      raise ValueError(f"Undefined engine {self.engine!r}")
+    if self.engine == 'compiled':
+      self.get_compiled_feed()
+
   # Return all possible connections at the specified departure node and time
-  def scan(self, departure_node, departure_time):
+  # If an arrival node is specified, then labels that cannot improve the arrival time at that node are pruned
+  # The scan is limited to max_rounds trips, arrival times up to max_arrival and the wall-clock budget in seconds
+  # Times can be specified as times or as numbers of seconds
+  def scan(self, departure_node, departure_time, arrival_node = None, max_rounds = None, max_arrival = None, budget = None):
+    departure_time = Time(departure_time)
+    max_rounds = max_rounds if max_rounds is not None else self.max_rounds
+    deadline = self.get_deadline(budget)
+
     # k_arrivals[i][node] denotes the earliest known arrival time at node with up to i trips
     k_arrivals = {}
     k_arrivals[0] = dict.fromkeys(self.feed.get_nodes(), math.inf)
@@ -25,86 +54,485 @@ class RaptorAlgorithm:
     # k_connections[node][i] denotes the connection from departure_node to node at the i-th trip
     k_connections = {}
 
-    # marked_nodes denotes a set of nodes for which the arrival time is improved at the previous round
-    marked_nodes = {departure_node}
+    # marked_nodes denotes an ordered set of nodes for which the arrival time is improved at the previous round
+    marked_nodes = {departure_node: None}
+
+    # Examine the transfers from the departure node
+    self.scan_transfers(0, k_arrivals, best_arrivals, k_connections, marked_nodes, arrival_node, max_arrival)
 
-    # Iterate over the rounds while there are nodes marked
+    # Iterate over the rounds while there are nodes marked and the limits are not reached
     k = 0
-    while marked_nodes:
+    while marked_nodes and not self.is_limit_reached(k, max_rounds, deadline):
       k += 1
       k_arrivals[k] = dict.fromkeys(self.feed.get_nodes(), math.inf)
 
       # First stage: accumulate routes serving marked stops from previous rounds
+      # queue[route] denotes the index of the earliest marked stop in the route
       queue = {}
-      while marked_nodes:
-        node = marked_nodes.pop()
+      for node in marked_nodes:
+        # Skip the node if its arrival time cannot improve the arrival time at the arrival node anymore
+        if arrival_node is not None and k_arrivals[k - 1][node] >= best_arrivals[arrival_node]:
+          continue
+
         for route in node.get_routes_with_node():
-          if route not in queue or self.is_node_before(route, node, queue[route]):
-            queue[route] = node
+          index = route.stops.get_stop_index_at_node(node)
+          if route not in queue or self.is_node_before(index, queue[route]):
+            queue[route] = index
+      marked_nodes = {}
 
       # Second stage: examine the routes
-      for route, route_node in queue.items():
+      for route, route_index in queue.items():
         trip = None
         start_node = None
 
-        # Iterate over the stops in the route starting at route_node
-        for stop in route.stops.beginning_at_node(route_node):
+        # Iterate over the stops in the route starting at route_index
+        for stop in itertools.islice(route.stops, route_index, None):
           # Can the arrival time be improved in this round?
           if trip is not None:
             arrival_at_node = trip.stops.get_arrival_at_node(stop.node)
 
-            # Improve the arrival time if it's smaller than the current best
-            if arrival_at_node is not None and arrival_at_node < best_arrivals[stop.node]:
+            # Improve the arrival time if it's smaller than the current best and the best arrival time at the arrival node
+            if arrival_at_node is not None and arrival_at_node < best_arrivals[stop.node] and (arrival_node is None or arrival_at_node < best_arrivals[arrival_node]) and (max_arrival is None or arrival_at_node <= max_arrival):
               k_arrivals[k][stop.node] = best_arrivals[stop.node] = arrival_at_node
               if stop.node not in k_connections:
                 k_connections[stop.node] = {}
               k_connections[stop.node][k] = trip.beginning_at_node(start_node)
-              marked_nodes.add(stop.node)
+              marked_nodes[stop.node] = None
 
           # Can we catch an earlier trip at the node?
-          if trip is None or ((departure_at_node := trip.stops.get_departure_at_node(stop.node)) is not None and k_arrivals[k - 1][stop.node] <= departure_at_node):
-            trip = self.earliest_trip(route, stop.node, k_arrivals[k - 1][stop.node])
-            start_node = stop.node
+          # The current trip is kept if no trip departs at the node, such as at a skipped stop
+          ready_time = self.get_ready_time(stop.node, k_arrivals[k - 1][stop.node], k_connections.get(stop.node, {}).get(k - 1))
+          if trip is None or (departure_at_node := trip.stops.get_departure_at_node(stop.node)) is None or ready_time <= departure_at_node:
+            if (earliest_trip := self.earliest_trip(route, stop.node, ready_time)) is not None:
+              trip = earliest_trip
+              start_node = stop.node
 
       # Third stage: examine the transfers
-      for node in marked_nodes:
-        # Iterate over the transfers from the node
-        for transfer in node.get_transfers_with_node():
-          transfer_node = transfer.end
-          transfer_arrival = k_arrivals[k - 1][transfer_node] + transfer.time
-
-          # Can the arrival time be improved in this round?
-          if transfer_arrival < k_arrivals[k][transfer_node]:
-            k_arrivals[k][transfer_node] = transfer_arrival
-            if transfer_node not in k_connections:
-              k_connections[transfer_node] = {}
-            k_connections[transfer_node][k] = transfer
-            marked_nodes.add(transfer_node)
+      self.scan_transfers(k, k_arrivals, best_arrivals, k_connections, marked_nodes, arrival_node, max_arrival)
 
     # Return the connections
     return k_connections
 
-  # Return if a node is before another node in a route
-  def is_node_before(self, route, node1, node2):
-    index1 = route.stops.get_stop_index_at_node(node1)
-    index2 = route.stops.get_stop_index_at_node(node2)
+  # Examine the transfers from the nodes that are marked by a trip in the k-th round, or by the departure in round 0
+  # Transfers are relaxed from the arrival times before this stage, so the result does not depend on the order of the nodes
+  # Transfers towards the marked nodes are skipped, since their labels are the sources of this stage and transfers are not chained
+  def scan_transfers(self, k, k_arrivals, best_arrivals, k_connections, marked_nodes, arrival_node = None, max_arrival = None):
+    sources = {node: k_arrivals[k][node] for node in marked_nodes}
+    for node, arrival in sources.items():
+      # Iterate over the transfers from the node
+      for transfer in node.get_transfers_with_node():
+        if transfer.end in sources:
+          continue
+        transfer_arrival = arrival + transfer.duration
+
+        # Improve the arrival time if it's smaller than the current best and the best arrival time at the arrival node
+        if transfer_arrival < best_arrivals[transfer.end] and (arrival_node is None or transfer_arrival < best_arrivals[arrival_node]) and (max_arrival is None or transfer_arrival <= max_arrival):
+          k_arrivals[k][transfer.end] = best_arrivals[transfer.end] = transfer_arrival
+          if transfer.end not in k_connections:
+            k_connections[transfer.end] = {}
+          k_connections[transfer.end][k] = JourneyTransferLeg(node, transfer.end, transfer, arrival)
+          marked_nodes[transfer.end] = None
+
+  # Return the time at which a trip can be boarded at a node after the specified arrival, which includes the change time of the node if the arrival is by a trip
+  def get_ready_time(self, node, arrival, connection):
+    return arrival + node.change_time if isinstance(connection, Trip) else arrival
+
+  # Return the compiled feed, which is compiled on first use if none was specified
+  def get_compiled_feed(self):
+    if self.compiled_feed is None:
+      self.compiled_feed = CompiledFeed.from_feed(self.feed)
+    return self.compiled_feed
+
+  # Return the scratch workspace of the compiled engine for the current thread
+  def get_workspace(self, reverse = False):
+    name = 'reverse_workspace' if reverse else 'workspace'
+    workspace = getattr(workspaces, name, None)
+    if workspace is None or workspace.compiled_feed is not self.get_compiled_feed():
+      workspace = RaptorWorkspace(self.compiled_feed, reverse = reverse)
+      setattr(workspaces, name, workspace)
+    return workspace
+
+  # Return the time at which a query with the specified budget in seconds must stop, or None if the query has no budget
+  def get_deadline(self, budget = None):
+    budget = budget if budget is not None else self.budget
+    return time.monotonic() + budget if budget is not None else None
+
+  # Return if a scan must stop before the round after the k-th round
+  def is_limit_reached(self, k, max_rounds, deadline):
+    return (max_rounds is not None and k >= max_rounds) or (deadline is not None and time.monotonic() >= deadline)
+
+  # Return all possible connections at the specified departure node and time using the compiled feed
+  # The connections are stored as labels in the workspace of the current thread, which remain valid until the next scan
+  # The arrival node and limits are handled in the same way as in scan
+  def scan_compiled(self, departure_node, departure_time, arrival_node = None, max_rounds = None, max_arrival = None, budget = None):
+    workspace = self.get_workspace()
+    workspace.reset()
+    self.scan_rounds(workspace, self.compiled_feed.node_ids[departure_node], int(departure_time),
+      arrival_id = self.compiled_feed.node_ids[arrival_node] if arrival_node is not None else -1,
+      max_rounds = max_rounds if max_rounds is not None else self.max_rounds,
+      arrival_limit = int(max_arrival) + 1 if max_arrival is not None else UNREACHED,
+      deadline = self.get_deadline(budget))
+    return workspace
+
+  # Execute the rounds of the compiled engine from the specified departure node id and time in seconds
+  # The labels already in the workspace are kept, which allows to scan for earlier departure times with the same workspace
+  # Trips that depart from the departure node after departure_limit are not boarded, and arrival times at or after arrival_limit are pruned
+  # If arrival_id is not -1, then labels that cannot improve the arrival time at that node id are pruned
+  def scan_rounds(self, workspace, departure_id, departure_time, departure_limit = UNREACHED, arrival_id = -1, max_rounds = None, arrival_limit = UNREACHED, deadline = None):
+    compiled = self.compiled_feed
+    route_stops_offset = compiled.route_stops_offset
+    route_stops = compiled.route_stops
+    route_trips_offset = compiled.route_trips_offset
+    route_times_offset = compiled.route_times_offset
+    arrivals = compiled.arrivals
+    departures = compiled.departures
+    departure_columns = compiled.departure_columns
+    departure_column_trips = compiled.departure_column_trips
+    node_routes_offset = compiled.node_routes_offset
+    node_routes = compiled.node_routes
+    node_routes_index = compiled.node_routes_index
+    node_change_times = compiled.node_change_times
+
+    # Label the departure node and examine the transfers from it
+    workspace.get_round(0)
+    workspace.set_label(0, departure_id, departure_time, -1, -1)
+    workspace.mark(departure_id)
+    best_arrivals = workspace.k_best_arrivals[0]
+    self.scan_transfers_compiled(workspace, 0, [departure_id], arrival_id, best_arrivals[arrival_id] if arrival_id >= 0 and best_arrivals[arrival_id] < arrival_limit else arrival_limit)
+    workspace.swap_marked_nodes()
+
+    touched = workspace.touched
+    touched_nodes = workspace.touched_nodes
+    marked = workspace.marked
+    queue = workspace.queue
+    queued_routes = workspace.queued_routes
+
+    # Iterate over the rounds while there are nodes marked and the limits are not reached
+    k = 0
+    while workspace.marked_nodes and not self.is_limit_reached(k, max_rounds, deadline):
+      k += 1
+      workspace.start_round(k)
+      prev_arrivals = workspace.k_arrivals[k - 1]
+      prev_trips = workspace.k_trips[k - 1]
+      k_arrivals, k_trips, k_boards = workspace.get_round(k)
+      k_transfers = workspace.k_transfers[k]
+      best_arrivals = workspace.k_best_arrivals[k]
+      next_marked_nodes = workspace.next_marked_nodes
+
+      # bound denotes the arrival time that a label must improve, which is the best arrival time at the arrival node if it is earlier than the arrival limit
+      bound = best_arrivals[arrival_id] if arrival_id >= 0 and best_arrivals[arrival_id] < arrival_limit else arrival_limit
+
+      # First stage: accumulate routes serving marked stops from previous rounds
+      for node in workspace.marked_nodes:
+        # Skip the node if its arrival time cannot improve the bound anymore
+        if prev_arrivals[node] >= bound:
+          continue
+
+        for i in range(node_routes_offset[node], node_routes_offset[node + 1]):
+          route = node_routes[i]
+          index = node_routes_index[i]
+          if queue[route] < 0:
+            queue[route] = index
+            queued_routes.append(route)
+          elif self.is_node_before(index, queue[route]):
+            queue[route] = index
+
+      # Second stage: examine the routes
+      for route in queued_routes:
+        stops_offset = route_stops_offset[route]
+        stop_count = route_stops_offset[route + 1] - stops_offset
+        trip_count = route_trips_offset[route + 1] - route_trips_offset[route]
+        trip = -1
+        times_offset = 0
+        start_index = 0
+
+        # Iterate over the stops in the route starting at the earliest marked stop
+        for index in range(queue[route], stop_count):
+          node = route_stops[stops_offset + index]
+
+          # Can the arrival time be improved in this round?
+          if trip >= 0:
+            arrival_at_node = arrivals[times_offset + index]
+
+            # Improve the arrival time if it's smaller than the current best and the bound
+            if arrival_at_node != NO_TIME and arrival_at_node < best_arrivals[node] and arrival_at_node < bound:
+              if not touched[node]:
+                touched[node] = 1
+                touched_nodes.append(node)
+              k_arrivals[node] = best_arrivals[node] = arrival_at_node
+              k_trips[node] = trip
+              k_boards[node] = start_index
+              k_transfers[node] = -1
+              if node == arrival_id:
+                bound = arrival_at_node
+              if not marked[node]:
+                marked[node] = 1
+                next_marked_nodes.append(node)
+
+          # Can we catch an earlier trip at the node?
+          # The current trip is kept if no trip departs at the node, such as at a skipped stop
+          ready_time = prev_arrivals[node] + node_change_times[node] if prev_trips[node] >= 0 else prev_arrivals[node]
+          if trip < 0 or (departure_at_node := departures[times_offset + index]) == NO_TIME or ready_time <= departure_at_node:
+            column_offset = route_times_offset[route] + index * trip_count
+            position = bisect.bisect_left(departure_columns, ready_time, column_offset, column_offset + trip_count)
+            if position < column_offset + trip_count and (earliest_trip := departure_column_trips[position]) >= 0 and (node != departure_id or departure_columns[position] <= departure_limit):
+              trip = earliest_trip
+              times_offset = route_times_offset[route] + (trip - route_trips_offset[route]) * stop_count
+              start_index = index
+
+        queue[route] = -1
+      queued_routes.clear()
+
+      # Third stage: examine the transfers
+      self.scan_transfers_compiled(workspace, k, list(next_marked_nodes), arrival_id, bound)
+      workspace.swap_marked_nodes()
+
+  # Examine the transfers of the compiled engine from the specified node ids that are labeled by a trip in the k-th round, or by the departure in round 0
+  # Every transfer is relaxed once in O(1) from the arrival time before this stage, so this stage costs O(degree) per marked node
+  def scan_transfers_compiled(self, workspace, k, nodes, arrival_id, bound):
+    compiled = self.compiled_feed
+    node_transfers_offset = compiled.node_transfers_offset
+    node_transfers = compiled.node_transfers
+    transfer_ends = compiled.transfer_ends
+    transfer_durations = compiled.transfer_durations
+    k_arrivals = workspace.k_arrivals[k]
+    best_arrivals = workspace.k_best_arrivals[k]
+
+    # Iterate over the transfers from the nodes, skipping the transfers towards the nodes themselves since transfers are not chained
+    sources = {node: k_arrivals[node] for node in nodes}
+    for node, arrival in sources.items():
+      for i in range(node_transfers_offset[node], node_transfers_offset[node + 1]):
+        transfer = node_transfers[i]
+        end = transfer_ends[transfer]
+        if end in sources:
+          continue
+        transfer_arrival = arrival + transfer_durations[transfer]
+
+        # Improve the arrival time if it's smaller than the current best and the bound
+        if transfer_arrival < best_arrivals[end] and transfer_arrival < bound:
+          workspace.set_transfer_label(k, end, transfer_arrival, transfer)
+          workspace.mark(end)
+          if end == arrival_id:
+            bound = transfer_arrival
+
+  # Examine the incoming transfers of the compiled engine at the specified node ids that are labeled by a trip in the k-th round of a reverse scan, or by the arrival in round 0
+  def scan_transfers_reverse(self, workspace, k, nodes):
+    compiled = self.compiled_feed
+    node_incoming_transfers_offset = compiled.node_incoming_transfers_offset
+    node_incoming_transfers = compiled.node_incoming_transfers
+    transfer_begins = compiled.transfer_begins
+    transfer_durations = compiled.transfer_durations
+    k_departures = workspace.k_arrivals[k]
+    best_departures = workspace.k_best_arrivals[k]
+
+    # Iterate over the transfers towards the nodes, skipping the transfers from the nodes themselves since transfers are not chained
+    sources = {node: k_departures[node] for node in nodes}
+    for node, departure in sources.items():
+      for i in range(node_incoming_transfers_offset[node], node_incoming_transfers_offset[node + 1]):
+        transfer = node_incoming_transfers[i]
+        begin = transfer_begins[transfer]
+        if begin in sources:
+          continue
+        transfer_departure = departure - transfer_durations[transfer]
+
+        # Improve the departure time if it's later than the current best
+        if transfer_departure > best_departures[begin]:
+          workspace.set_transfer_label(k, begin, transfer_departure, transfer)
+          workspace.mark(begin)
+
+  # Execute the rounds of the compiled engine backwards from the specified arrival node id and time in seconds
+  # The labels denote the latest departure time at each node to reach the arrival node in time, and the boarding labels denote the stop index where the trip is left
+  # The scan is limited to max_rounds trips and stops at the deadline in the same way as a forward scan
+  def scan_rounds_reverse(self, workspace, arrival_id, arrival_time, max_rounds = None, deadline = None):
+    compiled = self.compiled_feed
+    route_stops_offset = compiled.route_stops_offset
+    route_stops = compiled.route_stops
+    route_trips_offset = compiled.route_trips_offset
+    route_times_offset = compiled.route_times_offset
+    arrivals = compiled.arrivals
+    departures = compiled.departures
+    arrival_columns = compiled.arrival_columns
+    arrival_column_trips = compiled.arrival_column_trips
+    node_routes_offset = compiled.node_routes_offset
+    node_routes = compiled.node_routes
+    node_routes_index = compiled.node_routes_index
+    node_change_times = compiled.node_change_times
+
+    # Label the arrival node and examine the transfers towards it
+    workspace.get_round(0)
+    workspace.set_label(0, arrival_id, arrival_time, -1, -1)
+    workspace.mark(arrival_id)
+    self.scan_transfers_reverse(workspace, 0, [arrival_id])
+    workspace.swap_marked_nodes()
+
+    touched = workspace.touched
+    touched_nodes = workspace.touched_nodes
+    marked = workspace.marked
+    queue = workspace.queue
+    queued_routes = workspace.queued_routes
+
+    # Iterate over the rounds while there are nodes marked and the limits are not reached
+    k = 0
+    while workspace.marked_nodes and not self.is_limit_reached(k, max_rounds, deadline):
+      k += 1
+      workspace.start_round(k)
+      prev_departures = workspace.k_arrivals[k - 1]
+      prev_trips = workspace.k_trips[k - 1]
+      k_departures, k_trips, k_alights = workspace.get_round(k)
+      k_transfers = workspace.k_transfers[k]
+      best_departures = workspace.k_best_arrivals[k]
+      next_marked_nodes = workspace.next_marked_nodes
+
+      # First stage: accumulate routes serving marked stops from previous rounds
+      # queue[route] denotes the index of the latest marked stop in the route
+      for node in workspace.marked_nodes:
+        for i in range(node_routes_offset[node], node_routes_offset[node + 1]):
+          route = node_routes[i]
+          index = node_routes_index[i]
+          if queue[route] < 0:
+            queued_routes.append(route)
+            queue[route] = index
+          elif self.is_node_before(queue[route], index):
+            queue[route] = index
+
+      # Second stage: examine the routes
+      for route in queued_routes:
+        stops_offset = route_stops_offset[route]
+        stop_count = route_stops_offset[route + 1] - stops_offset
+        trip_count = route_trips_offset[route + 1] - route_trips_offset[route]
+        trip = -1
+        times_offset = 0
+        end_index = 0
+
+        # Iterate over the stops in the route in reverse order starting at the latest marked stop
+        for index in range(queue[route], -1, -1):
+          node = route_stops[stops_offset + index]
+
+          # Can the departure time be improved in this round?
+          if trip >= 0:
+            departure_at_node = departures[times_offset + index]
+
+            # Improve the departure time if it's later than the current best
+            if departure_at_node != NO_TIME and departure_at_node > best_departures[node]:
+              if not touched[node]:
+                touched[node] = 1
+                touched_nodes.append(node)
+              k_departures[node] = best_departures[node] = departure_at_node
+              k_trips[node] = trip
+              k_alights[node] = end_index
+              k_transfers[node] = -1
+              if not marked[node]:
+                marked[node] = 1
+                next_marked_nodes.append(node)
+
+          # Can we catch a later trip at the node?
+          # The current trip is kept if no trip arrives at the node, such as at a skipped stop
+          ready_time = prev_departures[node] - node_change_times[node] if prev_trips[node] >= 0 else prev_departures[node]
+          if trip < 0 or (arrival_at_node := arrivals[times_offset + index]) == NO_TIME or ready_time >= arrival_at_node:
+            column_offset = route_times_offset[route] + index * trip_count
+            position = bisect.bisect_right(arrival_columns, ready_time, column_offset, column_offset + trip_count) - 1
+            if position >= column_offset and (latest_trip := arrival_column_trips[position]) >= 0:
+              trip = latest_trip
+              times_offset = route_times_offset[route] + (trip - route_trips_offset[route]) * stop_count
+              end_index = index
+
+        queue[route] = -1
+      queued_routes.clear()
+
+      # Third stage: examine the transfers
+      self.scan_transfers_reverse(workspace, k, list(next_marked_nodes))
+      workspace.swap_marked_nodes()
+
+  # Return the connections of the compiled engine that lead to the arrival node as model objects
+  # If rounds is specified, then only the connections that arrive at the arrival node in those rounds are returned
+  def materialize_connections(self, workspace, arrival_node, rounds = None):
+    compiled = self.compiled_feed
+    materialized = {}
+
+    # Iterate over the connections from the arrival node back to the departure node
+    for k in rounds if rounds is not None else workspace.get_rounds_with_node(compiled.node_ids[arrival_node]):
+      to_node = compiled.node_ids[arrival_node]
+      while True:
+        if (transfer := workspace.k_transfers[k][to_node]) >= 0:
+          # Create a transfer leg that departs at the arrival time at its begin node
+          from_node = compiled.transfer_begins[transfer]
+          connection = JourneyTransferLeg(compiled.nodes[from_node], compiled.nodes[to_node], compiled.transfers[transfer], Time(workspace.k_arrivals[k][from_node]))
+          next_k = k
+        elif k > 0 and (trip := workspace.k_trips[k][to_node]) >= 0:
+          # Create the trip beginning at the boarding node
+          trip = compiled.trips[trip]
+          from_node = compiled.get_node_at_index(compiled.route_ids[trip.route], workspace.k_boards[k][to_node])
+          connection = trip.beginning_at_node(compiled.nodes[from_node])
+          next_k = k - 1
+        else:
+          break
+
+        # Add the connection to the materialized connections
+        materialized_node = materialized.setdefault(compiled.nodes[to_node], {})
+        if k not in materialized_node:
+          materialized_node[k] = connection
+
+        to_node = from_node
+        k = next_k
+
+    # Return the materialized connections
+    return materialized
+
+  # Return if a stop index is before another stop index in a route
+  def is_node_before(self, index1, index2):
     return index1 < index2
 
   # Return the earliest possible trip of a route at the specified departure node and time
   def earliest_trip(self, route, departure_node, departure_time):
-    earliest_trip = None
-    for trip in route.get_trips_with_route():
-      departure_at_node = trip.stops.get_departure_at_node(departure_node)
-      if departure_at_node is not None and departure_at_node >= departure_time:
-        if earliest_trip is None or departure_at_node < earliest_trip.stops.get_departure_at_node(departure_node):
-          earliest_trip = trip
-    return earliest_trip
-
-  # Return journeys between two nodes that depart after the specified departure time
-  def query_depart_after(self, departure_node, arrival_node, departure):
-    # Get all connections
-    k_connections = self.scan(departure_node, departure)
+    if departure_time == math.inf:
+      return None
+    index = route.stops.get_stop_index_at_node(departure_node)
+    return route.get_trip_table().earliest_trip(index, departure_time)
+
+  # Return the earliest possible trip id of a route id at the specified stop index and time in seconds using the compiled feed
+  def earliest_trip_compiled(self, route, index, departure_time):
+    return self.compiled_feed.earliest_trip(route, index, departure_time)
 
+  # Return the latest possible trip of a route at the specified arrival node and time
+  def latest_trip(self, route, arrival_node, arrival_time):
+    if arrival_time == -math.inf:
+      return None
+    index = route.stops.get_stop_index_at_node(arrival_node)
+    return route.get_trip_table().latest_trip(index, arrival_time)
+
+  # Return the latest possible trip id of a route id at the specified stop index and time in seconds using the compiled feed
+  def latest_trip_compiled(self, route, index, arrival_time):
+    return self.compiled_feed.latest_trip(route, index, arrival_time)
+
+  # Return the departure times in seconds at a node id within the specified window in seconds in descending order
+  # Departures at the nodes that can be reached by a transfer from the node count as departures at the time the transfer must begin
+  # The end of the window is always a departure time, so journeys that begin with a transfer to a departure after the window leave at the end of the window
+  def get_departure_times(self, departure_id, window_start, window_end):
+    compiled = self.compiled_feed
+    departure_times = {window_end} if window_start <= window_end else set()
+
+    # Iterate over the departure node and the nodes that can be reached by a transfer from it
+    nodes = [(departure_id, 0)]
+    for i in range(compiled.node_transfers_offset[departure_id], compiled.node_transfers_offset[departure_id + 1]):
+      transfer = compiled.node_transfers[i]
+      nodes.append((compiled.transfer_ends[transfer], compiled.transfer_durations[transfer]))
+    for node, duration in nodes:
+      # Iterate over the routes serving the node
+      for i in range(compiled.node_routes_offset[node], compiled.node_routes_offset[node + 1]):
+        route = compiled.node_routes[i]
+        trip_count = compiled.get_trip_count(route)
+        column_offset = compiled.route_times_offset[route] + compiled.node_routes_index[i] * trip_count
+
+        # Add the departures in the sorted column of the stop that fall within the window, shifted back by the duration of the transfer
+        start = bisect.bisect_left(compiled.departure_columns, window_start + duration, column_offset, column_offset + trip_count)
+        end = bisect.bisect_right(compiled.departure_columns, window_end + duration, column_offset, column_offset + trip_count)
+        departure_times.update(departure - duration for departure in compiled.departure_columns[start:end])
+
+    # Return the departure times
+    return sorted(departure_times, reverse = True)
+
+  # Return the journeys created from the connections from the departure node to the arrival node
+  def create_journeys(self, departure_node, arrival_node, k_connections):
     # Create a list of journeys
     journeys = []
 
@@ -121,25 +549,137 @@ class RaptorAlgorithm:
       to_node = arrival_node
 
       # Iterate over the connections
-      while k > 0:
-        # Get the connection at the k-th trip
-        k_connection = k_connections[to_node][k]
-
-        # Append a new leg
+      while (k_connection := k_connections.get(to_node, {}).get(k)) is not None:
+        # Insert a new leg
         if isinstance(k_connection, Trip):
           from_node = k_connection.departure.node
           legs.insert(0, JourneyTripLeg(from_node, to_node, k_connection.ending_at_node(to_node), k_connection))
-          to_node = from_node
-        elif isinstance(k_connection, Transfer):
-          from_node = k_connection.start
-          legs.insert(0, JourneyTransferLeg(from_node, to_node, k_connection))
-          to_node = from_node
 
-        # Decrease the trip
-        k -= 1
+          # Decrease the trip
+          k -= 1
+        elif isinstance(k_connection, JourneyTransferLeg):
+          from_node = k_connection.from_node
+          legs.insert(0, k_connection)
+        to_node = from_node
 
       # Append a new journey
       journeys.append(Journey(departure_node, arrival_node, legs))
 
     # Return the journeys
-    return sorted(journeys, key = lambda journey: journey.departure_time)
+    return journeys
+
+  # Return the journeys created from the labels of a reverse scan from the departure node to the arrival node
+  def create_reverse_journeys(self, workspace, departure_node, arrival_node):
+    compiled = self.compiled_feed
+
+    # Create a list of journeys
+    journeys = []
+
+    # Iterate over the rounds in which the departure node is labeled
+    for k in workspace.get_rounds_with_node(compiled.node_ids[departure_node]):
+      # Create a list of legs
+      legs = []
+
+      # Set the origin node for this round
+      from_node = compiled.node_ids[departure_node]
+
+      # Iterate over the connections from the departure node forward to the arrival node
+      while True:
+        if (transfer := workspace.k_transfers[k][from_node]) >= 0:
+          # Append a new transfer leg that departs at the latest departure time at its begin node
+          to_node = compiled.transfer_ends[transfer]
+          legs.append(JourneyTransferLeg(compiled.nodes[from_node], compiled.nodes[to_node], compiled.transfers[transfer], Time(workspace.k_arrivals[k][from_node])))
+        elif k > 0 and (trip := workspace.k_trips[k][from_node]) >= 0:
+          trip = compiled.trips[trip]
+          to_node = compiled.get_node_at_index(compiled.route_ids[trip.route], workspace.k_boards[k][from_node])
+
+          # Append a new trip leg
+          complete_trip = trip.beginning_at_node(compiled.nodes[from_node])
+          legs.append(JourneyTripLeg(compiled.nodes[from_node], compiled.nodes[to_node], complete_trip.ending_at_node(compiled.nodes[to_node]), complete_trip))
+
+          # Decrease the trip
+          k -= 1
+        else:
+          break
+        from_node = to_node
+
+      # Append a new journey
+      journeys.append(Journey(departure_node, arrival_node, legs))
+
+    # Return the journeys
+    return journeys
+
+  # Return journeys between two nodes that depart after the specified departure time and arrive at or before max_arrival
+  def query_depart_after(self, departure_node, arrival_node, departure, max_arrival = None):
+    # Get the connections to the arrival node
+    if self.engine == 'compiled':
+      k_connections = self.materialize_connections(self.scan_compiled(departure_node, departure, arrival_node, max_arrival = max_arrival), arrival_node)
+    else:
+      k_connections = self.scan(departure_node, departure, arrival_node, max_arrival = max_arrival)
+
+    # Return the journeys
+    return sorted(self.create_journeys(departure_node, arrival_node, k_connections), key = lambda journey: journey.departure_time)
+
+  # Return journeys between two nodes that arrive before the specified arrival time
+  # This scans the compiled feed backwards from the arrival node, so every journey departs as late as possible for its number of transfers
+  def query_arrive_before(self, departure_node, arrival_node, arrival):
+    self.validate_compiled_engine('arrive before')
+
+    # Scan backwards from the arrival node
+    workspace = self.get_workspace(reverse = True)
+    workspace.reset()
+    self.scan_rounds_reverse(workspace, self.compiled_feed.node_ids[arrival_node], int(arrival), self.max_rounds, self.get_deadline())
+
+    # Return the journeys
+    return sorted(self.create_reverse_journeys(workspace, departure_node, arrival_node), key = lambda journey: journey.departure_time)
+
+  # Return the Pareto set of journeys between two nodes that depart within the specified window
+  # This uses the rRAPTOR algorithm on the compiled feed, which scans the departure times at the departure node in descending order and reuses the labels of later departures
+  def query_range(self, departure_node, arrival_node, window_start, window_end):
+    self.validate_compiled_engine('range')
+    departure_id = self.compiled_feed.node_ids[departure_node]
+    arrival_id = self.compiled_feed.node_ids[arrival_node]
+
+    # Reset the workspace
+    workspace = self.get_workspace()
+    workspace.reset()
+    deadline = self.get_deadline()
+
+    # Iterate over the departure times in the window from late to early
+    journeys = []
+    for departure_time in self.get_departure_times(departure_id, int(window_start), int(window_end)):
+      # Remember the arrival times at the arrival node before the scan
+      arrivals = [workspace.get_round(k)[0][arrival_id] for k in range(workspace.rounds + 1)]
+
+      # Scan from the departure time and get the rounds in which the arrival time at the arrival node is improved
+      # A journey without trips can depart at any time, so it is only created for the latest departure time
+      self.scan_rounds(workspace, departure_id, departure_time, int(window_end), arrival_id, self.max_rounds, deadline = deadline)
+      rounds = [k for k in workspace.get_rounds_with_node(arrival_id) if (k >= len(arrivals) or workspace.k_arrivals[k][arrival_id] != arrivals[k]) and (k > 0 or arrivals[0] == UNREACHED)]
+
+      # Create journeys for the improved rounds
+      if rounds:
+        journeys.extend(self.create_journeys(departure_node, arrival_node, self.materialize_connections(workspace, arrival_node, rounds)))
+
+    # Return the journeys that are not dominated by another journey
+    return sorted(self.pareto_journeys(journeys), key = lambda journey: (journey.departure_time, journey.arrival_time))
+
+  # Validate that the compiled engine is used for a query that is only implemented on the compiled feed
+  def validate_compiled_engine(self, query):
+    if self.engine != 'compiled':
+      raise ValueError(f"The {query} query requires the compiled engine, got engine {self.engine!r}")
+
+  # Return the journeys that are not dominated by another journey in departure time, arrival time and number of transfers
+  def pareto_journeys(self, journeys):
+    criteria = [(-journey.departure_time, journey.arrival_time, journey.transfers) for journey in journeys]
+
+    # Iterate over the journeys and keep the first of equal journeys
+    pareto_journeys = []
+    for i, journey in enumerate(journeys):
+      if any(self.dominates(other, criteria[i]) or (other == criteria[i] and j < i) for j, other in enumerate(criteria) if j != i):
+        continue
+      pareto_journeys.append(journey)
+    return pareto_journeys
+
+  # Return if a tuple of criteria dominates another tuple of criteria, where lower values are better
+  def dominates(self, criteria1, criteria2):
+    return all(c1 <= c2 for c1, c2 in zip(criteria1, criteria2)) and criteria1 != criteria2
@@ -0,0 +1,125 @@
+import collections
+import concurrent.futures
+import csv
+import json
+
+from .algorithm import RaptorAlgorithm
+from ..model import Node, Time
+
+
+# Fields of the rows that are returned by plan_many
+BATCH_FIELDS = ('from_node', 'to_node', 'departure', 'departure_time', 'arrival_time', 'duration', 'transfers')
+
+# Algorithm of the current worker process, which is created once per worker by the initializer of the pool
+worker_algorithm = None
+
+
+# Create the algorithm of a worker process from the feed, which is sent once to every worker
+def init_worker(feed, options):
+  global worker_algorithm
+  worker_algorithm = RaptorAlgorithm(feed, **dict(options, engine = 'compiled'))
+
+
+# Plan the journeys from an origin to its destinations in a worker process
+def plan_origin_worker(from_node_id, to_node_ids, departures):
+  return plan_origin(worker_algorithm, from_node_id, to_node_ids, departures)
+
+
+# Plan the journeys from an origin node id to the destination node ids at the departure times in seconds and return the rows
+# Every departure time takes one one-to-all scan, which serves all destinations of the origin
+def plan_origin(algorithm, from_node_id, to_node_ids, departures):
+  feed = algorithm.feed
+  compiled = algorithm.get_compiled_feed()
+  from_node = feed.get_node(from_node_id)
+
+  # Create a list of rows
+  rows = []
+
+  # Iterate over the departure times
+  for departure in departures:
+    workspace = algorithm.scan_compiled(from_node, Time(departure))
+
+    # Iterate over the destinations
+    for to_node_id in to_node_ids:
+      to_node = feed.get_node(to_node_id)
+      arrival_id = compiled.node_ids[to_node]
+
+      # Get the round with the earliest arrival time at the destination, where fewer trips win ties
+      rounds = workspace.get_rounds_with_node(arrival_id)
+      journey = None
+      if rounds:
+        k = min(rounds, key = lambda k: (workspace.k_arrivals[k][arrival_id], k))
+        journey = algorithm.create_journeys(from_node, to_node, algorithm.materialize_connections(workspace, to_node, [k]))[0]
+
+      # Append a new row
+      rows.append(create_row(from_node, to_node, Time(departure), journey))
+
+  # Return the rows
+  return rows
+
+
+# Return a row for the journey between two nodes that departs after the specified departure time, or a row without times if there is no journey
+# The duration of a row includes the time waiting at the origin between the departure and the departure time of the journey
+def create_row(from_node, to_node, departure, journey):
+  return collections.OrderedDict(
+    from_node = from_node.id,
+    to_node = to_node.id,
+    departure = format_time(departure),
+    departure_time = format_time(journey.departure_time) if journey is not None else None,
+    arrival_time = format_time(journey.arrival_time) if journey is not None else None,
+    duration = format_time(journey.arrival_time - departure) if journey is not None else None,
+    transfers = journey.transfers if journey is not None else None,
+  )
+
+
+# Return a time formatted as HH:MM:SS, where the hours continue past 24 for times on the next day
+def format_time(time):
+  return f"{time // 3600:02d}:{time % 3600 // 60:02d}:{time % 60:02d}"
+
+
+# Plan the fastest journey for every pair of origin and destination nodes at every departure time
+# The pairs are grouped by origin and the origins are spread across a pool of worker processes, which receive the feed once
+# The rows are yielded as soon as the journeys of an origin are planned, so they are not in the order of the pairs
+# If workers is 0, then the journeys are planned in the current process; other keyword arguments are passed to the algorithm
+def plan_many(feed, od_pairs, departures, workers = None, **kwargs):
+  departures = [int(departure) for departure in departures]
+
+  # Group the destinations by origin
+  destinations = {}
+  for from_node, to_node in od_pairs:
+    to_node_ids = destinations.setdefault(get_node_id(feed, from_node), {})
+    to_node_ids[get_node_id(feed, to_node)] = None
+
+  # Plan the journeys in the current process
+  if workers == 0:
+    algorithm = RaptorAlgorithm(feed, **dict(kwargs, engine = 'compiled'))
+    for from_node_id, to_node_ids in destinations.items():
+      yield from plan_origin(algorithm, from_node_id, list(to_node_ids), departures)
+    return
+
+  # Plan the journeys in a pool of worker processes
+  with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (feed, kwargs)) as executor:
+    futures = [executor.submit(plan_origin_worker, from_node_id, list(to_node_ids), departures) for from_node_id, to_node_ids in destinations.items()]
+    for future in concurrent.futures.as_completed(futures):
+      yield from future.result()
+
+
+# Return the id of a node, which is validated against the feed
+def get_node_id(feed, node):
+  return node.id if isinstance(node, Node) else feed.get_node(node).id
+
+
+# Write rows as CSV to a file as they are yielded
+def write_csv(rows, file):
+  writer = csv.DictWriter(file, fieldnames = BATCH_FIELDS)
+  writer.writeheader()
+  for row in rows:
+    writer.writerow(row)
+    file.flush()
+
+
+# Write rows as JSON lines to a file as they are yielded
+def write_jsonl(rows, file):
+  for row in rows:
+    file.write(json.dumps(row) + '\n')
+    file.flush()
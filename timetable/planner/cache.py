@@ -0,0 +1,146 @@
+import collections
+import sys
+import threading
+import time
+
+from .journey import JourneyTripLeg
+from ..model import Time, StopListView
+
+
+# Directions of the queries that can be cached, which are the names of the query methods of the algorithm
+DIRECTIONS = ('depart_after', 'arrive_before', 'range')
+
+
+# Class that defines a bounded LRU cache of the journeys returned by planner queries
+# Entries are keyed on the feed version, the algorithm, the direction, the nodes and the time of a query, and the cache is cleared when the feed changes
+# If a bucket is specified, then range queries with a start time in the same bucket share one entry, which contains the journeys that depart in
+# the window from the start of the bucket and are filtered to the requested start time, so the window of a hit is shortened by less than the bucket
+class QueryCache:
+  # Constructor
+  def __init__(self, **kwargs):
+    # Add optional properties
+    self.max_entries = kwargs.get('max_entries', 1024)  # Defaults to 1024
+    self.max_bytes = kwargs.get('max_bytes')  # Defaults to None, otherwise the estimated size in bytes of all entries
+    self.ttl = kwargs.get('ttl')  # Defaults to None, otherwise the time to live of an entry in seconds
+    self.bucket = kwargs.get('bucket', 0)  # Defaults to 0, otherwise the size in seconds of a bucket of range start times
+
+    # Validate the properties
+    if self.max_entries is not None and self.max_entries < 1:
+      raise ValueError(f"The maximum number of entries must be positive, got {self.max_entries!r}")
+    if self.bucket < 0:
+      raise ValueError(f"The bucket must not be negative, got {self.bucket!r}")
+
+    # entries[key] denotes a tuple of (expires, size, journeys), ordered from least to most recently used
+    self.entries = collections.OrderedDict()
+    self.size = 0
+    self.feed_version = None
+    self.lock = threading.Lock()
+
+    # Counters of the cache
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+
+  # Return the journeys of a query with the specified algorithm, which are taken from the cache or queried and stored in the cache
+  # The direction is one of DIRECTIONS, and a range query also takes the length of its window
+  def query(self, algorithm, direction, departure_node, arrival_node, time, window = None):
+    if direction not in DIRECTIONS:
+      raise ValueError(f"Undefined direction {direction!r}")
+    if direction == 'range' and window is None:
+      raise ValueError("A range query must have a window")
+
+    # Get the time of the entry, which is the start of the bucket for a range query
+    entry_time = time
+    if direction == 'range' and self.bucket:
+      entry_time = Time(time - time % self.bucket)
+    key = (type(algorithm).__name__, algorithm.max_rounds, direction, departure_node.id, arrival_node.id, int(entry_time), int(window) if window is not None else None)
+
+    # Return the journeys of the entry if it is cached
+    journeys = self.get(algorithm.feed, key)
+    if journeys is None:
+      # Query the algorithm and store the journeys
+      if direction == 'depart_after':
+        journeys = algorithm.query_depart_after(departure_node, arrival_node, entry_time)
+      elif direction == 'arrive_before':
+        journeys = algorithm.query_arrive_before(departure_node, arrival_node, entry_time)
+      else:
+        journeys = algorithm.query_range(departure_node, arrival_node, entry_time, entry_time + window)
+      self.put(algorithm.feed, key, journeys)
+
+    # Return a copy of the journeys, which are filtered to the requested start time for a range query in a bucket
+    if entry_time != time:
+      return [journey for journey in journeys if journey.departure_time >= time]
+    return list(journeys)
+
+  # Return the journeys of an entry, or None if the entry is not cached or expired
+  def get(self, feed, key):
+    with self.lock:
+      self.validate_feed(feed)
+      entry = self.entries.get(key)
+      if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+        if entry is not None:
+          self.remove(key)
+        self.misses += 1
+        return None
+      self.entries.move_to_end(key)
+      self.hits += 1
+      return entry[2]
+
+  # Store the journeys of an entry and evict the least recently used entries while the cache is too large
+  def put(self, feed, key, journeys):
+    size = self.estimate_size(journeys)
+    expires = time.monotonic() + self.ttl if self.ttl is not None else None
+    with self.lock:
+      self.validate_feed(feed)
+      if key in self.entries:
+        self.remove(key)
+      self.entries[key] = (expires, size, journeys)
+      self.size += size
+      while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries) or (self.max_bytes is not None and self.size > self.max_bytes)):
+        self.remove(next(iter(self.entries)))
+        self.evictions += 1
+
+  # Remove an entry
+  def remove(self, key):
+    self.size -= self.entries.pop(key)[1]
+
+  # Clear the cache if the entries belong to another feed or another version of the feed
+  def validate_feed(self, feed):
+    if feed.version != self.feed_version:
+      if self.entries:
+        self.invalidations += 1
+      self.entries.clear()
+      self.size = 0
+      self.feed_version = feed.version
+
+  # Clear the cache
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.size = 0
+
+  # Return the estimated size in bytes of a list of journeys, which does not count the model objects that are shared with the feed or stops of views that are not materialized
+  def estimate_size(self, journeys):
+    size = sys.getsizeof(journeys)
+    for journey in journeys:
+      size += sys.getsizeof(journey) + sys.getsizeof(journey.legs)
+      for leg in journey.legs:
+        size += sys.getsizeof(leg)
+        if isinstance(leg, JourneyTripLeg):
+          size += sys.getsizeof(leg.trip) + sys.getsizeof(leg.trip.stops)
+          if not isinstance(leg.trip.stops, StopListView) or leg.trip.stops.materialized:
+            size += sum(sys.getsizeof(stop) for stop in leg.trip.stops)
+    return size
+
+  # Return the statistics of the cache
+  def get_stats(self):
+    with self.lock:
+      return collections.OrderedDict(
+        entries = len(self.entries),
+        size = self.size,
+        hits = self.hits,
+        misses = self.misses,
+        evictions = self.evictions,
+        invalidations = self.invalidations,
+      )
@@ -0,0 +1,201 @@
+import array
+import bisect
+
+from ..model.trip_table import NO_ARRIVAL, NO_DEPARTURE
+
+
+# Value that denotes a missing arrival or departure time in the time arrays
+NO_TIME = -1
+
+# Value that denotes an unreached node in the label arrays of the planner
+UNREACHED = NO_DEPARTURE
+
+
+# Class that defines a transit feed compiled to contiguous arrays for the planner
+# Nodes, routes and trips are assigned dense integer ids in feed order, and trips are grouped by route
+class CompiledFeed:
+  # Constructor
+  def __init__(self, feed):
+    self.feed = feed
+
+    # nodes[i], routes[i] and trips[i] denote the model object with integer id i
+    self.nodes = []
+    self.routes = []
+    self.trips = []
+
+    # node_ids[node], route_ids[route] and trip_ids[trip] denote the integer id of the model object
+    self.node_ids = {}
+    self.route_ids = {}
+    self.trip_ids = {}
+
+    # preferred_nodes[n] denotes if node n is a preferred node to transfer, and trip_priorities[t] denotes the priority of trip t
+    self.preferred_nodes = bytearray()
+    self.trip_priorities = array.array('q')
+
+    # node_change_times[n] denotes the minimum change time in seconds at node n
+    self.node_change_times = array.array('q')
+
+    # route_stops[route_stops_offset[r] + i] denotes the node at the i-th stop of route r
+    self.route_stops_offset = array.array('q', [0])
+    self.route_stops = array.array('q')
+
+    # The trips of route r have the ids in range(route_trips_offset[r], route_trips_offset[r + 1])
+    self.route_trips_offset = array.array('q', [0])
+
+    # arrivals[route_times_offset[r] + j * stop_count + i] denotes the arrival in seconds of the j-th trip of route r at its i-th stop
+    # departures is laid out in the same way, and both contain NO_TIME where the trip does not arrive or depart
+    self.route_times_offset = array.array('q', [0])
+    self.arrivals = array.array('q')
+    self.departures = array.array('q')
+
+    # departure_columns[route_times_offset[r] + i * trip_count + j] denotes the j-th departure in seconds in the sorted column of the i-th stop of route r
+    # departure_column_trips is laid out in the same way and contains the trip id of each departure, or -1 if the trip does not depart
+    self.departure_columns = array.array('q')
+    self.departure_column_trips = array.array('q')
+
+    # arrival_columns and arrival_column_trips are laid out in the same way for the sorted arrivals at each stop
+    self.arrival_columns = array.array('q')
+    self.arrival_column_trips = array.array('q')
+
+    # node_routes[node_routes_offset[n] + i] denotes the i-th route serving node n
+    # node_routes_index[node_routes_offset[n] + i] denotes the index of the first stop at node n in that route
+    self.node_routes_offset = array.array('q', [0])
+    self.node_routes = array.array('q')
+    self.node_routes_index = array.array('q')
+
+    # transfers[t] denotes the transfer with integer id t, where the reverse of a symmetric transfer has its own id
+    # transfer_begins[t], transfer_ends[t] and transfer_durations[t] denote the begin node, end node and duration in seconds of transfer t
+    self.transfers = []
+    self.transfer_begins = array.array('q')
+    self.transfer_ends = array.array('q')
+    self.transfer_durations = array.array('q')
+
+    # node_transfers[node_transfers_offset[n] + i] denotes the i-th transfer that begins at node n
+    # node_incoming_transfers[node_incoming_transfers_offset[n] + i] denotes the i-th transfer that ends at node n
+    self.node_transfers_offset = array.array('q', [0])
+    self.node_transfers = array.array('q')
+    self.node_incoming_transfers_offset = array.array('q', [0])
+    self.node_incoming_transfers = array.array('q')
+
+  # Return the number of stops of a route
+  def get_stop_count(self, route):
+    return self.route_stops_offset[route + 1] - self.route_stops_offset[route]
+
+  # Return the number of trips of a route
+  def get_trip_count(self, route):
+    return self.route_trips_offset[route + 1] - self.route_trips_offset[route]
+
+  # Return the node at the stop with the specified index in a route
+  def get_node_at_index(self, route, index):
+    return self.route_stops[self.route_stops_offset[route] + index]
+
+  # Return the offset of the times of a trip in the time arrays
+  def get_times_offset(self, route, trip):
+    return self.route_times_offset[route] + (trip - self.route_trips_offset[route]) * self.get_stop_count(route)
+
+  # Return the earliest trip id of a route that departs at the stop with the specified index at or after the specified time in seconds, or -1 if there is no such trip
+  def earliest_trip(self, route, index, time):
+    trip_count = self.route_trips_offset[route + 1] - self.route_trips_offset[route]
+    column_offset = self.route_times_offset[route] + index * trip_count
+    position = bisect.bisect_left(self.departure_columns, time, column_offset, column_offset + trip_count)
+    if position == column_offset + trip_count:
+      return -1
+    return self.departure_column_trips[position]
+
+  # Return the latest trip id of a route that arrives at the stop with the specified index at or before the specified time in seconds, or -1 if there is no such trip
+  def latest_trip(self, route, index, time):
+    trip_count = self.route_trips_offset[route + 1] - self.route_trips_offset[route]
+    column_offset = self.route_times_offset[route] + index * trip_count
+    position = bisect.bisect_right(self.arrival_columns, time, column_offset, column_offset + trip_count) - 1
+    if position < column_offset:
+      return -1
+    return self.arrival_column_trips[position]
+
+  # Add a node to the compiled feed
+  def add_node(self, node):
+    self.node_ids[node] = len(self.nodes)
+    self.nodes.append(node)
+    self.preferred_nodes.append(1 if node.node else 0)
+    self.node_change_times.append(node.change_time.seconds)
+
+  # Add a route and its trip table to the compiled feed
+  def add_route(self, route, trip_table):
+    self.route_ids[route] = len(self.routes)
+    self.routes.append(route)
+
+    # Add the stop sequence of the route
+    nodes = [stop.node for stop in route.stops]
+    self.route_stops.extend(self.node_ids[node] for node in nodes)
+    self.route_stops_offset.append(len(self.route_stops))
+
+    # Add the trips of the route in trip table order and their times at each stop of the route
+    for trip in trip_table.trips:
+      self.trip_ids[trip] = len(self.trips)
+      self.trips.append(trip)
+      self.trip_priorities.append(trip.priority or 0)
+      departures, arrivals = trip.stops.get_seconds_at_nodes(nodes)
+      self.arrivals.extend(NO_TIME if arrival is None else arrival for arrival in arrivals)
+      self.departures.extend(NO_TIME if departure is None else departure for departure in departures)
+    self.route_trips_offset.append(len(self.trips))
+    self.route_times_offset.append(len(self.arrivals))
+
+    # Add the sorted departure columns of the trip table
+    for column, column_trips in zip(trip_table.columns, trip_table.column_trips):
+      self.departure_columns.extend(column)
+      if column_trips is not None:
+        self.departure_column_trips.extend(self.trip_ids[trip] if departure != NO_DEPARTURE else -1 for trip, departure in zip(column_trips, column))
+      else:
+        self.departure_column_trips.extend(self.trip_ids[trip] for trip in trip_table.trips)
+
+    # Add the sorted arrival columns of the trip table
+    for column, column_trips in zip(trip_table.arrival_columns, trip_table.arrival_column_trips):
+      self.arrival_columns.extend(column)
+      if column_trips is not None:
+        self.arrival_column_trips.extend(self.trip_ids[trip] if arrival != NO_ARRIVAL else -1 for trip, arrival in zip(column_trips, column))
+      else:
+        self.arrival_column_trips.extend(self.trip_ids[trip] for trip in trip_table.trips)
+
+  # Add a transfer to the compiled feed and return its integer id
+  def add_transfer(self, transfer):
+    self.transfers.append(transfer)
+    self.transfer_begins.append(self.node_ids[transfer.begin])
+    self.transfer_ends.append(self.node_ids[transfer.end])
+    self.transfer_durations.append(transfer.duration.seconds)
+    return len(self.transfers) - 1
+
+  # Return a compiled feed for the specified feed
+  @classmethod
+  def from_feed(cls, feed):
+    compiled = cls(feed)
+
+    # Add the nodes
+    for node in feed.get_nodes():
+      compiled.add_node(node)
+
+    # Add the routes and their trip tables
+    for route in feed.get_routes():
+      compiled.add_route(route, feed.get_trip_table(route))
+
+    # Add the routes serving each node, in the same order as the feed returns them
+    for node in compiled.nodes:
+      for route in feed.get_routes_with_node(node):
+        compiled.node_routes.append(compiled.route_ids[route])
+        compiled.node_routes_index.append(route.stops.get_stop_index_at_node(node))
+      compiled.node_routes_offset.append(len(compiled.node_routes))
+
+    # Add the transfers that begin at each node
+    for node in compiled.nodes:
+      for transfer in feed.get_transfers_with_node(node):
+        compiled.node_transfers.append(compiled.add_transfer(transfer))
+      compiled.node_transfers_offset.append(len(compiled.node_transfers))
+
+    # Add the transfers that end at each node
+    incoming_transfers = [[] for node in compiled.nodes]
+    for transfer, end in enumerate(compiled.transfer_ends):
+      incoming_transfers[end].append(transfer)
+    for transfers in incoming_transfers:
+      compiled.node_incoming_transfers.extend(transfers)
+      compiled.node_incoming_transfers_offset.append(len(compiled.node_incoming_transfers))
+
+    # Return the compiled feed
+    return compiled
@@ -21,10 +21,10 @@ class Journey:
   def duration(self):
     return self.arrival_time - self.departure_time
 
-  # Get the number of transfers in this journey
+  # Get the number of transfers in this journey, which does not count the transfer legs between trips
   @property
   def transfers(self):
-    return len(self.legs) - 1
+    return max(sum(1 for leg in self.legs if isinstance(leg, JourneyTripLeg)) - 1, 0)
 
   # Return the string representation of this journey
   def __str__(self):
@@ -81,10 +81,16 @@ class JourneyTripLeg:
 # Class that defines a journey leg that encapsulates a transfer
 class JourneyTransferLeg:
   # Constructor
-  def __init__(self, from_node, to_node, transfer):
+  def __init__(self, from_node, to_node, transfer, departure_time):
     self.from_node = from_node
     self.to_node = to_node
     self.transfer = transfer
+    self.departure_time = departure_time
+
+  # Get the arrival time of this leg
+  @property
+  def arrival_time(self):
+    return self.departure_time + self.transfer.duration
 
   # Get the duration of this leg
   @property
@@ -93,4 +99,7 @@ class JourneyTransferLeg:
 
   # Return the string representation of this leg
   def __str__(self):
-    return f"{self.transfer} ({self.duration:%H:%M})"
+    buffer = f"{self.transfer} ({self.duration:%H:%M})"
+    buffer += f"\n  {self.departure_time:%H:%M} D  {self.from_node}"
+    buffer += f"\n  {self.arrival_time:%H:%M}    {self.to_node}"
+    return buffer
@@ -0,0 +1,255 @@
+import bisect
+
+from .algorithm import RaptorAlgorithm
+from .compiled import NO_TIME, UNREACHED
+from .journey import Journey, JourneyTripLeg, JourneyTransferLeg
+from ..model import Time
+
+
+# Criteria that the McRAPTOR algorithm can optimize for
+# 'arrival' is the arrival time, 'transfers' the number of transfers, 'priority' the worst priority of the trips and 'node_transfers' the number of transfers at nodes that are not preferred to transfer
+CRITERIA = ('arrival', 'transfers', 'priority', 'node_transfers')
+
+
+# Class that executes the multi-criteria McRAPTOR algorithm on a transit feed
+# Adapted from https://www.microsoft.com/en-us/research/wp-content/uploads/2012/01/raptor_alenex.pdf
+# A label is a tuple of (arrival, priority, node_transfers, node, trip, board, parent), where the first three fields are the criteria and are 0 if the criterion is disabled
+# A label of a transfer has trip -1 and the transfer id as board
+# The number of transfers follows from the round of a label, so labels in later rounds only survive if they are better in another criterion
+class McRaptorAlgorithm(RaptorAlgorithm):
+  # Constructor
+  def __init__(self, feed, **kwargs):
+    super().__init__(feed, **dict(kwargs, engine = 'compiled'))
+
+    # Add optional properties
+    self.criteria = tuple(kwargs.get('criteria', CRITERIA))  # Defaults to all criteria
+
+    # Validate the criteria
+    for criterion in self.criteria:
+      if criterion not in CRITERIA:
+        raise ValueError(f"Undefined criterion {criterion!r}")
+    if 'arrival' not in self.criteria:
+      raise ValueError("The criteria must contain 'arrival'")
+
+  # Return the bags of labels of all rounds at the specified departure node and time
+  # bags[k][node] denotes the labels at node that use k trips and are not dominated by labels at node in the same or earlier rounds
+  # Labels that arrive after max_arrival are pruned
+  def scan_bags(self, departure_node, departure_time, arrival_node = None, max_rounds = None, max_arrival = None, budget = None):
+    compiled = self.get_compiled_feed()
+    route_stops_offset = compiled.route_stops_offset
+    route_stops = compiled.route_stops
+    route_trips_offset = compiled.route_trips_offset
+    route_times_offset = compiled.route_times_offset
+    arrivals = compiled.arrivals
+    departure_columns = compiled.departure_columns
+    departure_column_trips = compiled.departure_column_trips
+    node_routes_offset = compiled.node_routes_offset
+    node_routes = compiled.node_routes
+    node_routes_index = compiled.node_routes_index
+    preferred_nodes = compiled.preferred_nodes
+    trip_priorities = compiled.trip_priorities
+    node_change_times = compiled.node_change_times
+
+    use_priority = 'priority' in self.criteria
+    use_node_transfers = 'node_transfers' in self.criteria
+    max_rounds = max_rounds if max_rounds is not None else self.max_rounds
+    arrival_limit = int(max_arrival) + 1 if max_arrival is not None else UNREACHED
+    deadline = self.get_deadline(budget)
+
+    departure_id = compiled.node_ids[departure_node]
+    arrival_id = compiled.node_ids[arrival_node] if arrival_node is not None else -1
+
+    # Label the departure node
+    departure_label = (int(departure_time), 0, 0, departure_id, -1, -1, None)
+    bags = [{departure_id: [departure_label]}]
+
+    # marked_nodes denotes an ordered set of node ids for which a label is added at the previous round
+    marked_nodes = {departure_id: None}
+
+    # Examine the transfers from the departure node
+    self.scan_transfer_labels(bags, 0, [departure_label], arrival_id, marked_nodes, arrival_limit)
+
+    # Iterate over the rounds while there are nodes marked and the limits are not reached
+    k = 0
+    while marked_nodes and not self.is_limit_reached(k, max_rounds, deadline):
+      k += 1
+      bags.append({})
+      prev_bags = bags[k - 1]
+
+      # First stage: accumulate routes serving marked stops from previous rounds
+      # queue[route] denotes the index of the earliest marked stop in the route
+      queue = {}
+      for node in marked_nodes:
+        for i in range(node_routes_offset[node], node_routes_offset[node + 1]):
+          route = node_routes[i]
+          index = node_routes_index[i]
+          if route not in queue or self.is_node_before(index, queue[route]):
+            queue[route] = index
+      marked_nodes = {}
+
+      # Second stage: examine the routes
+      # trip_labels denotes the labels that are added by a trip in this round
+      trip_labels = []
+      for route, route_index in queue.items():
+        stops_offset = route_stops_offset[route]
+        stop_count = route_stops_offset[route + 1] - stops_offset
+        trip_count = route_trips_offset[route + 1] - route_trips_offset[route]
+
+        # route_bag denotes the trips that are boarded in this round as tuples of (trip, times_offset, board, parent, priority, node_transfers)
+        route_bag = []
+
+        # Iterate over the stops in the route starting at the earliest marked stop
+        for index in range(route_index, stop_count):
+          node = route_stops[stops_offset + index]
+
+          # Create labels for the arrival of the boarded trips and merge them into the bag of the node
+          for trip, times_offset, board, parent, priority, transfers in route_bag:
+            arrival_at_node = arrivals[times_offset + index]
+            if arrival_at_node == NO_TIME or arrival_at_node >= arrival_limit:
+              continue
+            label = (arrival_at_node, priority, transfers, node, trip, board, parent)
+            if self.merge_label(bags, k, node, arrival_id, label):
+              trip_labels.append(label)
+              marked_nodes[node] = None
+
+          # Board the earliest trip for every label of the previous round at the node
+          for label in prev_bags.get(node, ()):
+            ready_time = label[0] + node_change_times[node] if label[4] >= 0 else label[0]
+            column_offset = route_times_offset[route] + index * trip_count
+            position = bisect.bisect_left(departure_columns, ready_time, column_offset, column_offset + trip_count)
+            if position == column_offset + trip_count or (trip := departure_column_trips[position]) < 0:
+              continue
+            priority = max(label[1], trip_priorities[trip]) if use_priority else 0
+            transfers = label[2] + (1 if k > 1 and not preferred_nodes[node] else 0) if use_node_transfers else 0
+            self.merge_route_label(route_bag, (trip, route_times_offset[route] + (trip - route_trips_offset[route]) * stop_count, index, label, priority, transfers))
+
+      # Third stage: examine the transfers
+      self.scan_transfer_labels(bags, k, trip_labels, arrival_id, marked_nodes, arrival_limit)
+
+    # Return the bags
+    return bags
+
+  # Merge the labels of the transfers from the specified labels into the bags at the k-th round and mark their end nodes
+  # Labels that arrive at or after arrival_limit are pruned
+  def scan_transfer_labels(self, bags, k, labels, arrival_id, marked_nodes, arrival_limit = UNREACHED):
+    compiled = self.compiled_feed
+    for label in labels:
+      node = label[3]
+      for i in range(compiled.node_transfers_offset[node], compiled.node_transfers_offset[node + 1]):
+        transfer = compiled.node_transfers[i]
+        end = compiled.transfer_ends[transfer]
+        transfer_arrival = label[0] + compiled.transfer_durations[transfer]
+        if transfer_arrival < arrival_limit and self.merge_label(bags, k, end, arrival_id, (transfer_arrival, label[1], label[2], end, -1, transfer, label)):
+          marked_nodes[end] = None
+
+  # Merge a label into the bag of a node at the k-th round and return if the label is added
+  # The label is not added if it is dominated by a label at the node in the same or an earlier round, or by a label at the arrival node
+  def merge_label(self, bags, k, node, arrival_id, label):
+    for j in range(k + 1):
+      for other in bags[j].get(node, ()):
+        if other[0] <= label[0] and other[1] <= label[1] and other[2] <= label[2]:
+          return False
+      if arrival_id >= 0 and node != arrival_id:
+        for other in bags[j].get(arrival_id, ()):
+          if other[0] <= label[0] and other[1] <= label[1] and other[2] <= label[2]:
+            return False
+
+    # Remove the labels in the bag of this round that are dominated by the label and add the label
+    bag = bags[k].get(node)
+    if bag is None:
+      bags[k][node] = [label]
+    else:
+      bag[:] = [other for other in bag if not (label[0] <= other[0] and label[1] <= other[1] and label[2] <= other[2])]
+      bag.append(label)
+    return True
+
+  # Merge a boarded trip into a route bag, where a boarded trip is dominated by the same trip with better criteria
+  def merge_route_label(self, route_bag, route_label):
+    for i, other in enumerate(route_bag):
+      if other[0] == route_label[0]:
+        if other[4] <= route_label[4] and other[5] <= route_label[5]:
+          return
+        if route_label[4] <= other[4] and route_label[5] <= other[5]:
+          route_bag[i] = route_label
+          return
+    route_bag.append(route_label)
+
+  # Return the journeys created from the labels at the arrival node
+  def create_label_journeys(self, departure_node, arrival_node, bags):
+    compiled = self.compiled_feed
+    arrival_id = compiled.node_ids[arrival_node]
+
+    # Create a list of journeys
+    journeys = []
+
+    # Iterate over the labels at the arrival node in every round
+    for k in range(len(bags)):
+      for label in bags[k].get(arrival_id, ()):
+        # Create a list of legs
+        legs = []
+
+        # Iterate over the labels from the arrival node back to the departure node
+        while label[6] is not None:
+          # Insert a new transfer leg that departs at the arrival time of the parent label
+          if label[4] < 0:
+            legs.insert(0, JourneyTransferLeg(compiled.nodes[label[6][3]], compiled.nodes[label[3]], compiled.transfers[label[5]], Time(label[6][0])))
+            label = label[6]
+            continue
+
+          trip = compiled.trips[label[4]]
+          from_node = compiled.nodes[compiled.get_node_at_index(compiled.route_ids[trip.route], label[5])]
+          to_node = compiled.nodes[label[3]]
+
+          # Insert a new leg
+          complete_trip = trip.beginning_at_node(from_node)
+          legs.insert(0, JourneyTripLeg(from_node, to_node, complete_trip.ending_at_node(to_node), complete_trip))
+
+          label = label[6]
+
+        # Append a new journey
+        journeys.append(Journey(departure_node, arrival_node, legs))
+
+    # Return the journeys
+    return journeys
+
+  # Return the criteria of a journey as a tuple where lower values are better
+  def get_criteria(self, journey):
+    return tuple(getattr(self, f"get_{criterion}_criterion")(journey) for criterion in self.criteria)
+
+  # Return the arrival criterion of a journey
+  def get_arrival_criterion(self, journey):
+    return int(journey.arrival_time)
+
+  # Return the transfers criterion of a journey
+  def get_transfers_criterion(self, journey):
+    return journey.transfers
+
+  # Return the priority criterion of a journey, which is the priority of its worst trip
+  def get_priority_criterion(self, journey):
+    return max(((leg.trip.priority or 0) for leg in journey.legs if isinstance(leg, JourneyTripLeg)), default = 0)
+
+  # Return the node transfers criterion of a journey, which is the number of transfers at nodes that are not preferred to transfer
+  def get_node_transfers_criterion(self, journey):
+    trip_legs = [leg for leg in journey.legs if isinstance(leg, JourneyTripLeg)]
+    return sum(1 for leg in trip_legs[1:] if not leg.from_node.node)
+
+  # Return the journeys that are not dominated by another journey in the criteria
+  def pareto_criteria_journeys(self, journeys):
+    criteria = [self.get_criteria(journey) for journey in journeys]
+
+    # Iterate over the journeys and keep the first of equal journeys
+    pareto_journeys = []
+    for i, journey in enumerate(journeys):
+      if any(self.dominates(other, criteria[i]) or (other == criteria[i] and j < i) for j, other in enumerate(criteria) if j != i):
+        continue
+      pareto_journeys.append(journey)
+    return pareto_journeys
+
+  # Return the non-dominated journeys between two nodes that depart after the specified departure time and arrive at or before max_arrival
+  def query_depart_after(self, departure_node, arrival_node, departure, max_arrival = None):
+    # Get the bags of labels
+    bags = self.scan_bags(departure_node, departure, arrival_node, max_arrival = max_arrival)
+
+    # Return the journeys
+    journeys = self.pareto_criteria_journeys(self.create_label_journeys(departure_node, arrival_node, bags))
+    return sorted(journeys, key = lambda journey: (journey.arrival_time, journey.transfers))
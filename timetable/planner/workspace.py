@@ -0,0 +1,115 @@
+from .compiled import NO_TIME, UNREACHED
+
+
+# Class that defines the reusable label arrays of the compiled RAPTOR engine
+# A workspace is reset between scans by only clearing the labels that the previous scan touched
+# A reverse workspace stores the latest departure times towards the arrival node in the arrival labels, where later times are better
+class RaptorWorkspace:
+  # Constructor
+  def __init__(self, compiled_feed, reverse = False):
+    self.compiled_feed = compiled_feed
+    self.reverse = reverse
+    self.unreached = NO_TIME if reverse else UNREACHED
+    self.node_count = len(compiled_feed.nodes)
+    self.route_count = len(compiled_feed.routes)
+
+    # k_arrivals[k][node] denotes the earliest known arrival time at node with up to k trips
+    self.k_arrivals = []
+
+    # k_trips[k][node] and k_boards[k][node] denote the trip id and boarding stop index of the connection to node at the k-th trip, or -1 if there is none
+    self.k_trips = []
+    self.k_boards = []
+
+    # k_transfers[k][node] denotes the transfer id of the connection to node after the k-th trip, or -1 if the connection is a trip
+    self.k_transfers = []
+
+    # k_best_arrivals[k][node] denotes the earliest known arrival time at node with at most k trips, which is copied from the previous round for touched nodes at the start of each round
+    self.k_best_arrivals = []
+
+    # marked[node] denotes if node is in next_marked_nodes, and both lists are ordered by the time the node was marked
+    self.marked = bytearray(self.node_count)
+    self.marked_nodes = []
+    self.next_marked_nodes = []
+
+    # queue[route] denotes the index of the earliest marked stop in the route, or -1 if the route is not in queued_routes
+    self.queue = [-1] * self.route_count
+    self.queued_routes = []
+
+    # touched[node] denotes if node is in touched_nodes, which are the nodes that have a label
+    self.touched = bytearray(self.node_count)
+    self.touched_nodes = []
+
+    # rounds denotes the highest round that has labels
+    self.rounds = 0
+
+  # Make sure the label arrays for the k-th round exist and return them
+  def get_round(self, k):
+    while len(self.k_arrivals) <= k:
+      self.k_arrivals.append([self.unreached] * self.node_count)
+      self.k_trips.append([-1] * self.node_count)
+      self.k_boards.append([-1] * self.node_count)
+      self.k_transfers.append([-1] * self.node_count)
+      self.k_best_arrivals.append([self.unreached] * self.node_count)
+    return self.k_arrivals[k], self.k_trips[k], self.k_boards[k]
+
+  # Start the k-th round by copying the best arrival times of the previous round if they are better
+  def start_round(self, k):
+    self.get_round(k)
+    self.rounds = max(self.rounds, k)
+    prev_best_arrivals = self.k_best_arrivals[k - 1]
+    best_arrivals = self.k_best_arrivals[k]
+    for node in self.touched_nodes:
+      if prev_best_arrivals[node] > best_arrivals[node] if self.reverse else prev_best_arrivals[node] < best_arrivals[node]:
+        best_arrivals[node] = prev_best_arrivals[node]
+
+  # Set the label of a node at the k-th round
+  def set_label(self, k, node, arrival, trip, board):
+    if not self.touched[node]:
+      self.touched[node] = 1
+      self.touched_nodes.append(node)
+    self.k_arrivals[k][node] = self.k_best_arrivals[k][node] = arrival
+    self.k_trips[k][node] = trip
+    self.k_boards[k][node] = board
+    self.k_transfers[k][node] = -1
+
+  # Set the label of a node at the k-th round to a transfer
+  def set_transfer_label(self, k, node, arrival, transfer):
+    self.set_label(k, node, arrival, -1, -1)
+    self.k_transfers[k][node] = transfer
+
+  # Mark a node for the next round
+  def mark(self, node):
+    if not self.marked[node]:
+      self.marked[node] = 1
+      self.next_marked_nodes.append(node)
+
+  # Unmark the marked nodes and make the nodes marked for the next round the marked nodes
+  def swap_marked_nodes(self):
+    self.marked_nodes.clear()
+    self.marked_nodes, self.next_marked_nodes = self.next_marked_nodes, self.marked_nodes
+    for node in self.marked_nodes:
+      self.marked[node] = 0
+
+  # Return the rounds in which the label of a node was set
+  def get_rounds_with_node(self, node):
+    return [k for k in range(self.rounds + 1) if self.k_trips[k][node] >= 0 or self.k_transfers[k][node] >= 0]
+
+  # Clear the labels that were touched by the previous scan
+  def reset(self):
+    for node in self.touched_nodes:
+      self.touched[node] = 0
+      for k in range(self.rounds + 1):
+        self.k_arrivals[k][node] = self.unreached
+        self.k_best_arrivals[k][node] = self.unreached
+        self.k_trips[k][node] = -1
+        self.k_boards[k][node] = -1
+        self.k_transfers[k][node] = -1
+    for node in self.next_marked_nodes:
+      self.marked[node] = 0
+    for route in self.queued_routes:
+      self.queue[route] = -1
+    self.touched_nodes.clear()
+    self.marked_nodes.clear()
+    self.next_marked_nodes.clear()
+    self.queued_routes.clear()
+    self.rounds = 0
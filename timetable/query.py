@@ -1,13 +1,18 @@
+import heapq
+
+
 # Query a list of elements
-def query(elements, query, *attributes):
+# If a limit is specified, then only the top elements up to the limit are returned, which are selected without sorting all matched elements
+def query(elements, query, *attributes, limit = None):
   # Get the default attributes
   attributes = attributes or ['name']
+  query = query.lower()
 
   # Get the order of a value
   def order(value):
     if not isinstance(value, str):
       return -1
-    return value.lower().find(query.lower())
+    return value.lower().find(query)
 
   # Get the orders of an element
   def orders(element):
@@ -27,7 +32,7 @@ def query(elements, query, *attributes):
     matched.append((element_orders, element))
 
   # Sort the matched elements
-  matched = sorted(matched)
+  matched = sorted(matched) if limit is None else heapq.nsmallest(limit, matched)
 
   # Return the actual matched elements
   return [element for _, element in matched]
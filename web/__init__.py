@@ -2,20 +2,39 @@ import flask
 import os
 import timetable
 
+from .feed_routes import blueprint as feed_blueprint
 from .frontend_routes import blueprint as frontend_blueprint
 from .node_routes import blueprint as node_blueprint
+from .payload_cache import PayloadCache
 from .trip_routes import blueprint as trip_blueprint
 
 
-# Parse the feed
-feed_decoder = timetable.GATTFeedDecoder()
-feed = feed_decoder.decode(os.getenv('TIMETABLE'))
+# Parse the feed, which is a file or a directory or glob pattern of files, or load its snapshot if one is configured, which is rebuilt when the feed is newer
+# The feed is reloaded in the background when the feed file changes, which is polled at the interval in seconds in FEED_RELOAD_INTERVAL, or never if it is 0
+feed_reload_interval = float(os.getenv('FEED_RELOAD_INTERVAL', 5)) or None
+if os.getenv('TIMETABLE_SNAPSHOT'):
+  feed_manager = timetable.FeedManager(os.getenv('TIMETABLE_SNAPSHOT'), timetable.SnapshotFeedDecoder(source = os.getenv('TIMETABLE')), source = os.getenv('TIMETABLE'), interval = feed_reload_interval)
+else:
+  feed_manager = timetable.FeedManager(os.getenv('TIMETABLE'), timetable.GATTFeedDecoder(), interval = feed_reload_interval)
+
+# Create the cache of the planner queries, which is configured by environment variables
+query_cache = timetable.QueryCache(
+  max_entries = int(os.getenv('PLANNER_CACHE_ENTRIES', 1024)),
+  max_bytes = int(os.getenv('PLANNER_CACHE_BYTES')) if os.getenv('PLANNER_CACHE_BYTES') else None,
+  ttl = float(os.getenv('PLANNER_CACHE_TTL')) if os.getenv('PLANNER_CACHE_TTL') else None,
+  bucket = int(os.getenv('PLANNER_CACHE_BUCKET', 0)))
+
+# Create the cache of the serialized JSON responses, which is configured by environment variables
+payload_cache = PayloadCache(
+  max_entries = int(os.getenv('PAYLOAD_CACHE_ENTRIES', 256)),
+  max_bytes = int(os.getenv('PAYLOAD_CACHE_BYTES')) if os.getenv('PAYLOAD_CACHE_BYTES') else None)
 
 # Create and configure the application
 app = flask.Flask(__name__)
 app.config['JSON_SORT_KEYS'] = False
 
 # Register blueprints
+app.register_blueprint(feed_blueprint)
 app.register_blueprint(frontend_blueprint)
 app.register_blueprint(node_blueprint)
 app.register_blueprint(trip_blueprint)
@@ -23,4 +42,10 @@ app.register_blueprint(trip_blueprint)
 # Create a before request handler
 @app.before_request
 def load_feed():
-  flask.g.feed = feed
+  # Get the state of the live feed once, so the request finishes on the same feed if the feed is reloaded
+  state = feed_manager.state
+  flask.g.feed = state.feed
+  flask.g.compiled_feed = state.compiled_feed
+  flask.g.feed_manager = feed_manager
+  flask.g.query_cache = query_cache
+  flask.g.payload_cache = payload_cache
@@ -0,0 +1,120 @@
+import collections
+import flask
+import itertools
+import timetable
+
+from .serialization import dumps, get_mimetype, get_mode, cached_response, represent, MSGPACK_MIMETYPE
+
+
+# Modes of streaming the objects of a bulk endpoint, which are a JSON array or JSON lines
+STREAM_MODES = {'array': 'application/json', 'lines': 'application/x-ndjson'}
+
+
+# Return the tree of a comma-separated list of field paths, which maps the name of every selected field to the tree of its selected subfields
+# A field with an empty tree is selected completely, so "stops.node.id" selects only the id of the node of every stop
+def parse_fields(string):
+  tree = {}
+  for path in string.split(','):
+    if not (path := path.strip()):
+      continue
+    subtree = tree
+    for name in path.split('.'):
+      subtree = subtree.setdefault(name, {})
+  return tree
+
+
+# Return the JSON representation of a value with only the fields in a tree of fields, which applies to every item of a list
+def select_fields(value, tree):
+  if not tree:
+    return value
+  if isinstance(value, list):
+    return [select_fields(item, tree) for item in value]
+  if isinstance(value, dict):
+    return collections.OrderedDict((name, select_fields(item, tree[name])) for name, item in value.items() if name in tree)
+  return value
+
+
+# Return a response with the representation of the objects of a bulk endpoint, which is a dict that maps ids to objects in feed order
+# The request parameters select a page of limit objects after the object with the id in after, the fields of the objects, and a stream mode in which
+# the objects are serialized one at a time while the response is sent
+# The JSON mode and the media type are negotiated like other responses, and a request without other parameters is served from the payload cache
+def bulk_response(key, objects):
+  # Get the request parameters
+  limit = flask.request.args.get('limit', type = int)
+  after = flask.request.args.get('after')
+  fields = parse_fields(flask.request.args.get('fields', ''))
+  stream = flask.request.args.get('stream')
+
+  # Validate the request parameters
+  if limit is not None and limit < 1:
+    flask.abort(400, f"The limit must be positive, got {limit!r}")
+  if after is not None and after not in objects:
+    flask.abort(400, f"Undefined cursor {after!r}")
+  if stream is not None and stream not in STREAM_MODES:
+    flask.abort(400, f"Undefined stream mode {stream!r}")
+
+  # Return the complete array from the payload cache if no parameters are specified
+  if limit is None and after is None and not fields and stream is None:
+    return cached_response(key, lambda mode, refs: [obj.to_json(mode, refs) for obj in objects.values()])
+
+  # Get the objects after the cursor
+  iterator = iter(objects.values())
+  if after is not None:
+    for obj in iterator:
+      if obj.id == after:
+        break
+
+  # Get the page of objects and the cursor of the next page if a limit is specified, otherwise iterate over the remaining objects lazily
+  next_after = None
+  if limit is not None:
+    page = list(itertools.islice(iterator, limit))
+    if page and next(iterator, None) is not None:
+      next_after = page[-1].id
+  else:
+    page = iterator
+
+  # Create the response
+  mode = get_mode()
+  mimetype = get_mimetype()
+  if stream is None:
+    value = represent(lambda mode, refs: [select_fields(obj.to_json(mode, refs), fields) for obj in page], mode)
+    response = flask.Response(dumps(value, mimetype), mimetype = mimetype)
+  elif mimetype == MSGPACK_MIMETYPE:
+    response = flask.Response(generate_msgpack_stream(page, fields, mode), mimetype = mimetype)
+  else:
+    response = flask.Response(generate_stream(page, fields, mode, stream), mimetype = STREAM_MODES[stream])
+  response.vary.add('Accept')
+
+  # Add a link to the next page
+  if next_after is not None:
+    args = flask.request.args.to_dict()
+    args['after'] = next_after
+    response.headers['Link'] = f'<{flask.url_for(flask.request.endpoint, **flask.request.view_args, **args)}>; rel="next"'
+  return response
+
+
+# Generate the JSON representations of objects with the fields in a tree of fields one at a time as a JSON array or as JSON lines
+# In reference mode the array is the data of an object that ends with the side table of the referenced objects as refs, and the lines end with a line
+# of an object with the side table as refs
+def generate_stream(objects, fields, mode, stream):
+  refs = timetable.References() if mode == 'ref' else None
+  if stream == 'lines':
+    for obj in objects:
+      yield dumps(select_fields(obj.to_json(mode, refs), fields)) + b'\n'
+    if refs is not None:
+      yield dumps(collections.OrderedDict(refs = refs.to_json())) + b'\n'
+  else:
+    yield b'{"data":[' if refs is not None else b'['
+    for index, obj in enumerate(objects):
+      yield (b',' if index else b'') + dumps(select_fields(obj.to_json(mode, refs), fields))
+    yield b'],"refs":' + dumps(refs.to_json()) + b'}' if refs is not None else b']'
+
+
+# Generate the MessagePack representations of objects with the fields in a tree of fields one at a time as a stream of MessagePack objects
+# In reference mode the stream ends with a map with the side table of the referenced objects as refs
+def generate_msgpack_stream(objects, fields, mode):
+  refs = timetable.References() if mode == 'ref' else None
+  for obj in objects:
+    yield dumps(select_fields(obj.to_json(mode, refs), fields), MSGPACK_MIMETYPE)
+  if refs is not None:
+    yield dumps(collections.OrderedDict(refs = refs.to_json()), MSGPACK_MIMETYPE)
@@ -0,0 +1,12 @@
+import flask
+
+
+# Create the blueprint
+blueprint = flask.Blueprint('feed', __name__)
+
+
+# Return the state of the live feed as JSON, which includes its version and load duration
+@blueprint.route('/feed.json')
+def get_feed():
+  # Return the state of the feed as JSON
+  return flask.jsonify(flask.g.feed_manager.to_json())
@@ -30,6 +30,7 @@ def planner_details():
     date = flask.request.args.get('date')
     time = flask.request.args.get('time')
     is_arrival = flask.request.args.get('is_arrival')
+    window = flask.request.args.get('window', default = 120, type = int)
 
     # Validate and resolve the request parameters
     if from_node is None or (from_node := flask.g.feed.get_node_by_name(from_node)) is None:
@@ -38,9 +39,12 @@ def planner_details():
       raise ValueError('to_node_not_found')
     time = timetable.Time.fromstring(time)
 
-    # Get the journeys
-    journeys_algo = timetable.RaptorAlgorithm(flask.g.feed)
-    journeys = journeys_algo.query_depart_after(from_node, to_node, time)
+    # Get the journeys from the query cache
+    journeys_algo = timetable.RaptorAlgorithm(flask.g.feed, engine = 'compiled', compiled_feed = flask.g.compiled_feed)
+    if is_arrival:
+      journeys = flask.g.query_cache.query(journeys_algo, 'arrive_before', from_node, to_node, time)
+    else:
+      journeys = flask.g.query_cache.query(journeys_algo, 'range', from_node, to_node, time, timetable.Duration(window * 60))
 
     # Render the details template
     return flask.render_template('planner_details.html', from_node = from_node, to_node = to_node, date = date, time = time, is_arrival = is_arrival, journeys = journeys)
@@ -62,13 +66,18 @@ def departures_details():
   try:
     # Get the request parameters
     node = flask.request.args.get('node')
+    time = flask.request.args.get('time')
+    window = flask.request.args.get('window', type = int)
+    limit = flask.request.args.get('limit', type = int)
 
     # Validate and resolve the request parameters
     if node is None or (node := flask.g.feed.get_node_by_name(node)) is None:
       raise ValueError('node_not_found')
+    time = timetable.Time.fromstring(time) if time else None
+    until = time + timetable.Duration(window * 60) if time is not None and window is not None else None
 
-    # Get the trips at the node
-    trips = sorted([trip.beginning_at_node(node) for trip in node.get_trips_with_node() if trip.arrival_node != node])
+    # Get the trips that depart at the node from the departure board of the node
+    trips = node.departures(after = time, limit = limit, until = until)
 
     # Render the details template
     return flask.render_template('departures_details.html', node = node, trips = trips)
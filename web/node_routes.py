@@ -1,6 +1,9 @@
 import flask
 import timetable
 
+from .bulk import bulk_response
+from .serialization import cached_response, create_response
+
 
 # Create the blueprint
 blueprint = flask.Blueprint('nodes', __name__)
@@ -9,52 +12,68 @@ blueprint = flask.Blueprint('nodes', __name__)
 # Return all nodes as JSON
 @blueprint.route('/nodes.json')
 def get_nodes():
-  # Get all nodes
-  nodes = flask.g.feed.get_nodes()
-
-  # Return the nodes as JSON
-  return flask.jsonify([node.to_json() for node in nodes])
+  # Return the nodes as JSON, which are paginated, selected and streamed according to the request parameters
+  return bulk_response(('nodes',), flask.g.feed.nodes)
 
 
 # Return all niodes that match a query as JSON
 @blueprint.route('/nodes/query.json')
 def query_nodes():
-  # Get the query
-  q = flask.request.args.get('q')
+  # Get the query and the maximum number of nodes
+  q = flask.request.args.get('q', '')
+  limit = flask.request.args.get('limit', '10')
 
-  # Get all nodes the match the query
-  nodes = timetable.query(flask.g.feed.get_nodes(), q)
+  # Validate the maximum number of nodes
+  try:
+    limit = int(limit)
+  except ValueError:
+    flask.abort(400, f"The limit must be an integer, got {limit!r}")
+  if limit < 1:
+    flask.abort(400, f"The limit must be positive, got {limit!r}")
+
+  # Get the top nodes that match the query from the search index
+  nodes = flask.g.feed.query_nodes(q, limit)
 
   # Return the nodes as JSON
-  return flask.jsonify([node.to_json() for node in nodes])
+  return create_response(lambda mode, refs: [node.to_json(mode, refs) for node in nodes])
 
 
 # Return a node as JSON
 @blueprint.route('/nodes/<string:id>.json')
 def get_node(id):
   # Get the node
-  node = flask.g.feed.get_node(id)
-  if node is None:
+  try:
+    node = flask.g.feed.get_node(id)
+  except ValueError:
     flask.abort(404)
 
-  # Return the node as JSON
-  return flask.jsonify(node.to_json())
+  # Return the node as JSON from the payload cache
+  return cached_response(('node', id), node.to_json)
 
 
 # Return the trains at a node as JSON
 @blueprint.route('/nodes/<string:id>/trains.json')
 def get_node_trains(id):
   # Get the request parameters
-  departures = flask.request.args.get('departures', default = True, type = bool)
-  arrivals = flask.request.args.get('arrivals', default = True, type = bool)
+  departures = flask.request.args.get('departures', default = True, type = parse_bool)
+  arrivals = flask.request.args.get('arrivals', default = True, type = parse_bool)
+  after = flask.request.args.get('after', type = timetable.Time.fromstring)
+  until = flask.request.args.get('until', type = timetable.Time.fromstring)
+  limit = flask.request.args.get('limit', type = int)
 
   # Get the node
-  node = flask.g.feed.get_node(id)
-  if node is None:
+  try:
+    node = flask.g.feed.get_node(id)
+  except ValueError:
     flask.abort(404)
 
-  # Get the trains at the node
-  trains = sorted(node.get_trains(departures = departures, arrivals = arrivals))
+  # Get the trains at the node from the departure and arrival boards of the node
+  trains = node.get_trains(departures = departures, arrivals = arrivals, after = after, limit = limit, until = until)
 
   # Return the trains as JSON
-  return flask.jsonify([train.to_json() for train in trains])
+  return create_response(lambda mode, refs: [train.to_json(mode, refs) for train in trains])
+
+
+# Parse a boolean request parameter
+def parse_bool(value):
+  return value.lower() not in ('', '0', 'false', 'no', 'off')
@@ -0,0 +1,161 @@
+import collections
+import flask
+import gzip
+import hashlib
+import threading
+
+from .serialization import dumps, JSON_MIMETYPE
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+
+# Content encodings of the precompressed bodies of a payload, in order of preference
+ENCODINGS = ('br', 'gzip')
+
+
+# Class that defines a serialized response body with its media type, its ETag and its precompressed bodies
+class Payload:
+  __slots__ = ('body', 'mimetype', 'etag', 'encodings')
+
+  # Constructor
+  def __init__(self, body, mimetype, etag, encodings = None):
+    self.body = body
+    self.mimetype = mimetype
+    self.etag = etag
+
+    # encodings[encoding] denotes the body compressed with the content encoding
+    self.encodings = encodings or {}
+
+  # Return the size in bytes of the bodies of this payload
+  @property
+  def size(self):
+    return len(self.body) + sum(len(body) for body in self.encodings.values())
+
+  # Return the ETag of the body with the specified content encoding, which is the ETag of the payload followed by the encoding
+  def get_etag(self, encoding = None):
+    return f"{self.etag}-{encoding}" if encoding is not None else self.etag
+
+
+# Class that defines a bounded LRU cache of JSON and MessagePack response bodies, which are serialized once per feed version and compressed when they are stored
+# Entries are keyed on the feed version and a key of the response, and the cache is cleared when the feed changes
+# Responses carry a strong ETag of the feed version and a digest of the body, so a request with a matching If-None-Match header is answered with 304
+class PayloadCache:
+  # Constructor
+  def __init__(self, **kwargs):
+    # Add optional properties
+    self.max_entries = kwargs.get('max_entries', 256)  # Defaults to 256
+    self.max_bytes = kwargs.get('max_bytes')  # Defaults to None, otherwise the size in bytes of the bodies of all entries
+    self.min_compress_size = kwargs.get('min_compress_size', 1024)  # Defaults to 1024, the size in bytes below which bodies are not compressed
+    self.compress_level = kwargs.get('compress_level', 6)  # Defaults to 6
+
+    # Validate the properties
+    if self.max_entries is not None and self.max_entries < 1:
+      raise ValueError(f"The maximum number of entries must be positive, got {self.max_entries!r}")
+
+    # entries[key] denotes the payload of the key, ordered from least to most recently used
+    self.entries = collections.OrderedDict()
+    self.size = 0
+    self.feed_version = None
+    self.lock = threading.Lock()
+
+    # Counters of the cache
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+
+  # Return the payload of a key, which is taken from the cache or created from the JSON representation returned by the build function
+  def get(self, feed, key, build, mimetype = JSON_MIMETYPE):
+    with self.lock:
+      self.validate_feed(feed)
+      payload = self.entries.get(key)
+      if payload is not None:
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return payload
+      self.misses += 1
+
+    # Create the payload outside the lock, so other requests are not blocked while it is serialized and compressed
+    payload = self.create_payload(feed, build(), mimetype)
+    self.put(feed, key, payload)
+    return payload
+
+  # Store the payload of a key and evict the least recently used entries while the cache is too large
+  def put(self, feed, key, payload):
+    with self.lock:
+      self.validate_feed(feed)
+      if key in self.entries:
+        self.remove(key)
+      self.entries[key] = payload
+      self.size += payload.size
+      while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries) or (self.max_bytes is not None and self.size > self.max_bytes)):
+        self.remove(next(iter(self.entries)))
+        self.evictions += 1
+
+  # Remove an entry
+  def remove(self, key):
+    self.size -= self.entries.pop(key).size
+
+  # Clear the cache if the entries belong to another feed or another version of the feed
+  def validate_feed(self, feed):
+    if feed.version != self.feed_version:
+      if self.entries:
+        self.invalidations += 1
+      self.entries.clear()
+      self.size = 0
+      self.feed_version = feed.version
+
+  # Clear the cache
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.size = 0
+
+  # Return a payload of the representation of a value in the specified media type, which is compressed if it is large enough
+  def create_payload(self, feed, value, mimetype = JSON_MIMETYPE):
+    body = dumps(value, mimetype)
+    etag = f"{feed.version}-{hashlib.blake2b(body, digest_size = 12).hexdigest()}"
+
+    encodings = {}
+    if len(body) >= self.min_compress_size:
+      if brotli is not None:
+        encodings['br'] = brotli.compress(body, quality = min(self.compress_level, 11))
+      encodings['gzip'] = gzip.compress(body, compresslevel = self.compress_level, mtime = 0)
+    return Payload(body, mimetype, etag, encodings)
+
+  # Return a response with the payload of a key for the current request
+  # The response is empty with status 304 if the request has a matching If-None-Match header, otherwise it has the body with the best content encoding
+  # that the request accepts
+  def response(self, feed, key, build, mimetype = JSON_MIMETYPE):
+    payload = self.get(feed, key, build, mimetype)
+    request = flask.request
+
+    # Get the content encoding of the response
+    encoding = next((encoding for encoding in ENCODINGS if encoding in payload.encodings and request.accept_encodings[encoding]), None)
+
+    # Return a response without body if the request has a matching ETag
+    if any(request.if_none_match.contains_weak(payload.get_etag(e)) for e in (None, *payload.encodings)):
+      response = flask.Response(status = 304)
+    else:
+      response = flask.Response(payload.encodings[encoding] if encoding is not None else payload.body, mimetype = payload.mimetype)
+      if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(payload.get_etag(encoding))
+    if payload.encodings:
+      response.vary.add('Accept-Encoding')
+    return response
+
+  # Return the statistics of the cache
+  def get_stats(self):
+    with self.lock:
+      return collections.OrderedDict(
+        entries = len(self.entries),
+        size = self.size,
+        hits = self.hits,
+        misses = self.misses,
+        evictions = self.evictions,
+        invalidations = self.invalidations,
+      )
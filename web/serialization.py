@@ -0,0 +1,73 @@
+import collections
+import flask
+import json
+import timetable
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import msgpack
+except ImportError:
+  msgpack = None
+
+
+# Media types of the representations of responses, where MessagePack is only offered if msgpack is installed
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+
+# Return the representation of a value as bytes in the specified media type, which uses orjson for JSON if it is installed
+def dumps(value, mimetype = JSON_MIMETYPE):
+  if mimetype == MSGPACK_MIMETYPE:
+    return msgpack.packb(value)
+  if orjson is not None:
+    return orjson.dumps(value)
+  return json.dumps(value, separators = (',', ':')).encode()
+
+
+# Return the media type of the response to the current request, which is negotiated from the Accept header and defaults to JSON
+def get_mimetype():
+  offers = [JSON_MIMETYPE] + (list(MSGPACK_MIMETYPES) if msgpack is not None else [])
+  mimetype = flask.request.accept_mimetypes.best_match(offers, default = JSON_MIMETYPE)
+  return MSGPACK_MIMETYPE if mimetype in MSGPACK_MIMETYPES else mimetype
+
+
+# Return the JSON mode of the response to the current request, which is specified by the mode parameter and defaults to full
+def get_mode():
+  mode = flask.request.args.get('mode', 'full')
+  if mode not in timetable.JSON_MODES:
+    flask.abort(400, f"Undefined JSON mode {mode!r}")
+  return mode
+
+
+# Return the JSON representation of the value returned by build, which is called with the mode and the references
+# In reference mode the representation is an object of the value as data and the side table of the referenced objects as refs
+def represent(build, mode):
+  if mode == 'full':
+    return build(mode, None)
+  refs = timetable.References()
+  data = build(mode, refs)
+  return collections.OrderedDict(data = data, refs = refs.to_json())
+
+
+# Return a response with the representation of the value returned by build in the negotiated mode and media type, which is taken from the payload cache
+def cached_response(key, build):
+  mode = get_mode()
+  mimetype = get_mimetype()
+  response = flask.g.payload_cache.response(flask.g.feed, (*key, mode, mimetype), lambda: represent(build, mode), mimetype)
+  if msgpack is not None:
+    response.vary.add('Accept')
+  return response
+
+
+# Return a response with the representation of the value returned by build in the negotiated mode and media type
+def create_response(build):
+  mimetype = get_mimetype()
+  response = flask.Response(dumps(represent(build, get_mode()), mimetype), mimetype = mimetype)
+  if msgpack is not None:
+    response.vary.add('Accept')
+  return response
@@ -1,6 +1,9 @@
 import flask
 import timetable
 
+from .bulk import bulk_response
+from .serialization import cached_response
+
 
 # Create the blueprint
 blueprint = flask.Blueprint('trip', __name__)
@@ -9,11 +12,8 @@ blueprint = flask.Blueprint('trip', __name__)
 # Return all trips as JSON
 @blueprint.route('/trips.json')
 def get_trips():
-  # Get all trips
-  trips = flask.g.feed.get_trips()
-
-  # Return the trips as JSON
-  return flask.jsonify([trip.to_json() for trip in trips])
+  # Return the trips as JSON, which are paginated, selected and streamed according to the request parameters
+  return bulk_response(('trips',), flask.g.feed.trips)
 
 
 # Return a trip as JSON
@@ -22,8 +22,8 @@ def get_trip(id):
   # Get the trips
   try:
     trip = flask.g.feed.get_trip(id)
-  except KeyError as err:
+  except ValueError:
     flask.abort(404)
 
-  # Return the trip as JSON
-  return flask.jsonify(trip.to_json())
+  # Return the trip as JSON from the payload cache
+  return cached_response(('trip', id), trip.to_json)